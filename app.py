@@ -1,16 +1,42 @@
 import os
+import io
 import json
 import re
 import html
 import logging
-from datetime import datetime
-from threading import Lock
-from flask import Flask, render_template, request, jsonify, send_from_directory
+import zipfile
+import sqlite3
+import zlib
+import math
+import time
+from datetime import datetime, timedelta
+from threading import Condition, Event, Lock, Thread
+from logging.handlers import RotatingFileHandler
+from flask import Flask, Response, g, has_app_context, render_template, request, jsonify, send_from_directory, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
 import sqlalchemy as sa
+from werkzeug.middleware.proxy_fix import ProxyFix
 from werkzeug.security import generate_password_hash, check_password_hash
 import hashlib
+import hmac
+import cProfile
+import pstats
+import heapq
+import bisect
+import itertools
+import sys
+import unicodedata
+from collections import Counter, OrderedDict, deque, namedtuple
+from contextlib import contextmanager
+
+try:
+    from pygments import highlight as pygments_highlight
+    from pygments.lexers import get_lexer_by_name
+    from pygments.formatters import HtmlFormatter
+    from pygments.util import ClassNotFound
+except ImportError:  # 未安装 pygments 时退回转义后的纯文本
+    pygments_highlight = None
 
 # 配置日志 - 移除文件日志，只保留控制台输出
 logging.basicConfig(
@@ -31,22 +57,281 @@ CORS(app, supports_credentials=True, resources={r"/api/*": {"origins": "*"}})
 # 安全配置 - 使用环境变量或动态生成
 app.secret_key = os.environ.get('SECRET_KEY', hashlib.sha256(os.urandom(32)).hexdigest())
 app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', f'sqlite:///{os.path.join(BASE_DIR, "wiki_enhanced.db")}')
-# 云电脑优化的数据库配置
-app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
-    'pool_size': 2,  # 进一步减小连接池
-    'pool_recycle': 180,  # 3分钟回收连接
-    'pool_pre_ping': True,
-    'max_overflow': 3,  # 减少溢出连接
-    'pool_timeout': 30  # 连接超时时间
-}
+IS_SQLITE = app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite')
+# 连接池参数可由环境变量调整，结合 /api/pool_stats 的监控数据确定
+app.config['DB_POOL_SIZE'] = int(os.environ.get('DB_POOL_SIZE', 2))
+app.config['DB_MAX_OVERFLOW'] = int(os.environ.get('DB_MAX_OVERFLOW', 3))
+app.config['DB_POOL_TIMEOUT'] = int(os.environ.get('DB_POOL_TIMEOUT', 30))  # engine_from_config 按整数处理
+# SQLite 是本地文件，没有断线问题，默认不回收、不预检
+app.config['DB_POOL_RECYCLE'] = int(os.environ.get('DB_POOL_RECYCLE', -1 if IS_SQLITE else 180))
+app.config['DB_POOL_PRE_PING'] = os.environ.get('DB_POOL_PRE_PING', '0' if IS_SQLITE else '1') == '1'
+# 自适应连接池：根据取连接等待时间在上下限之间调整 pool_size
+app.config['DB_POOL_ADAPTIVE'] = os.environ.get('DB_POOL_ADAPTIVE', '0') == '1'
+app.config['DB_POOL_SIZE_MIN'] = int(os.environ.get('DB_POOL_SIZE_MIN', 1))
+app.config['DB_POOL_SIZE_MAX'] = int(os.environ.get('DB_POOL_SIZE_MAX', 8))
+app.config['DB_POOL_ADAPT_INTERVAL'] = float(os.environ.get('DB_POOL_ADAPT_INTERVAL', 30))  # 秒
+app.config['DB_POOL_GROW_WAIT'] = float(os.environ.get('DB_POOL_GROW_WAIT', 0.05))  # p95等待超过50ms扩容
 app.config['JSON_AS_ASCII'] = False
 app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
 app.config['SESSION_COOKIE_SECURE'] = False  # HTTP环境设为False
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB限制
+# 正文与历史快照压缩存储（仅SQLite），超过阈值字节数才压缩
+app.config['CONTENT_COMPRESSION'] = os.environ.get('CONTENT_COMPRESSION', '0') == '1'
+app.config['CONTENT_COMPRESSION_MIN_SIZE'] = int(os.environ.get('CONTENT_COMPRESSION_MIN_SIZE', 1024))
+# 准入控制：按路由类别限制并发，排队超时直接拒绝，避免在连接池上长时间等待
+app.config['ADMISSION_CONTROL'] = os.environ.get('ADMISSION_CONTROL', '1') != '0'
+app.config['ADMISSION_LIMITS'] = {  # 类别: (并发上限, 等待队列长度)
+    'read': (int(os.environ.get('ADMISSION_READ_LIMIT', 3)), 16),
+    'write': (int(os.environ.get('ADMISSION_WRITE_LIMIT', 1)), 8),  # SQLite 只有一个写锁
+    'search': (int(os.environ.get('ADMISSION_SEARCH_LIMIT', 1)), 8),
+    'export': (int(os.environ.get('ADMISSION_EXPORT_LIMIT', 1)), 2)  # 流式导出在下载结束前一直占着名额，不与普通读请求共用
+}
+app.config['ADMISSION_QUEUE_TIMEOUT'] = float(os.environ.get('ADMISSION_QUEUE_TIMEOUT', 2))  # 秒
+# 单客户端令牌桶限流（每秒请求数，0为关闭）
+app.config['RATE_LIMIT_PER_SEC'] = float(os.environ.get('RATE_LIMIT_PER_SEC', 0))
+app.config['RATE_LIMIT_BURST'] = int(os.environ.get('RATE_LIMIT_BURST', 20))
+# 前面的可信反向代理层数：大于0时按 X-Forwarded-For 最后几跳还原客户端地址，否则忽略该头（客户端可以随意伪造）
+app.config['TRUSTED_PROXY_HOPS'] = int(os.environ.get('TRUSTED_PROXY_HOPS', 0))
+# 请求剖析：设置密钥后带 X-Profile 头的请求返回剖析摘要；采样率N表示每N个请求写一份剖析文件
+app.config['PROFILE_SECRET'] = os.environ.get('PROFILE_SECRET', '')
+app.config['PROFILE_SAMPLE_RATE'] = int(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+app.config['PROFILE_DIR'] = os.environ.get('PROFILE_DIR', os.path.join(BASE_DIR, 'profiles'))
+app.config['PROFILE_KEEP'] = int(os.environ.get('PROFILE_KEEP', 50))  # 最多保留的剖析文件数
+# 流量录制：记录请求方法、路径、参数、请求体和耗时，供 wiki_replay.py 回放压测
+app.config['TRAFFIC_CAPTURE'] = os.environ.get('TRAFFIC_CAPTURE', '0') == '1'
+app.config['TRAFFIC_CAPTURE_DIR'] = os.environ.get('TRAFFIC_CAPTURE_DIR', os.path.join(BASE_DIR, 'traffic'))
+app.config['TRAFFIC_CAPTURE_MAX_BYTES'] = int(os.environ.get('TRAFFIC_CAPTURE_MAX_BYTES', 20 * 1024 * 1024))  # 单文件上限，超过后轮转
+app.config['TRAFFIC_CAPTURE_BACKUPS'] = int(os.environ.get('TRAFFIC_CAPTURE_BACKUPS', 5))
+app.config['TRAFFIC_CAPTURE_BODY_LIMIT'] = int(os.environ.get('TRAFFIC_CAPTURE_BODY_LIMIT', 256 * 1024))  # 超过的请求体不录制
+# 回收站：删除只做标记，后台线程分批清理超过保留期的节点
+app.config['TRASH_RETENTION_DAYS'] = float(os.environ.get('TRASH_RETENTION_DAYS', 30))
+app.config['TRASH_PURGE_INTERVAL'] = float(os.environ.get('TRASH_PURGE_INTERVAL', 300))  # 秒
+app.config['TRASH_PURGE_BATCH'] = int(os.environ.get('TRASH_PURGE_BATCH', 200))  # 每个事务删除的节点数
+# 常驻内存的树副本：树、文件夹、面包屑、收藏等读接口不再查询数据库
+app.config['TREE_REPLICA'] = os.environ.get('TREE_REPLICA', '0') == '1'
+app.config['TREE_REPLICA_POLL'] = float(os.environ.get('TREE_REPLICA_POLL', 1.0))  # 秒，发现其他进程写入的间隔（树副本、接口缓存和联想索引共用）
+app.config['TREE_REPLICA_NODE_BUDGET'] = int(os.environ.get('TREE_REPLICA_NODE_BUDGET', 1536))  # 每节点内存预算（字节）
+# 缓存并发构建：同一 key 只由一个线程重建；可选过期后先返回旧值、后台刷新
+app.config['CACHE_STALE_WHILE_REVALIDATE'] = os.environ.get('CACHE_STALE_WHILE_REVALIDATE', '0') == '1'
+app.config['CACHE_STALE_MAX'] = float(os.environ.get('CACHE_STALE_MAX', 60))  # 秒，旧值最长可用时间
+app.config['CACHE_FILL_TIMEOUT'] = float(os.environ.get('CACHE_FILL_TIMEOUT', 30))  # 秒，等待其他线程构建的上限
+# 多工作区：每个工作区一个独立的 SQLite 文件和引擎，按 /w/<名称>/ 前缀或 X-Wiki-Workspace 头选择；
+# 不带工作区的请求仍使用 DATABASE_URL 对应的默认库
+app.config['WORKSPACES'] = os.environ.get('WORKSPACES', '0') == '1'
+app.config['WORKSPACE_DIR'] = os.environ.get('WORKSPACE_DIR', os.path.join(BASE_DIR, 'workspaces'))
+app.config['WORKSPACE_MAX_OPEN'] = int(os.environ.get('WORKSPACE_MAX_OPEN', 16))  # 同时打开的分片数，超出后关闭最久未用的空闲分片
+# 首页是否内嵌首屏数据（树、根目录、最近编辑、收藏）
+app.config['BOOTSTRAP_EMBED'] = os.environ.get('BOOTSTRAP_EMBED', '1') != '0'
+
+# ========== 连接池监控 ==========
+class PoolStats:
+    """单个连接池的运行指标，按窗口汇总取连接等待时间；每个引擎（工作区分片）各有一份"""
+    def __init__(self):
+        self.lock = Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.recent_waits = deque(maxlen=1000)
+        self.connects = 0
+        self.invalidations = 0  # 含 pre-ping 失败
+        self.recycles = 0
+        self.resizes = 0
+        self.window_waits = []
+        self.window_peak = 0
+        self.window_started = time.monotonic()
+    
+    def record_wait(self, seconds, timed_out=False, checked_out=0):
+        with self.lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+                self.window_peak = max(self.window_peak, checked_out)
+            self.total_wait += seconds
+            self.max_wait = max(self.max_wait, seconds)
+            self.recent_waits.append(seconds)
+            self.window_waits.append(seconds)
+    
+    def take_window(self):
+        """取出并重置当前窗口，返回 (等待时间列表, 已借出峰值, 窗口秒数)"""
+        with self.lock:
+            waits, peak = self.window_waits, self.window_peak
+            elapsed = time.monotonic() - self.window_started
+            self.window_waits, self.window_peak = [], 0
+            self.window_started = time.monotonic()
+            return waits, peak, elapsed
+    
+    def on_connect(self, dbapi_connection, connection_record):
+        with self.lock:
+            self.connects += 1
+            # 同一连接记录再次建立连接：未失效过则是 pool_recycle 触发
+            if connection_record.record_info.get('connected'):
+                if not connection_record.record_info.pop('invalidated', False):
+                    self.recycles += 1
+            connection_record.record_info['connected'] = True
+    
+    def on_invalidate(self, dbapi_connection, connection_record, exception):
+        with self.lock:
+            self.invalidations += 1
+        connection_record.record_info['invalidated'] = True
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+class InstrumentedQueuePool(sa.pool.QueuePool):
+    """记录取连接等待时间，可按观测数据在上下限之间自动调整大小"""
+    def __init__(self, *args, **kwargs):
+        # recreate()（engine.dispose）沿用原连接池的 dispatch，监听器已经在里面，不再重复注册
+        inherited = kwargs.get('_dispatch') is not None
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+        if not inherited:
+            sa.event.listen(self, 'connect', self.stats.on_connect)
+            sa.event.listen(self, 'invalidate', self.stats.on_invalidate)
+    
+    def recreate(self):
+        pool = super().recreate()
+        pool.stats = self.stats  # 沿用的监听器写入原来的指标对象
+        return pool
+    
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            record = super()._do_get()
+        except sa.exc.TimeoutError:
+            self.stats.record_wait(time.perf_counter() - start, timed_out=True)
+            raise
+        # 此时连接尚未计入借出数，加上本次
+        self.stats.record_wait(time.perf_counter() - start, checked_out=self.checkedout() + 1)
+        if app.config['DB_POOL_ADAPTIVE']:
+            self._maybe_adapt()
+        return record
+    
+    def resize(self, pool_size):
+        """调整常驻连接数，保持 QueuePool 内部溢出计数一致"""
+        with self._overflow_lock:
+            delta = pool_size - self._pool.maxsize
+            self._pool.maxsize = pool_size
+            self._overflow -= delta
+        self.stats.resizes += 1
+        logger.info(f"连接池调整: pool_size={pool_size}")
+    
+    def _maybe_adapt(self):
+        if time.monotonic() - self.stats.window_started < app.config['DB_POOL_ADAPT_INTERVAL']:
+            return
+        waits, peak, _ = self.stats.take_window()
+        size = self.size()
+        p95 = percentile(waits, 95)
+        if p95 > app.config['DB_POOL_GROW_WAIT'] and size < app.config['DB_POOL_SIZE_MAX']:
+            self.resize(size + 1)
+        elif p95 < 0.001 and peak < size - 1 and size > app.config['DB_POOL_SIZE_MIN']:
+            self.resize(size - 1)
+
+def pool_snapshot(pool):
+    """连接池当前状态和累计指标"""
+    stats = pool.stats
+    with stats.lock:
+        waits = list(stats.recent_waits)
+        total = stats.checkouts + stats.timeouts
+        return {
+            'size': pool.size(),
+            'checked_out': pool.checkedout(),
+            'checked_in': pool.checkedin(),
+            'overflow': max(0, pool.overflow()),
+            'max_overflow': pool._max_overflow,
+            'checkouts': stats.checkouts,
+            'timeouts': stats.timeouts,
+            'wait_avg_ms': round(stats.total_wait / total * 1000, 3) if total else 0,
+            'wait_p50_ms': round(percentile(waits, 50) * 1000, 3),
+            'wait_p95_ms': round(percentile(waits, 95) * 1000, 3),
+            'wait_max_ms': round(stats.max_wait * 1000, 3),
+            'connects': stats.connects,
+            'invalidations': stats.invalidations,
+            'recycles': stats.recycles,
+            'resizes': stats.resizes,
+            'adaptive': app.config['DB_POOL_ADAPTIVE']
+        }
+
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+    'poolclass': InstrumentedQueuePool,
+    'pool_size': app.config['DB_POOL_SIZE'],
+    'max_overflow': app.config['DB_MAX_OVERFLOW'],
+    'pool_timeout': app.config['DB_POOL_TIMEOUT'],
+    'pool_recycle': app.config['DB_POOL_RECYCLE'],
+    'pool_pre_ping': app.config['DB_POOL_PRE_PING']
+}
+
+DEFAULT_WORKSPACE = 'default'
 
-db = SQLAlchemy(app)
+def current_workspace():
+    """当前请求或后台任务所在的工作区，没有应用上下文或未指定时为默认工作区"""
+    if has_app_context():
+        return g.get('workspace', DEFAULT_WORKSPACE)
+    return DEFAULT_WORKSPACE
+
+class WorkspaceSQLAlchemy(SQLAlchemy):
+    """默认引擎按当前工作区解析：db.engine、db.session 和 db.create_all() 都落到该工作区的分片"""
+    @property
+    def default_engine(self):
+        """DATABASE_URL 对应的默认库引擎，不随当前工作区变化"""
+        return super().engines[None]
+    
+    @property
+    def engines(self):
+        engines = super().engines
+        workspace = current_workspace()
+        if workspace == DEFAULT_WORKSPACE:
+            return engines
+        return {**engines, None: workspaces.state(workspace).engine}
+
+db = WorkspaceSQLAlchemy(app)
 
 # ========== 数据模型 ==========
+PREVIEW_LENGTH = 200  # 列表/树接口返回的预览长度
+COMPRESSED_MAGIC = b'WZ1:'  # 压缩格式标记，后接 zlib 数据
+
+def encode_content(value, dialect_name='sqlite'):
+    """按配置压缩文本，不满足条件时原样返回"""
+    if value is None or not app.config['CONTENT_COMPRESSION'] or dialect_name != 'sqlite':
+        return value
+    data = value.encode('utf-8')
+    if len(data) < app.config['CONTENT_COMPRESSION_MIN_SIZE']:
+        return value
+    compressed = COMPRESSED_MAGIC + zlib.compress(data, 6)
+    # 压缩收益不明显时保留明文
+    if len(compressed) >= len(data):
+        return value
+    return compressed
+
+def decode_content(value):
+    """还原文本，兼容明文和压缩两种存储格式"""
+    if isinstance(value, bytes):
+        if value.startswith(COMPRESSED_MAGIC):
+            return zlib.decompress(value[len(COMPRESSED_MAGIC):]).decode('utf-8')
+        return value.decode('utf-8', errors='replace')
+    return value
+
+class CompressedText(sa.types.TypeDecorator):
+    """透明压缩的文本列，对接口层完全不可见"""
+    impl = sa.Text
+    cache_ok = True
+    
+    def process_bind_param(self, value, dialect):
+        return encode_content(value, dialect.name)
+    
+    def process_result_value(self, value, dialect):
+        return decode_content(value)
+
+@sa.event.listens_for(sa.engine.Engine, 'connect')
+def _register_sqlite_functions(dbapi_connection, connection_record):
+    """注册 wiki_inflate()，让SQL层的搜索也能匹配压缩后的正文"""
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        dbapi_connection.create_function('wiki_inflate', 1, decode_content, deterministic=True)
+
 class Node(db.Model):
     __tablename__ = 'node'
     
@@ -54,14 +339,22 @@ class Node(db.Model):
     parent_id = db.Column(db.Integer, db.ForeignKey('node.id'), nullable=True, index=True)
     title = db.Column(db.String(200), nullable=False, index=True)
     type = db.Column(db.String(20), default='note', index=True)
-    usage = db.Column(db.Text, default='')
-    code_snippet = db.Column(db.Text, default='')
-    custom_modules = db.Column(db.Text, default='[]')
+    # 大字段延迟加载，列表和树接口只读元数据与预览列
+    usage = sa.orm.deferred(db.Column(CompressedText, default=''), group='content')
+    code_snippet = sa.orm.deferred(db.Column(CompressedText, default=''), group='content')
+    custom_modules = sa.orm.deferred(db.Column(db.Text, default='[]'), group='content')
+    usage_preview = db.Column(db.String(PREVIEW_LENGTH), default='')
+    code_preview = db.Column(db.String(PREVIEW_LENGTH), default='')
     is_expanded = db.Column(db.Boolean, default=False)
     tags = db.Column(db.String(500), default='')
     is_favorite = db.Column(db.Boolean, default=False, index=True)
     created_at = db.Column(db.DateTime, default=datetime.now, index=True)
     updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now, index=True)
+    # 同级排序键：稀疏整数，插入到两节点之间只需取中间值
+    position = db.Column(db.Integer, nullable=False, default=0)
+    # 回收站标记：非空表示已删除；同一次删除的子树共享 trash_root_id，便于整体恢复
+    deleted_at = db.Column(db.DateTime, nullable=True)
+    trash_root_id = db.Column(db.Integer, nullable=True)
     
     # 修正关系定义，避免递归问题
     children = db.relationship('Node', 
@@ -70,45 +363,101 @@ class Node(db.Model):
                               lazy='noload')  # 改为 noload，避免自动加载
 
     def to_dict_simple(self):
-        """快速转换，不包含子节点"""
+        """快速转换，不包含子节点，正文只返回预览"""
         return {
             'id': self.id,
             'parent_id': self.parent_id,
             'title': self.title,
             'type': self.type,
-            'usage': self.usage[:200] if self.usage else '',
-            'code_snippet': self.code_snippet[:200] if self.code_snippet else '',
-            'custom_modules': json.loads(self.custom_modules) if self.custom_modules else [],
+            'usage': self.usage_preview or '',
+            'code_snippet': self.code_preview or '',
             'is_expanded': self.is_expanded,
             'tags': self.tags.split(',') if self.tags else [],
             'is_favorite': self.is_favorite,
+            'position': self.position,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
     
+    def to_dict_full(self):
+        """完整转换，包含全部正文和自定义模块"""
+        result = self.to_dict_simple()
+        result['usage'] = self.usage or ''
+        result['code_snippet'] = self.code_snippet or ''
+        result['custom_modules'] = safe_json_loads(self.custom_modules)
+        return result
+    
     def to_dict_with_children(self, max_depth=3, current_depth=0):
-        """带子节点的转换，有深度限制防止无限递归"""
+        """带子节点的转换，有深度限制防止无限递归；顶层节点返回完整正文"""
+        result = self.to_dict_full() if current_depth == 0 else self.to_dict_simple()
         if current_depth >= max_depth:
-            return self.to_dict_simple()
+            return result
             
-        result = self.to_dict_simple()
         # 手动查询子节点，避免递归问题
-        children = Node.query.filter_by(parent_id=self.id).order_by(Node.title).all()
+        children = Node.query.filter_by(parent_id=self.id).order_by(Node.position, Node.id).all()
         result['children'] = [
             child.to_dict_with_children(max_depth, current_depth + 1) 
             for child in children
         ]
         return result
 
+@sa.event.listens_for(Node.usage, 'set')
+def _sync_usage_preview(target, value, oldvalue, initiator):
+    target.usage_preview = (value or '')[:PREVIEW_LENGTH]
+
+@sa.event.listens_for(Node.code_snippet, 'set')
+def _sync_code_preview(target, value, oldvalue, initiator):
+    target.code_preview = (value or '')[:PREVIEW_LENGTH]
+
 class History(db.Model):
     __tablename__ = 'history'
     
     id = db.Column(db.Integer, primary_key=True)
     note_id = db.Column(db.Integer, nullable=False, index=True)
     title = db.Column(db.String(200))
-    content = db.Column(db.Text)
+    content = db.Column(CompressedText)
     created_at = db.Column(db.DateTime, default=datetime.now, index=True)
 
+class ChangeLog(db.Model):
+    """节点变更流水，seq 单调递增，供增量同步使用"""
+    __tablename__ = 'change_log'
+    __table_args__ = {'sqlite_autoincrement': True}  # 保证 seq 不复用
+    
+    seq = db.Column(db.Integer, primary_key=True)
+    node_id = db.Column(db.Integer, nullable=True)  # 为空表示需要全量刷新
+    op = db.Column(db.String(10), nullable=False)  # upsert / delete / reset
+    created_at = db.Column(db.DateTime, default=datetime.now)
+
+class NodeRollup(db.Model):
+    """文件夹子树汇总（不含文件夹自身），写入时沿祖先路径增量维护"""
+    __tablename__ = 'node_rollup'
+    
+    folder_id = db.Column(db.Integer, primary_key=True)
+    descendant_count = db.Column(db.Integer, nullable=False, default=0)
+    note_count = db.Column(db.Integer, nullable=False, default=0)
+    byte_size = db.Column(db.BigInteger, nullable=False, default=0)  # 正文 UTF-8 字节数
+    max_updated_at = db.Column(db.DateTime, nullable=True)  # 子树内最近修改时间
+    
+    def to_dict(self):
+        return {
+            'descendant_count': self.descendant_count,
+            'note_count': self.note_count,
+            'byte_size': self.byte_size,
+            'max_updated_at': self.max_updated_at.isoformat() if self.max_updated_at else None
+        }
+
+@sa.event.listens_for(sa.orm.Session, 'do_orm_execute')
+def _exclude_trashed_nodes(execute_state):
+    """ORM 查询统一排除回收站中的节点，条件与部分索引 idx_node_live_parent 一致；
+    回收站相关查询用 execution_options(include_trashed=True) 绕过"""
+    if (execute_state.is_select
+            and not execute_state.is_column_load
+            and not execute_state.is_relationship_load
+            and not execute_state.execution_options.get('include_trashed', False)):
+        execute_state.statement = execute_state.statement.options(
+            sa.orm.with_loader_criteria(Node, lambda cls: cls.deleted_at.is_(None), include_aliases=True)
+        )
+
 # 创建索引
 def create_indexes():
     """手动创建索引，提高查询性能"""
@@ -116,31 +465,152 @@ def create_indexes():
     existing_indexes = inspector.get_indexes('node')
     index_names = [idx['name'] for idx in existing_indexes]
     
-    # 为频繁查询的字段创建索引
+    # 为频繁查询的字段创建索引；parent_id、title 等单列索引已由模型 index=True 建立，
+    # 这里不再重复创建，旧库中遗留的重复索引用 deployment_debug.py db --drop-duplicates 清理
     indexes_to_create = [
-        ('idx_node_parent_id', Node.parent_id),
-        ('idx_node_title', Node.title),
-        ('idx_node_type', Node.type),
-        ('idx_node_favorite', Node.is_favorite),
-        ('idx_node_updated', Node.updated_at),
         ('idx_node_tags', Node.tags)
     ]
     
-    for idx_name, column in indexes_to_create:
+    # 部分索引：读路径都带 deleted_at IS NULL 条件，只索引未删除的节点；
+    # (parent_id, position) 直接按顺序返回子节点列表，回收站按 trash_root_id 查找
+    partial_indexes = {
+        'idx_node_live_children': ((Node.parent_id, Node.position), Node.deleted_at.is_(None)),
+        'idx_node_trash_root': ((Node.trash_root_id,), Node.trash_root_id.isnot(None))
+    }
+    
+    # 已被取代的索引
+    for idx_name in ['idx_node_live_parent']:
+        if idx_name in index_names:
+            with db.engine.begin() as conn:
+                conn.execute(sa.text(f'DROP INDEX IF EXISTS {idx_name}'))
+            app.logger.info(f"删除索引: {idx_name}")
+    
+    indexes_to_create = [(idx_name, (column,)) for idx_name, column in indexes_to_create]
+    indexes_to_create += [(idx_name, columns) for idx_name, (columns, _) in partial_indexes.items()]
+    
+    for idx_name, columns in indexes_to_create:
         if idx_name not in index_names:
             try:
-                idx = sa.Index(idx_name, column)
+                where = partial_indexes[idx_name][1] if idx_name in partial_indexes else None
+                idx = sa.Index(idx_name, *columns, sqlite_where=where, postgresql_where=where)
                 idx.create(bind=db.engine)
                 app.logger.info(f"创建索引: {idx_name}")
             except Exception as e:
                 app.logger.warning(f"创建索引失败 {idx_name}: {e}")
 
+def ensure_preview_columns():
+    """为旧数据库补充预览列并回填"""
+    inspector = sa.inspect(db.engine)
+    existing = {column['name'] for column in inspector.get_columns('node')}
+    missing = [name for name in ['usage_preview', 'code_preview'] if name not in existing]
+    if not missing:
+        return
+    
+    inflate = 'wiki_inflate' if db.engine.dialect.name == 'sqlite' else ''
+    with db.engine.begin() as conn:
+        for name in missing:
+            conn.execute(sa.text(f"ALTER TABLE node ADD COLUMN {name} VARCHAR({PREVIEW_LENGTH}) DEFAULT ''"))
+        conn.execute(sa.text(
+            f"UPDATE node SET usage_preview = COALESCE(substr({inflate}(usage), 1, {PREVIEW_LENGTH}), ''), "
+            f"code_preview = COALESCE(substr({inflate}(code_snippet), 1, {PREVIEW_LENGTH}), '')"
+        ))
+    app.logger.info(f"补充预览列: {', '.join(missing)}")
+
+def ensure_trash_columns():
+    """为旧数据库补充回收站标记列"""
+    inspector = sa.inspect(db.engine)
+    existing = {column['name'] for column in inspector.get_columns('node')}
+    columns = {'deleted_at': 'DATETIME', 'trash_root_id': 'INTEGER'}
+    missing = [name for name in columns if name not in existing]
+    if not missing:
+        return
+    
+    with db.engine.begin() as conn:
+        for name in missing:
+            conn.execute(sa.text(f"ALTER TABLE node ADD COLUMN {name} {columns[name]}"))
+    app.logger.info(f"补充回收站列: {', '.join(missing)}")
+
+def ensure_position_column():
+    """为旧数据库补充排序列，按原先的标题顺序回填稀疏位置"""
+    inspector = sa.inspect(db.engine)
+    existing = {column['name'] for column in inspector.get_columns('node')}
+    if 'position' in existing:
+        return
+    
+    with db.engine.begin() as conn:
+        conn.execute(sa.text('ALTER TABLE node ADD COLUMN position INTEGER NOT NULL DEFAULT 0'))
+        rows = conn.execute(sa.text('SELECT id, parent_id FROM node ORDER BY parent_id, title, id')).all()
+        updates = []
+        previous_parent, index = object(), 0
+        for row in rows:
+            index = index + 1 if row.parent_id == previous_parent else 1
+            previous_parent = row.parent_id
+            updates.append({'node_id': row.id, 'position': index * POSITION_GAP})
+        if updates:
+            conn.execute(sa.text('UPDATE node SET position = :position WHERE id = :node_id'), updates)
+    app.logger.info(f"补充排序列: 回填 {len(rows)} 个节点")
+
+def ensure_rollup_table():
+    """汇总表为空时（新库或旧库升级）全量计算一次"""
+    if db.session.query(NodeRollup.folder_id).first() is not None:
+        return
+    if not Node.query.filter_by(type='folder').first():
+        return
+    count = recompute_rollups()
+    db.session.commit()
+    app.logger.info(f"补充子树汇总: {count} 个文件夹")
+
+def recompress_content(batch_size=500, progress=None):
+    """按当前压缩配置分批重写正文和历史快照，开启或关闭压缩后运行
+    
+    直接读取原始列值，每批一个短事务，避免长时间占用写锁。
+    """
+    targets = [
+        ('node', ['usage', 'code_snippet']),
+        ('history', ['content'])
+    ]
+    dialect_name = db.engine.dialect.name
+    stats = {'scanned': 0, 'rewritten': 0}
+    
+    for table_name, columns in targets:
+        column_list = ', '.join(columns)
+        assignments = ', '.join(f'{column} = :{column}' for column in columns)
+        last_id = 0
+        while True:
+            with db.engine.begin() as conn:
+                rows = conn.execute(sa.text(
+                    f'SELECT id, {column_list} FROM {table_name} WHERE id > :last_id ORDER BY id LIMIT :limit'
+                ), {'last_id': last_id, 'limit': batch_size}).all()
+                if not rows:
+                    break
+                
+                updates = []
+                for row in rows:
+                    raw = dict(zip(columns, row[1:]))
+                    encoded = {column: encode_content(decode_content(raw[column]), dialect_name) for column in columns}
+                    if encoded != raw:
+                        updates.append({'row_id': row[0], **encoded})
+                if updates:
+                    conn.execute(sa.text(f'UPDATE {table_name} SET {assignments} WHERE id = :row_id'), updates)
+                
+                last_id = rows[-1][0]
+                stats['scanned'] += len(rows)
+                stats['rewritten'] += len(updates)
+            if progress:
+                progress(table_name, dict(stats))
+    
+    clear_node_cache()
+    return stats
+
 # ========== 辅助函数 ==========
 def is_descendant(parent_id, child_id):
     """检查是否子节点，使用迭代避免递归栈溢出"""
     if parent_id == child_id:
         return True
     
+    # 开启树副本时直接在内存中查找
+    lookup = refresh_tree_replica().get if app.config['TREE_REPLICA'] else Node.query.get
+    
     # 使用循环代替递归
     current_id = child_id
     visited = set()
@@ -150,7 +620,7 @@ def is_descendant(parent_id, child_id):
             break  # 防止循环引用
         
         visited.add(current_id)
-        node = Node.query.get(current_id)
+        node = lookup(current_id)
         if not node or not node.parent_id:
             break
         
@@ -262,38 +732,1579 @@ def highlight_text(text, keyword):
         app.logger.error(f"高亮文本失败: {e}")
         return escape_html(text[:500]) + ('...' if len(text) > 500 else '')
 
-# ========== 缓存优化 ==========
-node_cache = {}
-cache_lock = Lock()
-CACHE_TIMEOUT = 5  # 缓存5秒
+# ========== 缓存优化 ==========
+node_cache = {}
+cache_lock = Lock()
+CACHE_TIMEOUT = 5  # 缓存5秒
+cache_generation = 0  # 每次清除缓存加一，清除前开始的构建结果不再写入缓存
+cache_flights = {}  # key -> 进行中的 CacheFlight
+cache_stats = Counter()
+
+class CacheFlight:
+    """一次进行中的缓存构建，同一 key 的并发请求等待同一份结果"""
+    __slots__ = ('generation', 'done', 'result', 'seq', 'error')
+    
+    def __init__(self, generation, seq):
+        self.generation = generation
+        self.done = Event()
+        self.result = None
+        self.seq = seq  # 构建前的变更流水序号，结果至少包含到该序号为止的变更
+        self.error = None
+
+def cached_build(key, builder, with_seq=False):
+    """读取缓存，未命中时同一 key 只由一个线程调用 builder，其余线程等待它的结果（single-flight）
+    
+    每次读取先比对变更流水序号（observed_change_seq，每 TREE_REPLICA_POLL 秒最多查询一次）：
+    缓存构建之后有过写入即视为未命中。本进程的写入下一次读取就能看到，其他进程（多 worker 部署）
+    的写入最迟一个轮询间隔后看到。开启 CACHE_STALE_WHILE_REVALIDATE 时，
+    流水没有变化、只是超过 CACHE_TIMEOUT 的旧值在 CACHE_STALE_MAX 内照常返回，同时由后台线程刷新。
+    builder 返回 None 时不缓存。key 自动加上当前工作区前缀。
+    with_seq=True 时返回 (结果, 构建时的变更流水序号)，客户端从该序号开始增量同步不会漏掉变更。
+    """
+    workspace = current_workspace()
+    key = f'{workspace}:{key}'
+    seq = observed_change_seq(workspaces.state(workspace))
+    with cache_lock:
+        entry = node_cache.get(key)
+        if entry is not None and entry[2] < seq:
+            # 构建之后有新的写入（可能来自其他进程）
+            cache_stats['outdated'] += 1
+            entry = None
+        if entry is not None:
+            data, timestamp, entry_seq = entry
+            age = (datetime.now() - timestamp).total_seconds()
+            if age < CACHE_TIMEOUT:
+                cache_stats['hits'] += 1
+                return (data, entry_seq) if with_seq else data
+            if app.config['CACHE_STALE_WHILE_REVALIDATE'] and age < app.config['CACHE_STALE_MAX']:
+                cache_stats['stale_served'] += 1
+                if key not in cache_flights:
+                    flight = cache_flights[key] = CacheFlight(cache_generation, seq)
+                    Thread(target=_refresh_in_background, args=(workspace, key, flight, builder),
+                           name='cache-refresh', daemon=True).start()
+                return (data, entry_seq) if with_seq else data
+        
+        flight = cache_flights.get(key)
+        # 只等待在当前流水序号之后开始的构建
+        leader = flight is None or flight.generation != cache_generation or flight.seq < seq
+        if leader:
+            flight = cache_flights[key] = CacheFlight(cache_generation, seq)
+            cache_stats['fills'] += 1
+        else:
+            cache_stats['coalesced'] += 1
+    
+    if leader:
+        _run_flight(key, flight, builder)
+    elif not flight.done.wait(app.config['CACHE_FILL_TIMEOUT']):
+        # 构建线程迟迟不返回时自行构建，不无限等待
+        cache_stats['wait_timeouts'] += 1
+        data = builder()
+        return (data, replica_bounded_seq(seq)) if with_seq else data
+    elif flight.error is not None:
+        raise flight.error
+    return (flight.result, flight.seq) if with_seq else flight.result
+
+def replica_bounded_seq(seq):
+    """树副本只按轮询间隔追平其他进程的写入，用它构建的结果可能早于 seq，取两者中较小的"""
+    if app.config['TREE_REPLICA']:
+        replica_seq = workspaces.state().tree_replica.seq
+        if 0 <= replica_seq < seq:
+            return replica_seq
+    return seq
+
+def _run_flight(key, flight, builder):
+    try:
+        flight.result = builder()
+        flight.seq = replica_bounded_seq(flight.seq)
+    except Exception as e:
+        flight.error = e
+        raise
+    finally:
+        with cache_lock:
+            if cache_flights.get(key) is flight:
+                del cache_flights[key]
+            if flight.error is None and flight.result is not None and flight.generation == cache_generation:
+                node_cache[key] = (flight.result, datetime.now(), flight.seq)
+                # 限制缓存大小，删除最旧的缓存
+                if len(node_cache) > 100:
+                    oldest = min(node_cache.keys(), key=lambda k: node_cache[k][1])
+                    del node_cache[oldest]
+        flight.done.set()
+    return flight.result
+
+def _refresh_in_background(workspace, key, flight, builder):
+    try:
+        with workspace_context(workspace):
+            _run_flight(key, flight, builder)
+    except Exception as e:
+        logger.warning(f"后台刷新缓存失败 [{key}]: {e}")
+
+def clear_node_cache(node_id=None, workspace=None):
+    """清除当前工作区的缓存"""
+    global cache_generation
+    state = workspaces.state(workspace)
+    # 写入后调用：树副本下次读取时先追平变更流水，流水序号也立即重新查询
+    state.tree_replica.stale = True
+    state.change_seq_checked_at = 0.0
+    prefix = f'{state.name}:'
+    with cache_lock:
+        cache_generation += 1
+        if node_id:
+            node_cache.pop(prefix + node_id, None)
+        else:
+            for key in [key for key in node_cache if key.startswith(prefix)]:
+                del node_cache[key]
+
+# 单节点序列化片段：按 (id, updated_at, position) 复用 to_dict_simple 的 JSON 文本，
+# 树、文件夹和节点详情直接拼接片段，写入只需重新序列化变更的节点
+# （重排不改 updated_at，因此 position 也参与校验）
+FRAGMENT_CACHE_MAX = 50000
+fragment_cache = OrderedDict()  # (工作区, id) -> ((updated_at, position), json文本)
+fragment_lock = Lock()
+
+def dump_json(data):
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+
+def node_fragment(node):
+    """获取节点的 JSON 片段，updated_at 或 position 变化后自动失效"""
+    key = (current_workspace(), node.id)
+    version = (node.updated_at, node.position)
+    with fragment_lock:
+        entry = fragment_cache.get(key)
+        if entry is not None and entry[0] == version:
+            fragment_cache.move_to_end(key)
+            return entry[1]
+    
+    text = dump_json(node.to_dict_simple())
+    with fragment_lock:
+        fragment_cache[key] = (version, text)
+        fragment_cache.move_to_end(key)
+        while len(fragment_cache) > FRAGMENT_CACHE_MAX:
+            fragment_cache.popitem(last=False)
+    return text
+
+def splice_children(fragment, child_fragments):
+    """在对象片段末尾拼入 children 数组"""
+    return fragment[:-1] + ',"children":[' + ','.join(child_fragments) + ']}'
+
+def json_api_response(data_json):
+    """用已序列化的 data 片段直接组装标准响应"""
+    return app.response_class('{"code":200,"data":' + data_json + '}', mimetype='application/json')
+
+def htmlsafe_json(text):
+    """内嵌到页面 <script> 中的 JSON 文本转义，与 tojson 过滤器一致"""
+    return (text.replace('<', '\\u003c').replace('>', '\\u003e')
+                .replace('&', '\\u0026').replace("'", '\\u0027'))
+
+# ========== 变更流水 ==========
+CHANGE_LOG_RETENTION = 10000  # 保留最近的变更条数
+CHANGE_FEED_MAX = 1000  # 单次增量超过该条数时让客户端全量刷新
+CHANGE_STREAM_POLL = 1.0  # SSE 轮询间隔（秒）
+CHANGE_STREAM_MAX_AGE = 300  # SSE 连接最长保持时间，到期由浏览器自动重连
+change_log_writes = 0
+
+def record_change(node_ids, op='upsert'):
+    """在当前事务中写入变更流水，随业务数据一起提交"""
+    global change_log_writes
+    now = datetime.now()
+    db.session.execute(sa.insert(ChangeLog.__table__), [
+        {'node_id': node_id, 'op': op, 'created_at': now} for node_id in node_ids
+    ])
+    
+    # 定期清理过旧的流水
+    change_log_writes += 1
+    if change_log_writes % 200 == 0:
+        db.session.execute(sa.text(
+            'DELETE FROM change_log WHERE seq <= (SELECT MAX(seq) FROM change_log) - :keep'
+        ), {'keep': CHANGE_LOG_RETENTION})
+
+def current_change_seq():
+    return db.session.query(sa.func.coalesce(sa.func.max(ChangeLog.seq), 0)).scalar()
+
+def observed_change_seq(state=None):
+    """本进程最近观察到的变更流水序号，每 TREE_REPLICA_POLL 秒最多查询一次数据库
+    
+    本进程写入后 clear_node_cache() 清零检查时间，下一次调用立即重新查询。
+    """
+    state = state or workspaces.state()
+    now = time.monotonic()
+    if now - state.change_seq_checked_at >= app.config['TREE_REPLICA_POLL']:
+        state.change_seq_checked_at = now  # 先记时间再查询，查询期间的写入会再次清零
+        state.change_seq = max(state.change_seq, current_change_seq())
+    return state.change_seq
+
+def build_changes_since(since):
+    """汇总 since 之后的变更：每个节点只保留最后一次操作"""
+    latest = current_change_seq()
+    if since >= latest:
+        return {'seq': latest, 'changed': [], 'deleted': [], 'reset': False}
+    
+    oldest = db.session.query(sa.func.min(ChangeLog.seq)).scalar() or 0
+    rows = db.session.query(ChangeLog.seq, ChangeLog.node_id, ChangeLog.op)\
+                     .filter(ChangeLog.seq > since)\
+                     .order_by(ChangeLog.seq)\
+                     .limit(CHANGE_FEED_MAX + 1).all()
+    
+    # 流水已被清理、数量过多或出现全量刷新标记时，让客户端重新加载
+    if since < oldest - 1 or len(rows) > CHANGE_FEED_MAX or any(row.op == 'reset' for row in rows):
+        return {'seq': latest, 'changed': [], 'deleted': [], 'reset': True}
+    
+    last_op = {}
+    for row in rows:
+        last_op[row.node_id] = row.op
+    
+    upsert_ids = [node_id for node_id, op in last_op.items() if op == 'upsert']
+    nodes = Node.query.filter(Node.id.in_(upsert_ids)).all() if upsert_ids else []
+    found = {node.id for node in nodes}
+    deleted = [node_id for node_id, op in last_op.items() if op == 'delete' or node_id not in found]
+    
+    return {
+        'seq': rows[-1].seq,
+        'changed': [node.to_dict_simple() for node in nodes],
+        'deleted': deleted,
+        'reset': False
+    }
+
+# ========== 回收站 ==========
+def trash_subtree(root_id):
+    """一条 UPDATE 把子树标记为已删除，返回被标记的节点ID列表"""
+    db.session.execute(sa.text('''
+        WITH RECURSIVE subtree(id) AS (
+            SELECT id FROM node WHERE id = :root_id AND deleted_at IS NULL
+            UNION
+            SELECT n.id FROM node n JOIN subtree s ON n.parent_id = s.id WHERE n.deleted_at IS NULL
+        )
+        UPDATE node SET deleted_at = :now, trash_root_id = :root_id WHERE id IN (SELECT id FROM subtree)
+    ''').bindparams(sa.bindparam('now', type_=db.DateTime)), {'root_id': root_id, 'now': datetime.now()})
+    return db.session.execute(
+        sa.text('SELECT id FROM node WHERE trash_root_id = :root_id'), {'root_id': root_id}
+    ).scalars().all()
+
+def restore_subtree(root_id):
+    """恢复一次删除的整棵子树；原父节点已不在时恢复到顶层，返回恢复的节点ID列表"""
+    root = db.session.execute(
+        sa.text('SELECT parent_id FROM node WHERE id = :root_id AND trash_root_id = :root_id'),
+        {'root_id': root_id}
+    ).first()
+    if root is None:
+        return []
+    
+    if root.parent_id is not None:
+        parent_alive = db.session.execute(
+            sa.text('SELECT 1 FROM node WHERE id = :parent_id AND deleted_at IS NULL'),
+            {'parent_id': root.parent_id}
+        ).first()
+        if not parent_alive:
+            # 换了父节点：排到顶层末尾，并更新 updated_at 让节点片段缓存失效
+            db.session.execute(
+                sa.text('UPDATE node SET parent_id = NULL, position = :position, updated_at = :now WHERE id = :root_id')
+                  .bindparams(sa.bindparam('now', type_=db.DateTime)),
+                {'root_id': root_id, 'position': next_position(None), 'now': datetime.now()}
+            )
+    
+    ids = db.session.execute(
+        sa.text('SELECT id FROM node WHERE trash_root_id = :root_id'), {'root_id': root_id}
+    ).scalars().all()
+    db.session.execute(
+        sa.text('UPDATE node SET deleted_at = NULL, trash_root_id = NULL WHERE trash_root_id = :root_id'),
+        {'root_id': root_id}
+    )
+    return ids
+
+def purge_trash(older_than=None, batch_size=None, progress=None):
+    """分批物理删除回收站中过期的节点及其历史记录
+    
+    每批一个短事务，只删除已没有子节点的节点，整棵子树从叶子开始逐层清理，
+    其他请求的写入可以在批次之间穿插进行。
+    """
+    if older_than is None:
+        older_than = datetime.now() - timedelta(days=app.config['TRASH_RETENTION_DAYS'])
+    batch_size = batch_size or app.config['TRASH_PURGE_BATCH']
+    stats = {'nodes': 0, 'history': 0}
+    
+    while True:
+        with db.engine.begin() as conn:
+            ids = conn.execute(sa.text('''
+                SELECT id FROM node n
+                WHERE n.trash_root_id IS NOT NULL AND n.deleted_at <= :cutoff
+                  AND NOT EXISTS (SELECT 1 FROM node c WHERE c.parent_id = n.id)
+                LIMIT :limit
+            ''').bindparams(sa.bindparam('cutoff', type_=db.DateTime)),
+                {'cutoff': older_than, 'limit': batch_size}).scalars().all()
+            if not ids:
+                break
+            
+            params = {'ids': ids}
+            in_ids = sa.bindparam('ids', expanding=True)
+            stats['history'] += conn.execute(
+                sa.text('DELETE FROM history WHERE note_id IN :ids').bindparams(in_ids), params
+            ).rowcount
+            stats['nodes'] += conn.execute(
+                sa.text('DELETE FROM node WHERE id IN :ids').bindparams(in_ids), params
+            ).rowcount
+            conn.execute(sa.text('DELETE FROM node_rollup WHERE folder_id IN :ids').bindparams(in_ids), params)
+        if progress:
+            progress(dict(stats))
+    return stats
+
+class TrashPurger:
+    """后台清理线程：定期清理过期的回收站节点，每个进程在首个请求时启动"""
+    def __init__(self):
+        self.lock = Lock()
+        self.wakeup = Event()
+        self.thread = None
+    
+    def start(self):
+        with self.lock:
+            if self.thread is not None and self.thread.is_alive():
+                return
+            self.thread = Thread(target=self._run, name='trash-purger', daemon=True)
+            self.thread.start()
+    
+    def _run(self):
+        while True:
+            self.wakeup.wait(app.config['TRASH_PURGE_INTERVAL'])
+            self.wakeup.clear()
+            # 只清理本进程已打开的工作区，关闭的分片下次打开后再清理
+            for workspace in workspaces.open_names():
+                try:
+                    with workspace_context(workspace):
+                        stats = purge_trash()
+                    if stats['nodes']:
+                        logger.info(f"回收站清理 [{workspace}]: 删除 {stats['nodes']} 个节点, {stats['history']} 条历史记录")
+                except Exception as e:
+                    logger.error(f"回收站清理失败 [{workspace}]: {e}", exc_info=True)
+
+trash_purger = TrashPurger()
+
+@app.before_request
+def ensure_trash_purger():
+    if trash_purger.thread is None:
+        trash_purger.start()
+
+# ========== 同级排序 ==========
+POSITION_GAP = 1024  # 新位置之间的初始间隔
+POSITION_MIN_GAP = 4  # 相邻间隔小于该值时安排后台重排
+
+def sibling_filter(parent_id):
+    return Node.parent_id.is_(None) if parent_id is None else Node.parent_id == parent_id
+
+def next_position(parent_id):
+    """排到同级末尾的位置，走 (parent_id, position) 索引"""
+    last = db.session.query(sa.func.max(Node.position)).filter(sibling_filter(parent_id)).scalar()
+    return (last or 0) + POSITION_GAP
+
+def neighbor_positions(parent_id, node_id, before_id=None, after_id=None):
+    """返回目标位置两侧相邻节点的 position (lo, hi)，不存在的一侧为 None"""
+    siblings = db.session.query(Node.position).filter(sibling_filter(parent_id), Node.id != node_id)
+    if after_id is not None:
+        lo = db.session.query(Node.position).filter(Node.id == after_id).scalar()
+        hi = siblings.filter(sa.or_(Node.position > lo, sa.and_(Node.position == lo, Node.id > after_id)))\
+                     .order_by(Node.position, Node.id).limit(1).scalar()
+        return lo, hi
+    if before_id is not None:
+        hi = db.session.query(Node.position).filter(Node.id == before_id).scalar()
+        lo = siblings.filter(sa.or_(Node.position < hi, sa.and_(Node.position == hi, Node.id < before_id)))\
+                     .order_by(Node.position.desc(), Node.id.desc()).limit(1).scalar()
+        return lo, hi
+    return siblings.order_by(Node.position.desc(), Node.id.desc()).limit(1).scalar(), None
+
+def position_between(lo, hi):
+    """取两侧之间的位置，间隔用完时返回 None"""
+    if lo is None and hi is None:
+        return POSITION_GAP
+    if hi is None:
+        return lo + POSITION_GAP
+    if lo is None:
+        return hi - POSITION_GAP
+    if hi - lo >= 2:
+        return (lo + hi) // 2
+    return None
+
+def rebalance_siblings(parent_id):
+    """把一组同级节点重新按等间隔编号，保持原有顺序；调用方负责提交"""
+    ids = [row.id for row in db.session.query(Node.id)
+                                       .filter(sibling_filter(parent_id))
+                                       .order_by(Node.position, Node.id)]
+    if not ids:
+        return 0
+    node_table = Node.__table__
+    db.session.execute(
+        sa.update(node_table)
+          .where(node_table.c.id == sa.bindparam('node_id'))
+          .values(position=sa.bindparam('new_position'), updated_at=node_table.c.updated_at),
+        [{'node_id': node_id, 'new_position': (i + 1) * POSITION_GAP} for i, node_id in enumerate(ids)]
+    )
+    # 客户端和树副本按 position 排序，重编号后的位置也要同步出去
+    record_change(ids)
+    return len(ids)
+
+class PositionRebalancer:
+    """后台重排线程：间隔快用完的同级组在请求之外重新编号"""
+    def __init__(self):
+        self.lock = Lock()
+        self.wakeup = Event()
+        self.pending = set()  # (工作区, 父节点ID)
+        self.thread = None
+    
+    def schedule(self, parent_id):
+        with self.lock:
+            self.pending.add((current_workspace(), parent_id))
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = Thread(target=self._run, name='position-rebalancer', daemon=True)
+                self.thread.start()
+        self.wakeup.set()
+    
+    def _run(self):
+        while True:
+            self.wakeup.wait()
+            self.wakeup.clear()
+            with self.lock:
+                parents, self.pending = self.pending, set()
+            for workspace, parent_id in parents:
+                try:
+                    with workspace_context(workspace):
+                        count = rebalance_siblings(parent_id)
+                        db.session.commit()
+                    clear_node_cache(workspace=workspace)
+                    logger.info(f"同级重排完成: 父节点 {parent_id}, {count} 个节点")
+                except Exception as e:
+                    logger.error(f"同级重排失败: {e}", exc_info=True)
+
+position_rebalancer = PositionRebalancer()
+
+# ========== 子树汇总 ==========
+# 节点连同其子树的汇总：节点数、笔记数、正文字节数、最近修改时间
+RollupTotals = namedtuple('RollupTotals', ['count', 'notes', 'size', 'updated_at'])
+
+def content_bytes(*values):
+    return sum(len(value.encode('utf-8')) for value in values if value)
+
+def latest(*values):
+    present = [value for value in values if value is not None]
+    return max(present) if present else None
+
+def ancestor_path(folder_id):
+    """folder_id 及其全部祖先，由近及远，一条递归查询"""
+    if folder_id is None:
+        return []
+    rows = db.session.execute(sa.text('''
+        WITH RECURSIVE path(id, parent_id, depth) AS (
+            SELECT id, parent_id, 0 FROM node WHERE id = :folder_id
+            UNION
+            SELECT n.id, n.parent_id, p.depth + 1 FROM node n JOIN path p ON n.id = p.parent_id
+            WHERE p.depth < 100
+        )
+        SELECT id FROM path ORDER BY depth
+    '''), {'folder_id': folder_id}).scalars().all()
+    return rows
+
+def subtree_totals(node_id):
+    """读取节点自身和它的汇总行得到整棵子树的汇总，不遍历子树；节点不存在或已删除时返回 None"""
+    row = db.session.query(Node.type, Node.updated_at, Node.usage, Node.code_snippet, NodeRollup)\
+                    .outerjoin(NodeRollup, NodeRollup.folder_id == Node.id)\
+                    .filter(Node.id == node_id).first()
+    if row is None:
+        return None
+    node_type, updated_at, usage, code_snippet, rollup = row
+    own = RollupTotals(1, int(node_type == 'note'), content_bytes(usage, code_snippet), updated_at)
+    if rollup is None:
+        return own
+    return RollupTotals(own.count + rollup.descendant_count, own.notes + rollup.note_count,
+                        own.size + rollup.byte_size, latest(own.updated_at, rollup.max_updated_at))
+
+def rollup_add(parent_id, totals):
+    """把一棵子树的汇总累加到 parent_id 的整条祖先路径上"""
+    path = ancestor_path(parent_id)
+    if not path:
+        return
+    rollup_table = NodeRollup.__table__
+    values = {
+        'descendant_count': rollup_table.c.descendant_count + totals.count,
+        'note_count': rollup_table.c.note_count + totals.notes,
+        'byte_size': rollup_table.c.byte_size + totals.size
+    }
+    if totals.updated_at is not None:
+        updated_at = sa.literal(totals.updated_at, db.DateTime)
+        values['max_updated_at'] = sa.case(
+            (sa.or_(rollup_table.c.max_updated_at.is_(None), rollup_table.c.max_updated_at < updated_at), updated_at),
+            else_=rollup_table.c.max_updated_at
+        )
+    db.session.execute(sa.update(rollup_table).where(rollup_table.c.folder_id.in_(path)).values(**values))
+
+def rollup_remove(parent_id, totals):
+    """从祖先路径上减去一棵子树；最近修改时间由近及远按直接子节点重新取最大值，
+    每层只看一层子节点和它们的汇总行"""
+    path = ancestor_path(parent_id)
+    if not path:
+        return
+    rollup_table = NodeRollup.__table__
+    db.session.execute(sa.update(rollup_table).where(rollup_table.c.folder_id.in_(path)).values(
+        descendant_count=rollup_table.c.descendant_count - totals.count,
+        note_count=rollup_table.c.note_count - totals.notes,
+        byte_size=rollup_table.c.byte_size - totals.size
+    ))
+    db.session.execute(sa.text('''
+        UPDATE node_rollup SET max_updated_at = (
+            SELECT MAX(CASE WHEN r.max_updated_at > n.updated_at THEN r.max_updated_at ELSE n.updated_at END)
+            FROM node n LEFT JOIN node_rollup r ON r.folder_id = n.id
+            WHERE n.parent_id = :folder_id AND n.deleted_at IS NULL
+        )
+        WHERE folder_id = :folder_id
+    '''), [{'folder_id': folder_id} for folder_id in path])
+
+def update_rollups(old_parent_id, before, new_parent_id, after):
+    """节点（连同子树）从 before 变为 after 后更新祖先汇总：新建时 before 为 None，
+    删除时 after 为 None；父节点不变时只累加差值。调用方负责提交"""
+    if before is not None and (after is None or old_parent_id != new_parent_id):
+        rollup_remove(old_parent_id, before)
+        before = None
+    if after is None:
+        return
+    if before is not None:
+        # 原地修改：数量不变，修改时间只会变新
+        after = RollupTotals(after.count - before.count, after.notes - before.notes,
+                             after.size - before.size, after.updated_at)
+    rollup_add(new_parent_id, after)
+
+def recompute_rollups(root_id=None):
+    """重新计算全部（或 root_id 子树内）文件夹的汇总，一次读出节点后自底向上累加；调用方负责提交"""
+    query = db.session.query(Node.id, Node.parent_id, Node.type, Node.updated_at, Node.usage, Node.code_snippet)
+    if root_id is not None:
+        node_table = Node.__table__
+        subtree = sa.select(node_table.c.id).where(node_table.c.id == root_id).cte('rollup_subtree', recursive=True)
+        subtree = subtree.union(sa.select(node_table.c.id).where(
+            node_table.c.parent_id == subtree.c.id, node_table.c.deleted_at.is_(None)
+        ))
+        query = query.filter(Node.id.in_(sa.select(subtree.c.id)))
+    
+    nodes = {}  # id -> (parent_id, 是否笔记, 字节数, 修改时间)
+    children = {}
+    folders = []
+    for row in query.yield_per(1000):
+        nodes[row.id] = (row.parent_id, int(row.type == 'note'), content_bytes(row.usage, row.code_snippet), row.updated_at)
+        children.setdefault(row.parent_id, []).append(row.id)
+        if row.type == 'folder':
+            folders.append(row.id)
+    
+    # 广度优先排出层序，倒序处理即可保证子节点先于父节点
+    order = [node_id for node_id, (parent_id, *_) in nodes.items() if parent_id not in nodes]
+    for node_id in order:
+        order.extend(children.get(node_id, []))
+    
+    sums = {folder_id: [0, 0, 0, None] for folder_id in folders}
+    for node_id in reversed(order):
+        parent_id, is_note, size, updated_at = nodes[node_id]
+        if parent_id not in sums:
+            continue
+        count, notes, sub_size, sub_updated = sums.get(node_id, (0, 0, 0, None))
+        total = sums[parent_id]
+        total[0] += 1 + count
+        total[1] += is_note + notes
+        total[2] += size + sub_size
+        total[3] = latest(total[3], updated_at, sub_updated)
+    
+    rollup_table = NodeRollup.__table__
+    if root_id is None:
+        db.session.execute(sa.delete(rollup_table))
+    elif folders:
+        db.session.execute(sa.delete(rollup_table).where(rollup_table.c.folder_id.in_(folders)))
+    if sums:
+        db.session.execute(sa.insert(rollup_table), [{
+            'folder_id': folder_id, 'descendant_count': count, 'note_count': notes,
+            'byte_size': size, 'max_updated_at': updated_at
+        } for folder_id, (count, notes, size, updated_at) in sums.items()])
+    return len(sums)
+
+def load_rollups(folder_ids=None):
+    """读取汇总行，返回 folder_id -> 汇总字典；不传 folder_ids 时读取全部"""
+    query = db.session.query(NodeRollup)
+    if folder_ids is not None:
+        if not folder_ids:
+            return {}
+        query = query.filter(NodeRollup.folder_id.in_(folder_ids))
+    return {rollup.folder_id: rollup.to_dict() for rollup in query}
+
+def splice_rollup(fragment, rollups, node):
+    """文件夹片段末尾拼入 rollup 对象，片段缓存本身不受汇总变化影响"""
+    rollup = rollups.get(node.id) if node.type == 'folder' else None
+    if rollup is None:
+        return fragment
+    return fragment[:-1] + ',"rollup":' + dump_json(rollup) + '}'
+
+# ========== 树副本 ==========
+class ReplicaNode:
+    """树副本中的节点：只保留列表接口需要的元数据和预览，用 __slots__ 省去实例字典"""
+    __slots__ = ('id', 'parent_id', 'title', 'type', 'usage_preview', 'code_preview', 'is_expanded',
+                 'tags', 'is_favorite', 'position', 'created_at', 'updated_at')
+    
+    # 字段名与 Node 一致，直接复用序列化逻辑，node_fragment() 也可以直接使用
+    to_dict_simple = Node.to_dict_simple
+    
+    @classmethod
+    def from_row(cls, row):
+        node = cls()
+        for name, value in zip(cls.__slots__, row):
+            setattr(node, name, value)
+        node.type = sys.intern(node.type or 'note')
+        return node
+    
+    @classmethod
+    def from_dict(cls, data):
+        """由变更流水中的 to_dict_simple 结果还原"""
+        node = cls()
+        node.id = data['id']
+        node.parent_id = data['parent_id']
+        node.title = data['title']
+        node.type = sys.intern(data['type'] or 'note')
+        node.usage_preview = data['usage']
+        node.code_preview = data['code_snippet']
+        node.is_expanded = data['is_expanded']
+        node.tags = ','.join(data['tags'])
+        node.is_favorite = data['is_favorite']
+        node.position = data['position']
+        node.created_at = datetime.fromisoformat(data['created_at']) if data['created_at'] else None
+        node.updated_at = datetime.fromisoformat(data['updated_at']) if data['updated_at'] else None
+        return node
+
+REPLICA_COLUMNS = [getattr(Node, name) for name in ReplicaNode.__slots__]
+
+class TreeReplica:
+    """进程内的节点元数据副本，带按 (position, id) 排序的子节点索引
+    
+    本进程写入后由 clear_node_cache() 标记过期，下次读取时按变更流水追平；
+    多进程部署时按 observed_change_seq() 的轮询间隔发现其他进程的写入。
+    """
+    def __init__(self):
+        self.lock = Lock()
+        self.refresh_lock = Lock()
+        self.nodes = {}  # id -> ReplicaNode
+        self.children = {}  # parent_id -> 有序的 [(position, id)]
+        self.favorites = set()
+        self.seq = -1  # 已应用的变更序号，-1 表示尚未加载
+        self.stale = True
+    
+    def load(self, rows, seq):
+        nodes = {}
+        children = {}
+        for row in rows:
+            node = ReplicaNode.from_row(row)
+            nodes[node.id] = node
+            children.setdefault(node.parent_id, []).append((node.position, node.id))
+        for siblings in children.values():
+            siblings.sort()
+        with self.lock:
+            self.nodes = nodes
+            self.children = children
+            self.favorites = {node.id for node in nodes.values() if node.is_favorite}
+            self.seq = seq
+    
+    def _insert(self, node):
+        self.nodes[node.id] = node
+        bisect.insort(self.children.setdefault(node.parent_id, []), (node.position, node.id))
+        if node.is_favorite:
+            self.favorites.add(node.id)
+    
+    def _remove(self, node_id):
+        node = self.nodes.pop(node_id, None)
+        if node is None:
+            return
+        siblings = self.children.get(node.parent_id, [])
+        key = (node.position, node.id)
+        i = bisect.bisect_left(siblings, key)
+        if i < len(siblings) and siblings[i] == key:
+            del siblings[i]
+        if not siblings:
+            self.children.pop(node.parent_id, None)
+        self.favorites.discard(node_id)
+    
+    def apply(self, delta):
+        with self.lock:
+            for node_id in delta['deleted']:
+                self._remove(node_id)
+            for data in delta['changed']:
+                self._remove(data['id'])
+                self._insert(ReplicaNode.from_dict(data))
+            self.seq = delta['seq']
+    
+    def get(self, node_id):
+        return self.nodes.get(node_id)
+    
+    def children_of(self, parent_id):
+        with self.lock:
+            return [self.nodes[node_id] for _, node_id in self.children.get(parent_id, [])]
+    
+    def children_map(self):
+        """parent_id -> 有序子节点列表，供整树拼接"""
+        with self.lock:
+            return {
+                parent_id: [self.nodes[node_id] for _, node_id in siblings]
+                for parent_id, siblings in self.children.items()
+            }
+    
+    def ancestors(self, node_id, max_depth=10):
+        """从根到自身的节点链，节点不存在时返回空列表"""
+        chain = []
+        node = self.nodes.get(node_id)
+        while node is not None and len(chain) < max_depth:
+            chain.append(node)
+            node = self.nodes.get(node.parent_id) if node.parent_id else None
+        chain.reverse()
+        return chain
+    
+    def favorite_nodes(self, limit):
+        with self.lock:
+            return [self.nodes[node_id] for node_id in sorted(self.favorites)[:limit]]
+    
+    def memory_usage(self):
+        """估算副本占用的内存：节点对象、字段值和子节点索引，共享对象只计一次"""
+        seen = set()
+        
+        def size(obj):
+            if id(obj) in seen:
+                return 0
+            seen.add(id(obj))
+            return sys.getsizeof(obj)
+        
+        with self.lock:
+            total = size(self.nodes) + size(self.children) + size(self.favorites)
+            for node in self.nodes.values():
+                total += size(node) + sum(size(getattr(node, name)) for name in ReplicaNode.__slots__)
+            for siblings in self.children.values():
+                total += size(siblings) + sum(size(key) for key in siblings)
+            count = len(self.nodes)
+        
+        budget = app.config['TREE_REPLICA_NODE_BUDGET']
+        per_node = total / count if count else 0
+        return {
+            'nodes': count,
+            'bytes': total,
+            'bytes_per_node': round(per_node, 1),
+            'budget_per_node': budget,
+            'within_budget': per_node <= budget,
+            'seq': self.seq
+        }
+
+def refresh_tree_replica():
+    """把当前工作区的树副本追到最新：首次全量加载，之后按变更流水增量应用"""
+    state = workspaces.state()
+    replica = state.tree_replica
+    if not replica.stale and replica.seq >= observed_change_seq(state):
+        return replica
+    
+    with replica.refresh_lock:
+        if not replica.stale and replica.seq >= observed_change_seq(state):
+            return replica  # 等锁期间已由其他线程追平
+        replica.stale = False  # 先清标记，追平期间的新写入会重新标记
+        seq = current_change_seq()
+        if replica.seq < 0:
+            replica.load(db.session.query(*REPLICA_COLUMNS).all(), seq)
+            usage = replica.memory_usage()
+            logger.info(f"树副本加载完成: {usage['nodes']} 个节点, 每节点约 {usage['bytes_per_node']} 字节")
+            if usage['nodes'] >= 1000 and not usage['within_budget']:  # 节点很少时容器开销占主导
+                logger.warning(f"树副本每节点内存超出预算 {usage['budget_per_node']} 字节")
+        elif replica.seq < seq:
+            delta = build_changes_since(replica.seq)
+            if delta['reset']:
+                replica.load(db.session.query(*REPLICA_COLUMNS).all(), delta['seq'])
+            else:
+                replica.apply(delta)
+    return replica
+
+# ========== 标题联想 ==========
+SUGGEST_MAX_QUERY_GRAMS = 8  # 模糊匹配只用最稀有的若干个 n-gram 生成候选
+SUGGEST_MAX_POSTING = 5000  # 模糊匹配跳过过长的倒排表
+SUGGEST_MAX_CANDIDATES = 500  # 每一步最多打分的候选数
+
+def normalize_suggest_text(text):
+    """全角转半角、转小写，中英文统一按字符处理"""
+    return unicodedata.normalize('NFKC', text or '').lower().strip()
+
+SUGGEST_START = '\x02'
+
+def suggest_grams(text):
+    """带起始标记的二元组，起始标记用于前缀匹配，单字查询也能命中开头"""
+    if not text:
+        return set()
+    padded = SUGGEST_START + text
+    return {sys.intern(padded[i:i + 2]) for i in range(len(padded) - 1)}
+
+class SuggestIndex:
+    """常驻内存的标题/标签 n-gram 倒排索引"""
+    def __init__(self):
+        self.lock = Lock()
+        self.refresh_lock = Lock()
+        self.docs = {}  # id -> (标题, 规范化标题, 规范化标签, 类型, 父ID, gram数)
+        self.postings = {}  # gram -> set(id)
+        self.char_postings = {}  # 单字 -> set(id)，单字查询匹配标题中间的字
+        self.sorted_titles = []  # 有序的 (规范化标题, id)，前缀查询用二分
+        self.seq = -1  # 已应用的变更序号，-1 表示尚未构建
+    
+    @staticmethod
+    def _doc_grams(norm_title, norm_tags):
+        grams = suggest_grams(norm_title)
+        for tag in norm_tags.split(','):
+            grams |= suggest_grams(tag.strip())
+        return grams
+    
+    @staticmethod
+    def _doc_chars(norm_title, norm_tags):
+        return set(norm_title) | set(norm_tags.replace(',', ''))
+    
+    def _add(self, node_id, title, tags, node_type, parent_id, keep_sorted=True):
+        norm_title = normalize_suggest_text(title)
+        norm_tags = normalize_suggest_text(tags)
+        grams = self._doc_grams(norm_title, norm_tags)
+        self.docs[node_id] = (title, norm_title, norm_tags, node_type, parent_id, len(grams))
+        for gram in grams:
+            self.postings.setdefault(gram, set()).add(node_id)
+        for char in self._doc_chars(norm_title, norm_tags):
+            self.char_postings.setdefault(char, set()).add(node_id)
+        if keep_sorted:
+            bisect.insort(self.sorted_titles, (norm_title, node_id))
+        else:
+            self.sorted_titles.append((norm_title, node_id))
+    
+    def _remove(self, node_id):
+        doc = self.docs.pop(node_id, None)
+        if doc is None:
+            return
+        position = bisect.bisect_left(self.sorted_titles, (doc[1], node_id))
+        if position < len(self.sorted_titles) and self.sorted_titles[position][1] == node_id:
+            del self.sorted_titles[position]
+        for gram in self._doc_grams(doc[1], doc[2]):
+            posting = self.postings.get(gram)
+            if posting is not None:
+                posting.discard(node_id)
+                if not posting:
+                    del self.postings[gram]
+        for char in self._doc_chars(doc[1], doc[2]):
+            posting = self.char_postings.get(char)
+            if posting is not None:
+                posting.discard(node_id)
+                if not posting:
+                    del self.char_postings[char]
+    
+    def rebuild(self, rows, seq):
+        """全量重建，rows 为 (id, title, tags, type, parent_id)"""
+        fresh = SuggestIndex()
+        for row in rows:
+            fresh._add(*row, keep_sorted=False)
+        fresh.sorted_titles.sort()
+        with self.lock:
+            self.docs, self.postings, self.char_postings, self.sorted_titles, self.seq = \
+                fresh.docs, fresh.postings, fresh.char_postings, fresh.sorted_titles, seq
+    
+    def apply(self, delta):
+        """应用 build_changes_since 返回的增量"""
+        with self.lock:
+            for node_id in delta['deleted']:
+                self._remove(node_id)
+            for node in delta['changed']:
+                self._remove(node['id'])
+                self._add(node['id'], node['title'], ','.join(node['tags']), node['type'], node['parent_id'])
+            self.seq = delta['seq']
+    
+    def _score(self, node_id, norm, query_gram_count, overlap):
+        title, norm_title, norm_tags, node_type, parent_id, gram_count = self.docs[node_id]
+        score = 2.0 * overlap / (query_gram_count + gram_count)
+        if norm_title.startswith(norm):
+            score += 1.0
+        elif norm in norm_title:
+            score += 0.5
+        elif norm in norm_tags:
+            score += 0.3
+        return (score, node_id, title, node_type, parent_id)
+    
+    def query(self, text, limit=10):
+        """前缀/子串匹配，按 gram 重合度排序，容忍少量错字
+        
+        依次尝试：标题前缀（二分查找）、标题或标签中的子串（不带起始标记的 gram 求交，
+        单字查询用单字倒排表）、部分 gram 命中（模糊），结果够 limit 个就不再进入下一步。
+        """
+        norm = normalize_suggest_text(text)
+        query_grams = suggest_grams(norm)
+        if not query_grams:
+            return []
+        gram_count = len(query_grams)
+        
+        with self.lock:
+            scored = {}
+            
+            # 1. 标题前缀
+            start = bisect.bisect_left(self.sorted_titles, (norm,))
+            for norm_title, node_id in itertools.islice(self.sorted_titles, start, start + SUGGEST_MAX_CANDIDATES):
+                if not norm_title.startswith(norm):
+                    break
+                scored[node_id] = self._score(node_id, norm, gram_count, gram_count)
+            
+            postings = sorted((self.postings.get(gram, set()) for gram in query_grams), key=len)
+            
+            # 2. 标题或标签中的子串：起始标记只出现在开头，不参与求交
+            if len(scored) < limit:
+                if len(norm) == 1:
+                    inner = [self.char_postings.get(norm, set())]
+                else:
+                    inner = sorted((self.postings.get(gram, set()) for gram in query_grams
+                                    if not gram.startswith(SUGGEST_START)), key=len)
+                exact = inner[0]
+                for posting in inner[1:]:
+                    exact = exact & posting
+                    if not exact:
+                        break
+                matched = 0
+                for node_id in exact:
+                    if matched >= SUGGEST_MAX_CANDIDATES:
+                        break
+                    if node_id in scored:
+                        continue
+                    doc = self.docs[node_id]
+                    if norm in doc[1] or norm in doc[2]:  # 二元组都在但不相连的不算子串，交给模糊匹配
+                        scored[node_id] = self._score(node_id, norm, gram_count, gram_count)
+                        matched += 1
+            
+            # 3. 部分 gram 命中，容忍错字
+            if len(scored) < limit:
+                counts = Counter()
+                used = 0
+                for posting in postings[:SUGGEST_MAX_QUERY_GRAMS]:
+                    # 至少使用最稀有的两个 gram，其余过长的倒排表跳过
+                    if used >= 2 and len(posting) > SUGGEST_MAX_POSTING:
+                        break
+                    counts.update(posting)
+                    used += 1
+                min_overlap = max(1, used // 2)
+                for node_id, overlap in counts.most_common(SUGGEST_MAX_CANDIDATES):
+                    if overlap < min_overlap:
+                        break
+                    if node_id not in scored:
+                        scored[node_id] = self._score(node_id, norm, gram_count, overlap)
+            
+            top = heapq.nlargest(limit, scored.values(), key=lambda item: item[0])
+        return [{
+            'id': node_id,
+            'title': title,
+            'type': node_type,
+            'parent_id': parent_id,
+            'score': round(score, 3)
+        } for score, node_id, title, node_type, parent_id in top]
+    
+    def stats(self):
+        with self.lock:
+            return {'nodes': len(self.docs), 'grams': len(self.postings), 'chars': len(self.char_postings), 'seq': self.seq}
+
+def refresh_suggest_index():
+    """按变更流水把当前工作区的联想索引追到最新，首次调用时全量构建"""
+    state = workspaces.state()
+    suggest_index = state.suggest_index
+    seq = observed_change_seq(state)
+    if suggest_index.seq >= seq:
+        return suggest_index
+    
+    with suggest_index.refresh_lock:
+        if suggest_index.seq < 0:
+            rows = db.session.query(Node.id, Node.title, Node.tags, Node.type, Node.parent_id).all()
+            suggest_index.rebuild(rows, seq)
+            logger.info(f"联想索引构建完成: {len(rows)} 个节点")
+        elif suggest_index.seq < seq:
+            delta = build_changes_since(suggest_index.seq)
+            if delta['reset']:
+                rows = db.session.query(Node.id, Node.title, Node.tags, Node.type, Node.parent_id).all()
+                suggest_index.rebuild(rows, delta['seq'])
+            else:
+                suggest_index.apply(delta)
+    return suggest_index
+
+# ========== 工作区 ==========
+# 每个工作区一个 SQLite 文件（WORKSPACE_DIR/<名称>.db），写锁、变更流水、树副本和联想索引互不影响，
+# 分片可以单独备份或迁移；默认工作区就是 DATABASE_URL 对应的库
+WORKSPACE_NAME_RE = re.compile(r'^[a-z0-9][a-z0-9_-]{0,63}$')
+WORKSPACE_PATH_RE = re.compile(r'^/w/([a-z0-9][a-z0-9_-]{0,63})(?=/|$)')
+WORKSPACE_HEADER = 'X-Wiki-Workspace'
+
+class WorkspaceState:
+    """工作区在本进程内的状态：分片引擎、写入闸门、树副本和联想索引"""
+    def __init__(self, name, engine=None):
+        self.name = name
+        self.engine = engine  # 默认工作区为 None，直接使用 db 的引擎
+        self.tree_replica = TreeReplica()
+        self.suggest_index = SuggestIndex()
+        self.change_seq = 0  # observed_change_seq() 最近一次查询到的流水序号
+        self.change_seq_checked_at = 0.0
+        # 每个分片有自己的写锁，写入并发上限也按分片计算；默认工作区沿用 admission_gates['write']
+        self.write_gate = None
+        if engine is not None:
+            limit, max_queue = app.config['ADMISSION_LIMITS']['write']
+            self.write_gate = AdmissionGate('write', limit, max_queue, app.config['ADMISSION_QUEUE_TIMEOUT'])
+
+class WorkspaceRegistry:
+    """已打开的工作区分片，按最近使用排序；超过 WORKSPACE_MAX_OPEN 时关闭最久未用且没有借出连接的分片"""
+    def __init__(self):
+        self.lock = Lock()
+        self.default = WorkspaceState(DEFAULT_WORKSPACE)
+        self.shards = OrderedDict()  # 名称 -> WorkspaceState
+        self.migrated = set()  # 本进程已升级过表结构的分片，LRU 关闭后重新打开不再重复
+        self.migrate_lock = Lock()
+        self.opened = 0
+        self.closed = 0
+    
+    @staticmethod
+    def path(name):
+        return os.path.join(app.config['WORKSPACE_DIR'], f'{name}.db')
+    
+    def exists(self, name):
+        if name == DEFAULT_WORKSPACE:
+            return True
+        return bool(WORKSPACE_NAME_RE.match(name)) and os.path.isfile(self.path(name))
+    
+    def names(self):
+        """磁盘上的全部工作区"""
+        directory = app.config['WORKSPACE_DIR']
+        found = []
+        if os.path.isdir(directory):
+            found = sorted(filename[:-3] for filename in os.listdir(directory)
+                           if filename.endswith('.db') and WORKSPACE_NAME_RE.match(filename[:-3]))
+        return [DEFAULT_WORKSPACE] + [name for name in found if name != DEFAULT_WORKSPACE]
+    
+    def open_names(self):
+        with self.lock:
+            return [DEFAULT_WORKSPACE] + list(self.shards)
+    
+    def state(self, name=None):
+        """工作区状态，分片未打开时创建引擎；name 为空时取当前工作区"""
+        name = name or current_workspace()
+        if name == DEFAULT_WORKSPACE:
+            return self.default
+        with self.lock:
+            state = self.shards.get(name)
+            if state is not None:
+                self.shards.move_to_end(name)
+                return state
+            engine = sa.create_engine(f'sqlite:///{self.path(name)}', **app.config['SQLALCHEMY_ENGINE_OPTIONS'])
+            state = self.shards[name] = WorkspaceState(name, engine)
+            self.opened += 1
+            closed = self._evict()
+        for old in closed:
+            drop_workspace_caches(old.name)
+            logger.info(f"关闭空闲工作区分片: {old.name}")
+        return state
+    
+    def _evict(self):
+        excess = len(self.shards) - app.config['WORKSPACE_MAX_OPEN']
+        closed = []
+        for name in list(self.shards):
+            if excess <= 0:
+                break
+            state = self.shards[name]
+            if state.engine.pool.checkedout():
+                continue
+            del self.shards[name]
+            state.engine.dispose()
+            closed.append(state)
+            excess -= 1
+        self.closed += len(closed)
+        return closed
+    
+    def prepare(self, name):
+        """打开分片；本进程第一次使用时补齐表结构、索引和根目录"""
+        state = self.state(name)
+        if name not in self.migrated:
+            with self.migrate_lock:
+                if name not in self.migrated:
+                    with workspace_context(name):
+                        init_database()
+                    self.migrated.add(name)
+        return state
+    
+    def snapshot(self):
+        """分片打开情况和每个已打开分片各自的连接池指标"""
+        with self.lock:
+            engines = {DEFAULT_WORKSPACE: db.default_engine}
+            engines.update((name, state.engine) for name, state in self.shards.items())
+            opened, closed = self.opened, self.closed
+        return {
+            'open': list(engines),
+            'max_open': app.config['WORKSPACE_MAX_OPEN'],
+            'opened': opened,
+            'closed': closed,
+            'pools': {name: pool_snapshot(engine.pool) for name, engine in engines.items()}
+        }
+
+workspaces = WorkspaceRegistry()
+
+@contextmanager
+def workspace_context(name):
+    """在指定工作区中执行：新的应用上下文，db.session 与 db.engine 都指向该工作区"""
+    with app.app_context():
+        g.workspace = name
+        yield
+
+def drop_workspace_caches(name):
+    """分片关闭后丢弃它的接口缓存，节点片段随 LRU 自然淘汰"""
+    prefix = f'{name}:'
+    with cache_lock:
+        for key in [key for key in node_cache if key.startswith(prefix)]:
+            del node_cache[key]
+
+def create_workspace(name):
+    """新建工作区分片，已存在时返回 False"""
+    if name == DEFAULT_WORKSPACE or not WORKSPACE_NAME_RE.match(name):
+        raise ValueError('工作区名称只能包含小写字母、数字、- 和 _，且不能为 default')
+    if workspaces.exists(name):
+        return False
+    os.makedirs(app.config['WORKSPACE_DIR'], exist_ok=True)
+    workspaces.prepare(name)
+    logger.info(f"创建工作区: {name}")
+    return True
+
+class WorkspacePathMiddleware:
+    """把 /w/<名称> 前缀移到 SCRIPT_NAME：路由不用区分工作区，url_for 生成的地址自动带上前缀"""
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+    
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '')
+        match = WORKSPACE_PATH_RE.match(path)
+        if match:
+            environ['wiki.workspace'] = match.group(1)
+            environ['SCRIPT_NAME'] = environ.get('SCRIPT_NAME', '') + match.group(0)
+            environ['PATH_INFO'] = path[match.end():] or '/'
+        return self.wsgi_app(environ, start_response)
+
+if app.config['WORKSPACES']:
+    app.wsgi_app = WorkspacePathMiddleware(app.wsgi_app)
+
+@app.before_request
+def select_workspace():
+    """按路径前缀或请求头选择工作区，分片在本进程首次使用时补齐表结构"""
+    if not app.config['WORKSPACES']:
+        return None
+    name = request.environ.get('wiki.workspace') or request.headers.get(WORKSPACE_HEADER, '').strip()
+    if not name or name == DEFAULT_WORKSPACE:
+        return None
+    if not workspaces.exists(name):
+        return jsonify({'code': 404, 'msg': '工作区不存在'}), 404
+    g.workspace = name
+    workspaces.prepare(name)
+    return None
+
+# ========== 代码高亮 ==========
+HIGHLIGHT_CACHE_MAX_BYTES = 8 * 1024 * 1024  # 高亮结果缓存上限 8MB
+HIGHLIGHT_DEFAULT_LANGUAGE = 'python'
+highlight_cache = OrderedDict()  # 内容哈希 -> 高亮HTML，按LRU淘汰
+highlight_cache_bytes = 0
+highlight_lock = Lock()
+
+def highlight_cache_key(code, language):
+    """高亮缓存键：代码与语言的内容哈希"""
+    return hashlib.sha256(f'{language}\0{code}'.encode('utf-8')).hexdigest()
+
+def render_code_html(code, language):
+    """服务端生成高亮HTML（内联样式，前端无需再跑高亮）"""
+    # code_snippet 入库时已做HTML转义，先还原再交给高亮器
+    source = html.unescape(code)
+    if pygments_highlight is None:
+        return escape_html(source)
+    try:
+        lexer = get_lexer_by_name(language, stripnl=False)
+    except ClassNotFound:
+        lexer = get_lexer_by_name('text', stripnl=False)
+    return pygments_highlight(source, lexer, HtmlFormatter(nowrap=True, noclasses=True, style='monokai'))
+
+def get_highlighted_code(code, language=HIGHLIGHT_DEFAULT_LANGUAGE):
+    """获取高亮HTML，命中缓存时只需一次哈希和字典查找"""
+    global highlight_cache_bytes
+    if not code:
+        return ''
+    
+    key = highlight_cache_key(code, language)
+    with highlight_lock:
+        if key in highlight_cache:
+            highlight_cache.move_to_end(key)
+            return highlight_cache[key]
+    
+    rendered = render_code_html(code, language)
+    size = len(rendered.encode('utf-8'))
+    if size > HIGHLIGHT_CACHE_MAX_BYTES:
+        return rendered
+    
+    with highlight_lock:
+        if key not in highlight_cache:
+            highlight_cache[key] = rendered
+            highlight_cache_bytes += size
+            # 超出容量时淘汰最久未使用的条目
+            while highlight_cache_bytes > HIGHLIGHT_CACHE_MAX_BYTES:
+                _, evicted = highlight_cache.popitem(last=False)
+                highlight_cache_bytes -= len(evicted.encode('utf-8'))
+    return rendered
+
+# ========== 流量录制 ==========
+# 每个进程写自己的文件（traffic-<pid>.ndjson），多 worker 时互不干扰，回放工具按时间戳合并
+TRAFFIC_SKIP_PREFIXES = ('/static/', '/api/changes/stream')
+TRAFFIC_BODY_TYPES = ('application/json', 'text/')
+# 回放比对响应时忽略的字段：时间戳、流水号、剖析摘要等每次都会变化
+TRAFFIC_VOLATILE_KEYS = {'created_at', 'updated_at', 'deleted_at', 'seq', 'profile'}
+traffic_logger = logging.getLogger('wiki.traffic')
+traffic_logger.propagate = False
+traffic_lock = Lock()
+traffic_pid = None
+
+def traffic_capture_logger():
+    """按进程懒加载轮转文件，gunicorn preload 后 fork 出的 worker 各自重新打开"""
+    global traffic_pid
+    if traffic_pid != os.getpid():
+        with traffic_lock:
+            if traffic_pid != os.getpid():
+                for handler in list(traffic_logger.handlers):
+                    traffic_logger.removeHandler(handler)
+                directory = app.config['TRAFFIC_CAPTURE_DIR']
+                os.makedirs(directory, exist_ok=True)
+                handler = RotatingFileHandler(
+                    os.path.join(directory, f'traffic-{os.getpid()}.ndjson'),
+                    maxBytes=app.config['TRAFFIC_CAPTURE_MAX_BYTES'],
+                    backupCount=app.config['TRAFFIC_CAPTURE_BACKUPS'],
+                    encoding='utf-8'
+                )
+                handler.setFormatter(logging.Formatter('%(message)s'))
+                traffic_logger.addHandler(handler)
+                traffic_logger.setLevel(logging.INFO)
+                traffic_pid = os.getpid()
+    return traffic_logger
+
+def strip_volatile(value):
+    if isinstance(value, dict):
+        return {k: strip_volatile(v) for k, v in value.items() if k not in TRAFFIC_VOLATILE_KEYS}
+    if isinstance(value, list):
+        return [strip_volatile(v) for v in value]
+    return value
+
+def traffic_digest(body, is_json=False):
+    """响应摘要：JSON 去掉易变字段后按键排序再取哈希，录制和回放用同一算法比对"""
+    if is_json:
+        try:
+            body = json.dumps(strip_volatile(json.loads(body)), ensure_ascii=False, sort_keys=True).encode('utf-8')
+        except ValueError:
+            pass
+    return hashlib.sha1(body).hexdigest()[:16]
+
+def start_traffic_capture():
+    if not request.path.startswith(TRAFFIC_SKIP_PREFIXES):
+        g.traffic_started = (time.time(), time.perf_counter())
+    return None
+
+def finish_traffic_capture(response):
+    started = g.pop('traffic_started', None)
+    if started is None:
+        return response
+    record = {
+        'ts': round(started[0], 6),
+        'method': request.method,
+        'path': request.path,
+        'query': request.query_string.decode('utf-8', 'replace'),
+        'content_type': request.mimetype or None,
+        'body': None,
+        'status': response.status_code,
+        'duration_ms': round((time.perf_counter() - started[1]) * 1000, 3),
+        'response_digest': None
+    }
+    if current_workspace() != DEFAULT_WORKSPACE:
+        record['workspace'] = current_workspace()  # 回放时用 X-Wiki-Workspace 头选择
+    if request.content_length:
+        # 只录制 JSON/文本请求体；上传文件等记为跳过，回放时不重放
+        if request.mimetype.startswith(TRAFFIC_BODY_TYPES) and request.content_length <= app.config['TRAFFIC_CAPTURE_BODY_LIMIT']:
+            record['body'] = request.get_data(cache=True).decode('utf-8', 'replace')
+        else:
+            record['body_skipped'] = True
+    # 页面内嵌了带时间戳的首屏数据，只比对 JSON 接口的响应
+    if response.is_json and not response.is_streamed:
+        record['response_digest'] = traffic_digest(response.get_data(), is_json=True)
+    try:
+        traffic_capture_logger().info(dump_json(record))
+    except OSError as e:
+        logger.warning(f"写入流量录制失败: {e}")
+    return response
+
+# 注册在准入控制之前，被拒绝的请求也会录制下来
+if app.config['TRAFFIC_CAPTURE']:
+    app.before_request(start_traffic_capture)
+    app.after_request(finish_traffic_capture)
+
+# ========== 准入控制 ==========
+class AdmissionGate:
+    """单类路由的并发上限和有界等待队列"""
+    def __init__(self, name, limit, max_queue, timeout):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+        self.cond = Condition()
+    
+    def acquire(self):
+        """获取执行名额，队列已满或等待超时返回 False"""
+        deadline = time.monotonic() + self.timeout
+        with self.cond:
+            if self.active < self.limit:
+                self.active += 1
+                return True
+            if self.waiting >= self.max_queue:
+                self.rejected += 1
+                return False
+            
+            self.waiting += 1
+            try:
+                while self.active >= self.limit:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.rejected += 1
+                        return False
+                    self.cond.wait(remaining)
+                self.active += 1
+                return True
+            finally:
+                self.waiting -= 1
+    
+    def release(self):
+        with self.cond:
+            self.active -= 1
+            self.cond.notify()
+    
+    def snapshot(self):
+        with self.cond:
+            return {
+                'limit': self.limit,
+                'active': self.active,
+                'waiting': self.waiting,
+                'rejected': self.rejected
+            }
+
+class TokenBucket:
+    """令牌桶，按固定速率补充"""
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+    
+    def take(self):
+        """取一个令牌，返回 (是否成功, 需要等待的秒数)"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True, 0
+        return False, (1 - self.tokens) / self.rate
+
+admission_gates = {
+    name: AdmissionGate(name, limit, max_queue, app.config['ADMISSION_QUEUE_TIMEOUT'])
+    for name, (limit, max_queue) in app.config['ADMISSION_LIMITS'].items()
+}
+client_buckets = {}
+client_buckets_lock = Lock()
+SEARCH_PATHS = ('/api/search',)
+EXPORT_PATHS = ('/api/export',)
+STREAM_PATHS = ('/api/changes/stream',)  # 长连接不占用并发名额
+
+def classify_request():
+    """按路径和方法划分路由类别，非API请求不做限制"""
+    if not request.path.startswith('/api/') or request.method == 'OPTIONS':
+        return None
+    if request.path.startswith(STREAM_PATHS):
+        return None
+    if request.path.startswith(SEARCH_PATHS):
+        return 'search'
+    if request.path.startswith(EXPORT_PATHS):
+        return 'export'
+    if request.method in ['POST', 'PUT', 'DELETE']:
+        return 'write'
+    return 'read'
+
+def client_key():
+    """客户端标识；配置了 TRUSTED_PROXY_HOPS 时 remote_addr 已由 ProxyFix 还原为代理转发的地址"""
+    return request.remote_addr or 'unknown'
+
+if app.config['TRUSTED_PROXY_HOPS'] > 0:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['TRUSTED_PROXY_HOPS'])
+
+def take_client_token():
+    with client_buckets_lock:
+        key = client_key()
+        bucket = client_buckets.get(key)
+        if bucket is None:
+            # 限制桶数量，清掉已经回满的旧桶
+            if len(client_buckets) > 10000:
+                now = time.monotonic()
+                for stale in [k for k, b in client_buckets.items() if now - b.updated > 60]:
+                    del client_buckets[stale]
+            bucket = client_buckets[key] = TokenBucket(app.config['RATE_LIMIT_PER_SEC'], app.config['RATE_LIMIT_BURST'])
+        return bucket.take()
+
+def overload_response(status, msg, retry_after):
+    response = jsonify({'code': status, 'msg': msg})
+    response.status_code = status
+    response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response
+
+@app.before_request
+def admission_control():
+    """请求准入：先过单客户端令牌桶，再过路由类别的并发闸门"""
+    if not app.config['ADMISSION_CONTROL']:
+        return None
+    route_class = classify_request()
+    if route_class is None:
+        return None
+    
+    if app.config['RATE_LIMIT_PER_SEC'] > 0:
+        allowed, retry_after = take_client_token()
+        if not allowed:
+            return overload_response(429, '请求过于频繁，请稍后重试', retry_after)
+    
+    gate = admission_gates[route_class]
+    if route_class == 'write' and current_workspace() != DEFAULT_WORKSPACE:
+        gate = workspaces.state().write_gate
+    if not gate.acquire():
+        logger.warning(f"准入拒绝 [{route_class}] {request.path}")
+        return overload_response(503, '服务繁忙，请稍后重试', gate.timeout)
+    g.admission_gate = gate
+    return None
+
+@app.teardown_request
+def release_admission(exc=None):
+    gate = g.pop('admission_gate', None)
+    if gate is not None:
+        gate.release()
+
+# ========== 请求性能剖析 ==========
+PROFILE_TOP_N = 15
+PROFILE_JSON_FILES = ('json/__init__.py', 'json/encoder.py', 'flask/json/provider.py')
+profile_counter = itertools.count(1)
+profile_lock = Lock()  # cProfile 同一时间只能有一个在运行（3.12+ 第二个 enable() 直接报错），并发的请求跳过剖析
+
+def profiling_requested():
+    """判断当前请求是否需要剖析：密钥头优先，其次按采样率"""
+    secret = app.config['PROFILE_SECRET']
+    header = request.headers.get('X-Profile', '')
+    if secret and header and hmac.compare_digest(header, secret):
+        return 'inline'
+    rate = app.config['PROFILE_SAMPLE_RATE']
+    if rate > 0 and next(profile_counter) % rate == 0:
+        return 'sample'
+    return None
+
+def start_profiling():
+    mode = profiling_requested()
+    if mode is None:
+        return None
+    if not profile_lock.acquire(blocking=False):
+        logger.debug(f"其他请求正在剖析，跳过: {request.path}")
+        return None
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError as e:  # 进程里已有其他剖析工具
+        profile_lock.release()
+        logger.warning(f"无法开启请求剖析: {e}")
+        return None
+    g.profile_mode = mode
+    g.profile_sql = {'count': 0, 'seconds': 0.0}
+    g.profile_started = time.perf_counter()
+    g.profiler = profiler
+    return None
+
+def stop_profiling(exc=None):
+    """请求中途出错、没有走到 finish_profiling 时也要停掉剖析器并归还锁"""
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.disable()
+        profile_lock.release()
+    return profiler
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('profile_query_start', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['profile_query_start'].pop()
+    stats = g.get('profile_sql') if g else None
+    if stats is not None:
+        stats['count'] += 1
+        stats['seconds'] += time.perf_counter() - started
+
+def summarize_profile(profiler, total_seconds, sql_stats):
+    """生成剖析摘要：最耗时函数、SQL时间、序列化时间"""
+    stats = pstats.Stats(profiler)
+    entries = []
+    serialization = 0.0
+    for (filename, line, name), (calls, _, tottime, cumtime, _) in stats.stats.items():
+        entries.append((cumtime, tottime, calls, f'{os.path.basename(filename)}:{line}({name})'))
+        if filename.replace('\\', '/').endswith(PROFILE_JSON_FILES):
+            serialization = max(serialization, cumtime)
+    entries.sort(reverse=True)
+    return {
+        'total_ms': round(total_seconds * 1000, 2),
+        'sql_ms': round(sql_stats['seconds'] * 1000, 2),
+        'sql_count': sql_stats['count'],
+        'serialization_ms': round(serialization * 1000, 2),
+        'top': [{
+            'function': label,
+            'calls': calls,
+            'self_ms': round(tottime * 1000, 2),
+            'cumulative_ms': round(cumtime * 1000, 2)
+        } for cumtime, tottime, calls, label in entries[:PROFILE_TOP_N]]
+    }
 
-def get_cached_node(node_id):
-    """获取缓存的节点"""
-    with cache_lock:
-        if node_id in node_cache:
-            data, timestamp = node_cache[node_id]
-            if (datetime.now() - timestamp).total_seconds() < CACHE_TIMEOUT:
-                return data
-        return None
+def write_profile_dump(profiler, summary):
+    """写入剖析文件（.prof 可用 snakeviz 等工具查看）并轮转旧文件"""
+    directory = app.config['PROFILE_DIR']
+    os.makedirs(directory, exist_ok=True)
+    stamp = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+    slug = re.sub(r'[^A-Za-z0-9]+', '_', request.path).strip('_') or 'root'
+    base = os.path.join(directory, f'{stamp}-{slug}')
+    profiler.dump_stats(base + '.prof')
+    with open(base + '.json', 'w', encoding='utf-8') as f:
+        json.dump(dict(summary, path=request.full_path, method=request.method), f, ensure_ascii=False, indent=2)
+    
+    dumps = sorted(name for name in os.listdir(directory) if name.endswith('.prof'))
+    for name in dumps[:-app.config['PROFILE_KEEP']]:
+        for suffix in ['.prof', '.json']:
+            try:
+                os.remove(os.path.join(directory, name[:-5] + suffix))
+            except OSError:
+                pass
 
-def set_cached_node(node_id, data):
-    """设置节点缓存"""
-    with cache_lock:
-        node_cache[node_id] = (data, datetime.now())
-        # 限制缓存大小
-        if len(node_cache) > 100:
-            # 删除最旧的缓存
-            oldest = min(node_cache.keys(), key=lambda k: node_cache[k][1])
-            del node_cache[oldest]
-
-def clear_node_cache(node_id=None):
-    """清除缓存"""
-    with cache_lock:
-        if node_id:
-            if node_id in node_cache:
-                del node_cache[node_id]
-        else:
-            node_cache.clear()
+def finish_profiling(response):
+    profiler = stop_profiling()
+    if profiler is None:
+        return response
+    summary = summarize_profile(profiler, time.perf_counter() - g.profile_started, g.pop('profile_sql'))
+    
+    response.headers['Server-Timing'] = (
+        f"total;dur={summary['total_ms']}, sql;dur={summary['sql_ms']}, "
+        f"serialize;dur={summary['serialization_ms']}"
+    )
+    if g.pop('profile_mode') == 'inline':
+        # JSON 响应直接附带摘要，其他响应只保留 Server-Timing 头
+        if response.is_json and not response.is_streamed:
+            body = response.get_json(silent=True)
+            if isinstance(body, dict):
+                body['profile'] = summary
+                response.set_data(json.dumps(body, ensure_ascii=False))
+    else:
+        try:
+            write_profile_dump(profiler, summary)
+        except OSError as e:
+            logger.warning(f"写入剖析文件失败: {e}")
+    return response
+
+# 未开启时不注册任何钩子，正常请求零开销
+if app.config['PROFILE_SECRET'] or app.config['PROFILE_SAMPLE_RATE'] > 0:
+    app.before_request(start_profiling)
+    app.after_request(finish_profiling)
+    app.teardown_request(stop_profiling)
+    sa.event.listen(sa.engine.Engine, 'before_cursor_execute', _before_cursor_execute)
+    sa.event.listen(sa.engine.Engine, 'after_cursor_execute', _after_cursor_execute)
 
 # ========== 安全头部 ==========
 @app.after_request
@@ -310,8 +2321,11 @@ def apply_security_headers(response):
     response.headers['Content-Security-Policy'] = csp_policy
     
     # 缓存控制
-    if request.path.startswith('/static/'):
-        response.headers['Cache-Control'] = 'public, max-age=31536000'
+    if request.path.startswith('/static/dist/'):
+        # 文件名带内容哈希，可以永久缓存
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    elif request.path.startswith('/static/'):
+        response.headers['Cache-Control'] = 'public, max-age=0, must-revalidate'
     elif request.path.startswith('/api/'):
         response.headers['Cache-Control'] = 'no-cache, max-age=0, must-revalidate'
     else:
@@ -324,10 +2338,48 @@ def apply_security_headers(response):
     
     return response
 
+# ========== 静态资源 ==========
+# build_assets.py 生成的带哈希文件清单，未构建时回退到 static/src/ 下的源文件
+ASSET_MANIFEST_PATH = os.path.join(BASE_DIR, 'static', 'dist', 'manifest.json')
+asset_manifest = {'mtime': None, 'entries': {}}
+
+def load_asset_manifest():
+    """读取资源清单，文件更新后自动重新加载"""
+    try:
+        mtime = os.stat(ASSET_MANIFEST_PATH).st_mtime
+    except OSError:
+        return {}
+    if asset_manifest['mtime'] != mtime:
+        try:
+            with open(ASSET_MANIFEST_PATH, 'r', encoding='utf-8') as f:
+                asset_manifest['entries'] = json.load(f)
+            asset_manifest['mtime'] = mtime
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取资源清单失败: {e}")
+            return {}
+    return asset_manifest['entries']
+
+@app.template_global()
+def asset_url(name):
+    """模板中引用静态资源：已构建时返回带内容哈希的压缩文件"""
+    hashed = load_asset_manifest().get(name)
+    if hashed:
+        return f'/static/dist/{hashed}'
+    if os.path.exists(os.path.join(BASE_DIR, 'static', 'src', name)):
+        return f'/static/src/{name}'
+    return f'/static/{name}'
+
 # ========== 路由 ==========
 @app.route('/')
 def index():
-    return render_template('index.html')
+    bootstrap = None
+    if app.config['BOOTSTRAP_EMBED']:
+        # 首屏数据内嵌到页面，省去额外的 /api 请求
+        try:
+            bootstrap = htmlsafe_json(build_bootstrap_json())
+        except Exception as e:
+            app.logger.error(f"内嵌首屏数据失败: {str(e)}")
+    return render_template('index.html', bootstrap=bootstrap)
 
 @app.route('/static/<path:filename>')
 def serve_static(filename):
@@ -338,91 +2390,105 @@ def serve_static(filename):
 def get_tree():
     """获取树形结构 - 优化版本"""
     try:
-        # 尝试从缓存获取
-        cached = get_cached_node('tree')
-        if cached:
-            return jsonify({'code': 200, 'data': cached})
-        
-        # 批量查询所有节点，避免N+1
-        all_nodes = Node.query.all()
-        
-        # 构建节点映射
-        nodes_by_id = {}
-        for node in all_nodes:
-            nodes_by_id[node.id] = node
-        
-        # 构建树结构
-        tree = []
-        for node in all_nodes:
-            if node.parent_id is None:
-                tree.append(build_tree_node(node, nodes_by_id))
-        
-        # 缓存结果
-        set_cached_node('tree', tree)
-        
-        return jsonify({'code': 200, 'data': tree})
+        return json_api_response(build_tree_json())
     except Exception as e:
         app.logger.error(f"获取树形结构失败: {str(e)}")
         return jsonify({'code': 500, 'msg': '服务器内部错误'}), 500
 
-def build_tree_node(node, nodes_by_id, depth=0):
-    """递归构建树节点，有深度限制"""
-    if depth > 10:  # 防止无限递归
-        return node.to_dict_simple()
-    
-    result = node.to_dict_simple()
+def build_tree_json(with_seq=False):
+    """构建完整树形结构的 JSON 文本，结果进入缓存供 /api/tree 与首屏数据共用"""
+    return cached_build('tree', render_tree_json, with_seq)
+
+def render_tree_json():
+    """不经缓存构建树形结构的 JSON 文本"""
+    if app.config['TREE_REPLICA']:
+        children_by_parent = refresh_tree_replica().children_map()
+    else:
+        # 批量查询所有节点，避免N+1；按 (parent_id, position) 索引顺序读出
+        all_nodes = Node.query.order_by(Node.parent_id, Node.position, Node.id).all()
+        
+        # 按父节点分组，保持查询顺序
+        children_by_parent = {}
+        for node in all_nodes:
+            children_by_parent.setdefault(node.parent_id, []).append(node)
     
-    # 查找子节点
-    children = []
-    for child_id, child_node in nodes_by_id.items():
-        if child_node.parent_id == node.id:
-            children.append(build_tree_node(child_node, nodes_by_id, depth + 1))
+    # 由节点片段拼接树结构，文件夹附带子树汇总（汇总表一次读出）
+    rollups = load_rollups()
+    return '[' + ','.join(
+        build_tree_node(node, children_by_parent, rollups) for node in children_by_parent.get(None, [])
+    ) + ']'
+
+def build_tree_node(node, children_by_parent, rollups, depth=0):
+    """递归拼接树节点片段，有深度限制"""
+    fragment = splice_rollup(node_fragment(node), rollups, node)
+    if depth > 10:  # 防止无限递归
+        return fragment
     
-    result['children'] = children
-    return result
+    children = [
+        build_tree_node(child, children_by_parent, rollups, depth + 1)
+        for child in children_by_parent.get(node.id, [])
+    ]
+    return splice_children(fragment, children)
 
 @app.route('/api/folder/<int:fid>')
 def get_folder(fid):
     """获取文件夹内容 - 优化版本"""
     try:
-        cache_key = f'folder_{fid}'
-        cached = get_cached_node(cache_key)
-        if cached:
-            return jsonify({'code': 200, 'data': cached})
-        
-        if fid == 0:
-            nodes = Node.query.filter_by(parent_id=None).all()
-        else:
-            nodes = Node.query.filter_by(parent_id=fid).all()
-        
-        # 只返回必要信息，不递归查询
-        result = [n.to_dict_simple() for n in nodes]
-        
-        set_cached_node(cache_key, result)
-        return jsonify({'code': 200, 'data': result})
+        return json_api_response(build_folder_json(fid))
     except Exception as e:
         app.logger.error(f"获取文件夹失败: {str(e)}")
         return jsonify({'code': 500, 'msg': '服务器内部错误'}), 500
 
+def build_folder_json(fid, with_seq=False):
+    """构建文件夹内容列表的 JSON 文本（带缓存）"""
+    return cached_build(f'folder_{fid}', lambda: render_folder_json(fid), with_seq)
+
+def render_folder_json(fid):
+    """不经缓存构建文件夹内容列表的 JSON 文本"""
+    if app.config['TREE_REPLICA']:
+        nodes = refresh_tree_replica().children_of(fid or None)
+    elif fid == 0:
+        nodes = Node.query.filter_by(parent_id=None).order_by(Node.position, Node.id).all()
+    else:
+        nodes = Node.query.filter_by(parent_id=fid).order_by(Node.position, Node.id).all()
+    
+    # 只返回必要信息，不递归查询；子文件夹的汇总按主键一次读出
+    rollups = load_rollups([n.id for n in nodes if n.type == 'folder'])
+    return '[' + ','.join(splice_rollup(node_fragment(n), rollups, n) for n in nodes) + ']'
+
 @app.route('/api/node/<int:nid>')
 def get_node(nid):
     """获取单个节点 - 优化版本"""
     try:
-        cached = get_cached_node(f'node_{nid}')
-        if cached:
-            return jsonify({'code': 200, 'data': cached})
-        
-        node = Node.query.get(nid)
-        if not node:
+        cached = cached_build(f'node_{nid}', lambda: build_node_payload(nid))
+        if cached is None:
             return jsonify({'code': 404, 'msg': '节点不存在'}), 404
+        result, child_fragments = cached
         
-        result = node.to_dict_with_children(max_depth=1)  # 只获取一层子节点
-        set_cached_node(f'node_{nid}', result)
-        return jsonify({'code': 200, 'data': result})
+        # ?highlight=1 时附带服务端预渲染的代码高亮
+        if request.args.get('highlight') == '1' and result.get('code_snippet'):
+            language = request.args.get('lang', HIGHLIGHT_DEFAULT_LANGUAGE)[:30]
+            result = dict(result, code_html=get_highlighted_code(result['code_snippet'], language))
+        return json_api_response(splice_children(dump_json(result), child_fragments))
     except Exception as e:
         app.logger.error(f"获取节点失败: {str(e)}")
         return jsonify({'code': 500, 'msg': '服务器内部错误'}), 500
 
+def build_node_payload(nid):
+    """单节点完整数据和一层子节点片段，节点不存在时返回 None"""
+    # 只有单节点接口加载完整正文
+    node = Node.query.options(sa.orm.undefer_group('content')).get(nid)
+    if not node:
+        return None
+    
+    # 只获取一层子节点，子节点直接复用片段
+    children = Node.query.filter_by(parent_id=nid).order_by(Node.position, Node.id).all()
+    rollups = load_rollups([n.id for n in [node] + children if n.type == 'folder'])
+    data = node.to_dict_full()
+    if nid in rollups:
+        data['rollup'] = rollups[nid]
+    return (data, [splice_rollup(node_fragment(child), rollups, child) for child in children])
+
 @app.route('/api/search')
 def search():
     """搜索 - 优化版本"""
@@ -454,8 +2520,11 @@ def search():
         
         # 3. 描述搜索 (低权重)
         if len(results) < 20:  # 如果结果不够，再搜索描述
+            usage_column = Node.usage
+            if db.engine.dialect.name == 'sqlite':
+                usage_column = sa.func.wiki_inflate(Node.usage)
             usage_matches = Node.query.filter(
-                Node.usage.ilike(f'%{keyword}%')
+                usage_column.ilike(f'%{keyword}%')
             ).limit(20).all()
             
             for node in usage_matches:
@@ -501,12 +2570,12 @@ def build_search_result(node, keyword, field, base_relevance):
     preview = ''
     if field == 'title':
         preview = highlight_text(node.title, keyword)
-    elif field == 'usage' and node.usage:
-        preview = highlight_text(node.usage[:150], keyword)
+    elif field == 'usage' and node.usage_preview:
+        preview = highlight_text(node.usage_preview[:150], keyword)
     elif field == 'tags' and node.tags:
         preview = highlight_text(node.tags, keyword)
-    elif node.usage:
-        preview = highlight_text(node.usage[:150], keyword)
+    elif node.usage_preview:
+        preview = highlight_text(node.usage_preview[:150], keyword)
     
     return {
         'id': node.id,
@@ -520,10 +2589,31 @@ def build_search_result(node, keyword, field, base_relevance):
         'match_details': [{'field': field, 'content': preview}]
     }
 
+@app.route('/api/suggest')
+def suggest():
+    """输入联想 - 内存 n-gram 索引，单字即可查询"""
+    try:
+        keyword = request.args.get('q', '').strip()
+        limit = min(request.args.get('limit', 10, type=int), 50)
+        if not keyword:
+            return jsonify({'code': 200, 'data': []})
+        return jsonify({'code': 200, 'data': refresh_suggest_index().query(keyword[:100], limit)})
+    except Exception as e:
+        app.logger.error(f"联想查询失败: {str(e)}")
+        return jsonify({'code': 500, 'msg': '联想查询失败'}), 500
+
 @app.route('/api/breadcrumbs/<int:nid>')
 def get_breadcrumbs_api(nid):
     """获取面包屑 - 优化版本"""
     try:
+        if app.config['TREE_REPLICA']:
+            chain = refresh_tree_replica().ancestors(nid)
+            if not chain:
+                return jsonify({'code': 404, 'msg': '节点不存在'}), 404
+            return jsonify({'code': 200, 'data': [
+                {'id': n.id, 'title': n.title, 'type': n.type} for n in chain
+            ]})
+        
         crumbs = []
         node = Node.query.get(nid)
         if not node:
@@ -609,6 +2699,8 @@ def save():
             node = Node.query.get(node_id)
             if not node:
                 return jsonify({'code': 404, 'msg': '节点不存在'}), 404
+            old_parent_id = node.parent_id
+            before = subtree_totals(node.id)
 
             # 检查是否真的需要保存历史记录
             should_save_history = (
@@ -622,7 +2714,7 @@ def save():
                 history = History(
                     note_id=node.id,
                     title=node.title,
-                    content=json.dumps(node.to_dict_simple(), ensure_ascii=False)
+                    content=json.dumps(node.to_dict_full(), ensure_ascii=False)
                 )
                 db.session.add(history)
 
@@ -630,6 +2722,8 @@ def save():
             node.title = clean_title
             node.usage = sanitize_input(data.get('usage', ''))
             node.code_snippet = sanitize_input(data.get('code_snippet', ''))
+            if node.parent_id != pid:
+                node.position = next_position(pid)
             node.parent_id = pid
             node.is_expanded = bool(data.get('is_expanded', node.is_expanded))
             
@@ -646,6 +2740,8 @@ def save():
             node.updated_at = datetime.now()
             
             db.session.flush()  # 立即刷新，但不提交
+            record_change([node.id])
+            update_rollups(old_parent_id, before, node.parent_id, subtree_totals(node.id))
             
         else:
             # 创建新节点
@@ -653,6 +2749,7 @@ def save():
                 title=clean_title,
                 type=node_type,
                 parent_id=pid,
+                position=next_position(pid),
                 usage=sanitize_input(data.get('usage', '')),
                 code_snippet=sanitize_input(data.get('code_snippet', '')),
                 custom_modules=custom_json,
@@ -661,10 +2758,21 @@ def save():
             )
             db.session.add(node)
             db.session.flush()  # 获取ID
+            record_change([node.id])
+            if node.type == 'folder':
+                db.session.add(NodeRollup(folder_id=node.id))
+            update_rollups(None, None, pid, subtree_totals(node.id))
     
     # 清除相关缓存
     clear_node_cache()
     
+    # 保存时预渲染代码高亮，打开笔记时直接命中缓存
+    if node.type == 'note' and node.code_snippet:
+        try:
+            get_highlighted_code(node.code_snippet)
+        except Exception as e:
+            logger.warning(f"预渲染代码高亮失败: {e}")
+    
     return jsonify({
         'code': 200, 
         'data': {
@@ -701,17 +2809,23 @@ def delete_nodes():
             except ValueError:
                 return jsonify({'code': 400, 'msg': f'无效的节点ID: {node_id}'}), 400
 
-        # 批量删除
+        # 移入回收站：每棵子树一条 UPDATE，物理删除交给后台线程
         try:
+            trashed_ids = []
             for node in nodes_to_delete:
-                db.session.delete(node)
+                # 已随先删除的祖先进入回收站的节点不再重复扣减
+                before = subtree_totals(node.id)
+                trashed_ids.extend(trash_subtree(node.id))
+                if before is not None:
+                    update_rollups(node.parent_id, before, None, None)
+            record_change(trashed_ids, 'delete')
             
             db.session.commit()
             
             # 清除缓存
             clear_node_cache()
             
-            return jsonify({'code': 200, 'msg': '删除成功'})
+            return jsonify({'code': 200, 'msg': '已移入回收站', 'data': {'count': len(trashed_ids)}})
         except Exception as e:
             db.session.rollback()
             raise e
@@ -720,6 +2834,56 @@ def delete_nodes():
         app.logger.error(f"删除节点失败: {str(e)}")
         return jsonify({'code': 500, 'msg': f'删除失败: {str(e)}'}), 500
 
+@app.route('/api/trash')
+def get_trash():
+    """回收站列表：每次删除的子树根节点及其包含的节点数"""
+    try:
+        counts = dict(db.session.query(Node.trash_root_id, sa.func.count(Node.id))
+                                .filter(Node.trash_root_id.isnot(None))
+                                .group_by(Node.trash_root_id)
+                                .execution_options(include_trashed=True).all())
+        roots = Node.query.filter(Node.id.in_(counts.keys()) if counts else sa.false())\
+                          .order_by(Node.deleted_at.desc())\
+                          .execution_options(include_trashed=True).all()
+        return jsonify({'code': 200, 'data': [{
+            'id': n.id,
+            'title': n.title,
+            'type': n.type,
+            'parent_id': n.parent_id,
+            'deleted_at': n.deleted_at.isoformat() if n.deleted_at else None,
+            'count': counts.get(n.id, 0)
+        } for n in roots]})
+    except Exception as e:
+        app.logger.error(f"获取回收站失败: {str(e)}")
+        return jsonify({'code': 500, 'msg': '服务器内部错误'}), 500
+
+@app.route('/api/trash/restore', methods=['POST'])
+def restore_trash():
+    """从回收站恢复整棵子树"""
+    try:
+        data = request.json or {}
+        try:
+            root_id = int(data.get('id'))
+        except (ValueError, TypeError):
+            return jsonify({'code': 400, 'msg': '无效的节点ID'}), 400
+        
+        restored_ids = restore_subtree(root_id)
+        if not restored_ids:
+            return jsonify({'code': 404, 'msg': '回收站中没有该节点'}), 404
+        record_change(restored_ids, 'upsert')
+        # 子树在回收站期间可能被部分清理或单独恢复过，先重算子树内部再累加到新的祖先路径
+        recompute_rollups(root_id)
+        parent_id = db.session.query(Node.parent_id).filter(Node.id == root_id).scalar()
+        update_rollups(None, None, parent_id, subtree_totals(root_id))
+        db.session.commit()
+        
+        clear_node_cache()
+        return jsonify({'code': 200, 'msg': '恢复成功', 'data': {'count': len(restored_ids)}})
+    except Exception as e:
+        db.session.rollback()
+        app.logger.error(f"恢复节点失败: {str(e)}")
+        return jsonify({'code': 500, 'msg': f'恢复失败: {str(e)}'}), 500
+
 @app.route('/api/move', methods=['POST'])
 def move_node():
     """移动节点 - 优化版本"""
@@ -760,15 +2924,20 @@ def move_node():
                 if target_node.type != 'folder':
                     return jsonify({'code': 400, 'msg': '目标不是有效的文件夹'}), 400
                 
-                if is_descendant(target_id, item_id):
+                if is_descendant(item_id, target_id):
                     return jsonify({'code': 400, 'msg': '不能将文件夹移动到自己的子文件夹中'}), 400
             
             # 检查是否真的需要移动
             if node_to_move.parent_id == target_id:
                 return jsonify({'code': 200, 'msg': '节点已在目标位置'})
             
+            old_parent_id = node_to_move.parent_id
+            before = subtree_totals(item_id)
+            node_to_move.position = next_position(target_id)
             node_to_move.parent_id = target_id
             node_to_move.updated_at = datetime.now()
+            record_change([node_to_move.id])
+            update_rollups(old_parent_id, before, target_id, subtree_totals(item_id))
         
         # 清除缓存
         clear_node_cache()
@@ -784,39 +2953,273 @@ def move_node():
         app.logger.error(f"移动节点错误: {str(e)}")
         return jsonify({'code': 500, 'msg': f'移动失败: {str(e)}'}), 500
 
+@app.route('/api/reorder', methods=['POST'])
+def reorder_node():
+    """调整节点顺序：放到 before_id 之前或 after_id 之后（都不传则放到 parent_id 末尾），
+    只更新被移动节点的 position，间隔用完时才重排同级节点"""
+    try:
+        data = request.json
+        if not data:
+            return jsonify({'code': 400, 'msg': '请求数据为空'}), 400
+        
+        try:
+            item_id = int(data.get('id'))
+            before_id = int(data['before_id']) if data.get('before_id') is not None else None
+            after_id = int(data['after_id']) if data.get('after_id') is not None else None
+            target_parent_id = int(data['parent_id']) if data.get('parent_id') else None
+        except (ValueError, TypeError):
+            return jsonify({'code': 400, 'msg': '无效的节点ID'}), 400
+        
+        node = Node.query.get(item_id)
+        if not node:
+            return jsonify({'code': 404, 'msg': '节点不存在'}), 404
+        
+        anchor_id = before_id if before_id is not None else after_id
+        if anchor_id is not None:
+            if anchor_id == item_id:
+                return jsonify({'code': 400, 'msg': '参照节点不能是自身'}), 400
+            anchor = Node.query.get(anchor_id)
+            if not anchor:
+                return jsonify({'code': 404, 'msg': '参照节点不存在'}), 404
+            parent_id = anchor.parent_id
+        elif 'parent_id' in data:
+            parent_id = target_parent_id
+        else:
+            parent_id = node.parent_id
+        
+        # 跨文件夹调整顺序时按移动处理
+        if parent_id != node.parent_id and parent_id is not None:
+            target = Node.query.get(parent_id)
+            if not target or target.type != 'folder':
+                return jsonify({'code': 400, 'msg': '目标文件夹不存在'}), 400
+            if node.type == 'folder' and is_descendant(item_id, parent_id):
+                return jsonify({'code': 400, 'msg': '不能将文件夹移动到自己的子文件夹中'}), 400
+        
+        lo, hi = neighbor_positions(parent_id, item_id, before_id, after_id)
+        position = position_between(lo, hi)
+        if position is None:
+            # 间隔已用完：同步重排这一组后重新取位置
+            rebalance_siblings(parent_id)
+            lo, hi = neighbor_positions(parent_id, item_id, before_id, after_id)
+            position = position_between(lo, hi)
+        elif lo is not None and hi is not None and min(position - lo, hi - position) < POSITION_MIN_GAP:
+            position_rebalancer.schedule(parent_id)
+        
+        node_table = Node.__table__
+        values = {'position': position, 'parent_id': parent_id}
+        before = None
+        if parent_id == node.parent_id:
+            values['updated_at'] = node_table.c.updated_at  # 只调整顺序不算编辑
+        else:
+            before = subtree_totals(item_id)
+        db.session.execute(sa.update(node_table).where(node_table.c.id == item_id).values(**values))
+        record_change([item_id])
+        if before is not None:
+            update_rollups(node.parent_id, before, parent_id, subtree_totals(item_id))
+        db.session.commit()
+        
+        clear_node_cache()
+        return jsonify({'code': 200, 'msg': '排序成功', 'data': {'id': item_id, 'parent_id': parent_id, 'position': position}})
+    except Exception as e:
+        db.session.rollback()
+        app.logger.error(f"调整顺序失败: {str(e)}")
+        return jsonify({'code': 500, 'msg': f'调整顺序失败: {str(e)}'}), 500
+
+@app.route('/api/copy', methods=['POST'])
+def copy_node():
+    """复制子树 - 集合操作版本，整棵子树只需几条SQL"""
+    try:
+        data = request.json
+        if not data:
+            return jsonify({'code': 400, 'msg': '请求数据为空'}), 400
+        
+        item_id = data.get('itemId')
+        target_id = data.get('targetId')
+        copy_tags = bool(data.get('copyTags', True))
+        copy_favorites = bool(data.get('copyFavorites', False))
+        
+        if not item_id:
+            return jsonify({'code': 400, 'msg': '缺少要复制的项目ID'}), 400
+        
+        try:
+            item_id = int(item_id)
+            if target_id is not None:
+                target_id = int(target_id)
+                if target_id == 0:
+                    target_id = None
+        except ValueError:
+            return jsonify({'code': 400, 'msg': 'ID格式错误'}), 400
+        
+        source = Node.query.get(item_id)
+        if not source:
+            return jsonify({'code': 404, 'msg': '要复制的节点不存在'}), 404
+        
+        if target_id is not None:
+            target_node = Node.query.get(target_id)
+            if not target_node or target_node.type != 'folder':
+                return jsonify({'code': 400, 'msg': '目标不是有效的文件夹'}), 400
+        
+        # 复制到同一目录时标题加后缀，避免重名
+        new_title = source.title
+        if source.parent_id == target_id:
+            new_title = f"{source.title[:195]} - 副本"
+        
+        try:
+            result = copy_subtree(item_id, target_id, new_title, copy_tags, copy_favorites)
+            recompute_rollups(result['id'])
+            update_rollups(None, None, target_id, subtree_totals(result['id']))
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            raise e
+        
+        clear_node_cache()
+        
+        return jsonify({'code': 200, 'msg': '复制成功', 'data': result})
+    except Exception as e:
+        db.session.rollback()
+        app.logger.error(f"复制节点错误: {str(e)}")
+        return jsonify({'code': 500, 'msg': f'复制失败: {str(e)}'}), 500
+
+def copy_subtree(source_id, target_id, new_title, copy_tags=True, copy_favorites=False):
+    """用递归CTE和ID映射表复制子树，不复制历史记录
+    
+    1. 递归CTE收集子树ID，按顺序分配新ID写入临时映射表
+    2. 一条 INSERT ... SELECT 写入全部新节点，父ID通过映射表换算
+    调用方负责提交事务。
+    """
+    db.session.execute(sa.text(
+        'CREATE TEMP TABLE IF NOT EXISTS node_copy_map ('
+        'old_id INTEGER PRIMARY KEY, new_id INTEGER NOT NULL)'
+    ))
+    db.session.execute(sa.text('DELETE FROM node_copy_map'))
+    db.session.execute(sa.text('''
+        INSERT INTO node_copy_map (old_id, new_id)
+        WITH RECURSIVE subtree(id) AS (
+            SELECT :source_id
+            UNION
+            SELECT n.id FROM node n JOIN subtree s ON n.parent_id = s.id WHERE n.deleted_at IS NULL
+        )
+        SELECT id, (SELECT COALESCE(MAX(id), 0) FROM node) + ROW_NUMBER() OVER (ORDER BY id)
+        FROM subtree
+    '''), {'source_id': source_id})
+    
+    tags_expr = 'n.tags' if copy_tags else "''"
+    favorite_expr = 'n.is_favorite' if copy_favorites else ':not_favorite'
+    copied = db.session.execute(sa.text(f'''
+        INSERT INTO node (id, parent_id, title, type, usage, code_snippet, custom_modules,
+                          usage_preview, code_preview, is_expanded, tags, is_favorite,
+                          position, created_at, updated_at)
+        SELECT m.new_id,
+               CASE WHEN n.id = :source_id THEN :target_id ELSE pm.new_id END,
+               CASE WHEN n.id = :source_id THEN :new_title ELSE n.title END,
+               n.type, n.usage, n.code_snippet, n.custom_modules,
+               n.usage_preview, n.code_preview, n.is_expanded,
+               {tags_expr}, {favorite_expr},
+               CASE WHEN n.id = :source_id THEN :root_position ELSE n.position END,
+               :now, :now
+        FROM node_copy_map m
+        JOIN node n ON n.id = m.old_id
+        LEFT JOIN node_copy_map pm ON pm.old_id = n.parent_id
+    '''), {
+        'source_id': source_id,
+        'target_id': target_id,
+        'new_title': new_title,
+        'not_favorite': False,
+        'root_position': next_position(target_id),
+        'now': datetime.now()
+    }).rowcount
+    
+    new_root_id = db.session.execute(
+        sa.text('SELECT new_id FROM node_copy_map WHERE old_id = :source_id'),
+        {'source_id': source_id}
+    ).scalar()
+    db.session.execute(sa.text(
+        "INSERT INTO change_log (node_id, op, created_at) SELECT new_id, 'upsert', :now FROM node_copy_map"
+    ), {'now': datetime.now()})
+    db.session.execute(sa.text('DELETE FROM node_copy_map'))
+    
+    # PostgreSQL 显式写入ID后需要同步序列
+    if db.engine.dialect.name == 'postgresql':
+        db.session.execute(sa.text("SELECT setval(pg_get_serial_sequence('node', 'id'), (SELECT MAX(id) FROM node))"))
+    
+    return {'id': new_root_id, 'title': new_title, 'count': copied}
+
 @app.route('/api/favorites')
 def get_favorites():
     """获取收藏列表 - 优化版本"""
     try:
-        favorites = Node.query.filter_by(is_favorite=True).limit(50).all()
-        return jsonify({'code': 200, 'data': [{
-            'id': n.id,
-            'title': n.title,
-            'type': n.type,
-            'parent_id': n.parent_id
-        } for n in favorites]})
+        return jsonify({'code': 200, 'data': build_favorites_payload()})
     except Exception as e:
         app.logger.error(f"获取收藏列表失败: {str(e)}")
         return jsonify({'code': 500, 'msg': '服务器内部错误'}), 500
 
+def build_favorites_payload(with_seq=False):
+    """构建收藏列表（带缓存）"""
+    return cached_build('favorites', render_favorites_payload, with_seq)
+
+def render_favorites_payload():
+    if app.config['TREE_REPLICA']:
+        favorites = refresh_tree_replica().favorite_nodes(50)
+    else:
+        favorites = Node.query.filter_by(is_favorite=True).limit(50).all()
+    return [{
+        'id': n.id,
+        'title': n.title,
+        'type': n.type,
+        'parent_id': n.parent_id
+    } for n in favorites]
+
 @app.route('/api/recent')
 def get_recent():
     """获取最近编辑 - 优化版本"""
     try:
-        recent = Node.query.filter_by(type='note')\
-                          .order_by(Node.updated_at.desc())\
-                          .limit(10).all()
-        return jsonify({'code': 200, 'data': [{
-            'id': n.id,
-            'title': n.title,
-            'type': n.type,
-            'updated_at': n.updated_at.isoformat() if n.updated_at else None,
-            'usage': n.usage[:100] + '...' if n.usage and len(n.usage) > 100 else (n.usage or '')
-        } for n in recent]})
+        return jsonify({'code': 200, 'data': build_recent_payload()})
     except Exception as e:
         app.logger.error(f"获取最近编辑失败: {str(e)}")
         return jsonify({'code': 500, 'msg': '服务器内部错误'}), 500
 
+def build_recent_payload(with_seq=False):
+    """构建最近编辑列表（带缓存）"""
+    return cached_build('recent', render_recent_payload, with_seq)
+
+def render_recent_payload():
+    recent = Node.query.filter_by(type='note')\
+                      .order_by(Node.updated_at.desc())\
+                      .limit(10).all()
+    return [{
+        'id': n.id,
+        'title': n.title,
+        'type': n.type,
+        'updated_at': n.updated_at.isoformat() if n.updated_at else None,
+        'usage': n.usage_preview[:100] + '...' if n.usage_preview and len(n.usage_preview) > 100 else (n.usage_preview or '')
+    } for n in recent]
+
+@app.route('/api/bootstrap')
+def get_bootstrap():
+    """首屏数据包 - 一次请求返回树、根目录、最近编辑和收藏"""
+    try:
+        return json_api_response(build_bootstrap_json())
+    except Exception as e:
+        app.logger.error(f"获取首屏数据失败: {str(e)}")
+        return jsonify({'code': 500, 'msg': '服务器内部错误'}), 500
+
+def build_bootstrap_json():
+    """组装首屏数据的 JSON 文本，各部分复用独立的缓存片段"""
+    # 各部分可能是不同时刻构建的缓存，取其中最早的流水序号，客户端从该序号开始增量同步
+    tree, tree_seq = build_tree_json(with_seq=True)
+    folder, folder_seq = build_folder_json(0, with_seq=True)
+    recent, recent_seq = build_recent_payload(with_seq=True)
+    favorites, favorites_seq = build_favorites_payload(with_seq=True)
+    seq = min(tree_seq, folder_seq, recent_seq, favorites_seq)
+    return (
+        '{"seq":' + dump_json(seq) +
+        ',"tree":' + tree +
+        ',"folder":' + folder +
+        ',"recent":' + dump_json(recent) +
+        ',"favorites":' + dump_json(favorites) + '}'
+    )
+
 @app.route('/api/toggle_favorite', methods=['POST'])
 def toggle_favorite():
     """切换收藏状态 - 优化版本"""
@@ -831,8 +3234,11 @@ def toggle_favorite():
         if not node:
             return jsonify({'code': 404, 'msg': '节点不存在'}), 404
         
+        before = subtree_totals(node.id)
         node.is_favorite = not node.is_favorite
         node.updated_at = datetime.now()
+        record_change([node.id])
+        update_rollups(node.parent_id, before, node.parent_id, subtree_totals(node.id))
         db.session.commit()
         
         # 清除缓存
@@ -882,11 +3288,12 @@ def restore_history(history_id):
         
         # 开始事务
         with db.session.begin_nested():
+            before = subtree_totals(note.id)
             # 保存当前状态到历史记录
             new_history = History(
                 note_id=note.id,
                 title=note.title,
-                content=json.dumps(note.to_dict_simple(), ensure_ascii=False)
+                content=json.dumps(note.to_dict_full(), ensure_ascii=False)
             )
             db.session.add(new_history)
             
@@ -908,6 +3315,8 @@ def restore_history(history_id):
                     note.custom_modules = json.dumps(custom_modules, ensure_ascii=False)
                     
                     note.updated_at = datetime.now()
+                    record_change([note.id])
+                    update_rollups(note.parent_id, before, note.parent_id, subtree_totals(note.id))
                 except json.JSONDecodeError:
                     return jsonify({'code': 500, 'msg': '历史记录数据格式错误'}), 500
         
@@ -920,24 +3329,455 @@ def restore_history(history_id):
         app.logger.error(f"恢复历史记录失败: {str(e)}")
         return jsonify({'code': 500, 'msg': f'恢复失败: {str(e)}'}), 500
 
+@app.route('/api/changes')
+def get_changes():
+    """增量同步：返回 since 之后变更和删除的节点"""
+    try:
+        since = request.args.get('since', 0, type=int)
+        return jsonify({'code': 200, 'data': build_changes_since(since)})
+    except Exception as e:
+        app.logger.error(f"获取变更失败: {str(e)}")
+        return jsonify({'code': 500, 'msg': '服务器内部错误'}), 500
+
+@app.route('/api/changes/stream')
+def stream_changes():
+    """SSE 推送变更，内容与 /api/changes 相同
+    
+    每个连接占住一个 worker 线程最长 CHANGE_STREAM_MAX_AGE 秒，只适合少量外部订阅者；页面使用短轮询 /api/changes。
+    """
+    since = request.args.get('since', type=int)
+    if since is None:
+        since = request.headers.get('Last-Event-ID', 0, type=int)
+    
+    def generate(since):
+        started = time.monotonic()
+        last_beat = started
+        yield 'retry: 3000\n\n'
+        while time.monotonic() - started < CHANGE_STREAM_MAX_AGE:
+            try:
+                delta = build_changes_since(since)
+            finally:
+                # 每次轮询后归还连接，不长期占用连接池
+                db.session.rollback()
+            if delta['seq'] > since:
+                since = delta['seq']
+                payload = json.dumps(delta, ensure_ascii=False, separators=(',', ':'))
+                yield f'id: {since}\nevent: changes\ndata: {payload}\n\n'
+            elif time.monotonic() - last_beat > 15:
+                yield ': keep-alive\n\n'
+                last_beat = time.monotonic()
+            else:
+                time.sleep(CHANGE_STREAM_POLL)
+                continue
+            last_beat = time.monotonic()
+    
+    return Response(stream_with_context(generate(since)), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.route('/api/pool_stats')
+def get_pool_stats():
+    """连接池、准入控制、树副本与缓存的运行指标，连接池和树副本按当前工作区"""
+    try:
+        return jsonify({'code': 200, 'data': {
+            'pool': pool_snapshot(db.engine.pool),
+            'admission': {name: gate.snapshot() for name, gate in admission_gates.items()},
+            'tree_replica': workspaces.state().tree_replica.memory_usage() if app.config['TREE_REPLICA'] else None,
+            'cache': dict(cache_stats, entries=len(node_cache), in_flight=len(cache_flights)),
+            'workspaces': workspaces.snapshot() if app.config['WORKSPACES'] else None
+        }})
+    except Exception as e:
+        app.logger.error(f"获取连接池指标失败: {str(e)}")
+        return jsonify({'code': 500, 'msg': '服务器内部错误'}), 500
+
+@app.route('/api/workspaces', methods=['GET'])
+def list_workspaces():
+    """全部工作区及本进程中已打开的分片"""
+    if not app.config['WORKSPACES']:
+        return jsonify({'code': 404, 'msg': '未开启多工作区'}), 404
+    opened = set(workspaces.open_names())
+    return jsonify({'code': 200, 'data': [
+        {'name': name, 'open': name in opened, 'current': name == current_workspace()}
+        for name in workspaces.names()
+    ]})
+
+@app.route('/api/workspaces', methods=['POST'])
+def add_workspace():
+    """新建工作区"""
+    if not app.config['WORKSPACES']:
+        return jsonify({'code': 404, 'msg': '未开启多工作区'}), 404
+    try:
+        name = ((request.get_json(silent=True) or {}).get('name') or '').strip()
+        if not create_workspace(name):
+            return jsonify({'code': 409, 'msg': '工作区已存在'}), 409
+        return jsonify({'code': 200, 'data': {'name': name}})
+    except ValueError as e:
+        return jsonify({'code': 400, 'msg': str(e)}), 400
+    except Exception as e:
+        app.logger.error(f"创建工作区失败: {str(e)}")
+        return jsonify({'code': 500, 'msg': '服务器内部错误'}), 500
+
+# ========== 导入导出 ==========
+EXPORT_FORMAT_VERSION = 1
+EXPORT_BATCH_SIZE = 500  # 服务端游标每批读取行数
+IMPORT_BATCH_SIZE = 1000  # executemany 每批插入行数
+
+NODE_EXPORT_COLUMNS = [
+    'id', 'parent_id', 'title', 'type', 'usage', 'code_snippet', 'custom_modules',
+    'is_expanded', 'tags', 'is_favorite', 'position', 'created_at', 'updated_at'
+]
+HISTORY_EXPORT_COLUMNS = ['id', 'note_id', 'title', 'content', 'created_at']
+
+def _export_row(kind, row, columns):
+    """把一行数据转换成导出记录"""
+    record = {'kind': kind}
+    for column in columns:
+        value = row[column]
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        record[column] = value
+    return record
+
+def iter_export_records(include_history=False):
+    """按 id 顺序流式产出导出记录，内存占用与数据量无关"""
+    yield {
+        'kind': 'meta',
+        'version': EXPORT_FORMAT_VERSION,
+        'exported_at': datetime.now().isoformat(),
+        'include_history': include_history
+    }
+    
+    node_table = Node.__table__
+    stmt = sa.select(*[node_table.c[c] for c in NODE_EXPORT_COLUMNS])\
+             .where(node_table.c.deleted_at.is_(None))\
+             .order_by(node_table.c.id)
+    result = db.session.execute(stmt, execution_options={'yield_per': EXPORT_BATCH_SIZE})
+    for row in result.mappings():
+        yield _export_row('node', row, NODE_EXPORT_COLUMNS)
+    
+    if include_history:
+        history_table = History.__table__
+        stmt = sa.select(*[history_table.c[c] for c in HISTORY_EXPORT_COLUMNS]).order_by(history_table.c.id)
+        result = db.session.execute(stmt, execution_options={'yield_per': EXPORT_BATCH_SIZE})
+        for row in result.mappings():
+            yield _export_row('history', row, HISTORY_EXPORT_COLUMNS)
+
+def iter_export_ndjson(include_history=False):
+    """NDJSON 格式导出，每行一条记录"""
+    for record in iter_export_records(include_history):
+        yield json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n'
+
+class _ZipStreamSink:
+    """只写缓冲区，供 zipfile 在不可 seek 的流上边压缩边输出"""
+    def __init__(self):
+        self.chunks = []
+    
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+    
+    def flush(self):
+        pass
+    
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+def iter_export_zip(include_history=False):
+    """zip 格式导出，压缩包内为同样的 NDJSON 记录流"""
+    sink = _ZipStreamSink()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        with archive.open('export.ndjson', 'w', force_zip64=True) as entry:  # 流式写入时不知道大小，超过 2GB 需要 ZIP64
+            for line in iter_export_ndjson(include_history):
+                entry.write(line.encode('utf-8'))
+                if len(sink.chunks) > 16:
+                    yield sink.drain()
+    yield sink.drain()
+
+def iter_import_records(fileobj):
+    """从 NDJSON 或 zip 文件对象中逐条读取记录"""
+    if zipfile.is_zipfile(fileobj):
+        fileobj.seek(0)
+        with zipfile.ZipFile(fileobj) as archive:
+            with archive.open('export.ndjson') as entry:
+                yield from _iter_ndjson_lines(io.TextIOWrapper(entry, encoding='utf-8'))
+    else:
+        fileobj.seek(0)
+        yield from _iter_ndjson_lines(io.TextIOWrapper(fileobj, encoding='utf-8'))
+
+def _iter_ndjson_lines(text_stream):
+    for line_no, line in enumerate(text_stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"第{line_no}行不是有效的JSON: {e}")
+
+def _parse_datetime(value):
+    if not value:
+        return datetime.now()
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return datetime.now()
+
+def _import_node_row(record):
+    """把导出记录转换成待插入的 node 行（父节点稍后重映射）"""
+    node_type = record.get('type') if record.get('type') in ['folder', 'note'] else 'note'
+    custom_modules = record.get('custom_modules')
+    if not isinstance(custom_modules, str):
+        custom_modules = json.dumps(custom_modules or [], ensure_ascii=False, separators=(',', ':'))
+    tags = record.get('tags')
+    if isinstance(tags, list):
+        tags = ','.join(str(tag).strip() for tag in tags if str(tag).strip())
+    usage = record.get('usage') or ''
+    code_snippet = record.get('code_snippet') or ''
+    return {
+        'parent_id': None,
+        'title': str(record.get('title') or '未命名')[:200],
+        'type': node_type,
+        'usage': usage,
+        'code_snippet': code_snippet,
+        'custom_modules': custom_modules,
+        'usage_preview': usage[:PREVIEW_LENGTH],
+        'code_preview': code_snippet[:PREVIEW_LENGTH],
+        'is_expanded': bool(record.get('is_expanded')),
+        'tags': (tags or '')[:500],
+        'is_favorite': bool(record.get('is_favorite')),
+        'position': record.get('position') if isinstance(record.get('position'), int) else 0,
+        'created_at': _parse_datetime(record.get('created_at')),
+        'updated_at': _parse_datetime(record.get('updated_at'))
+    }
+
+def drop_secondary_indexes(table):
+    """删除表上的二级索引，返回重建所需的 (表, 索引定义) 列表"""
+    inspector = sa.inspect(db.session.connection())
+    definitions = inspector.get_indexes(table.name)
+    for definition in definitions:
+        db.session.execute(sa.text(f'DROP INDEX IF EXISTS {definition["name"]}'))
+    return [(table, definition) for definition in definitions]
+
+def restore_secondary_indexes(dropped):
+    """按 drop_secondary_indexes 返回的定义重建索引"""
+    for table, definition in dropped:
+        columns = [table.c[name] for name in definition['column_names'] if name in table.c]
+        if columns:
+            # dialect_options 带有部分索引的 WHERE 条件
+            index = sa.Index(definition['name'], *columns, unique=bool(definition.get('unique')),
+                             **definition.get('dialect_options', {}))
+            index.create(bind=db.session.connection(), checkfirst=True)
+            # sa.Index 会挂到模型的表上，不摘掉的话之后 create_all 会重复建同名索引
+            table.indexes.discard(index)
+
+def import_records(records, target_parent_id=None, defer_indexes=False, progress=None):
+    """批量导入记录
+    
+    节点按批 executemany 插入并取回新ID；父节点已导入的直接写入新 parent_id，
+    否则在最后统一回填。源数据中的根节点挂到 target_parent_id 下。
+    整个导入在一个事务内完成，结束后统一清除缓存。
+    """
+    node_table = Node.__table__
+    history_table = History.__table__
+    insert_nodes = sa.insert(node_table).returning(node_table.c.id, sort_by_parameter_order=True)
+    
+    id_map = {}  # 源ID -> 新ID
+    pending_parents = []  # (新ID, 源父ID)，父节点尚未导入
+    node_batch, node_sources = [], []
+    history_batch = []
+    stats = {'nodes': 0, 'history': 0, 'skipped': 0}
+    dropped_indexes = []
+    
+    def report():
+        if progress:
+            progress(dict(stats))
+    
+    def flush_nodes():
+        if not node_batch:
+            return
+        new_ids = db.session.execute(insert_nodes, node_batch).scalars().all()
+        for (source_id, source_parent), new_id in zip(node_sources, new_ids):
+            if source_id is not None:
+                id_map[source_id] = new_id
+            if source_parent is not None:
+                pending_parents.append((new_id, source_parent))
+        stats['nodes'] += len(new_ids)
+        node_batch.clear()
+        node_sources.clear()
+        report()
+    
+    def flush_history():
+        if not history_batch:
+            return
+        db.session.execute(sa.insert(history_table), history_batch)
+        stats['history'] += len(history_batch)
+        history_batch.clear()
+        report()
+    
+    try:
+        if defer_indexes:
+            dropped_indexes = drop_secondary_indexes(node_table) + drop_secondary_indexes(history_table)
+        
+        for record in records:
+            kind = record.get('kind')
+            if kind == 'node':
+                row = _import_node_row(record)
+                source_parent = record.get('parent_id')
+                if source_parent is None:
+                    row['parent_id'] = target_parent_id
+                elif source_parent in id_map:
+                    row['parent_id'] = id_map[source_parent]
+                    source_parent = None
+                node_batch.append(row)
+                node_sources.append((record.get('id'), source_parent))
+                if len(node_batch) >= IMPORT_BATCH_SIZE:
+                    flush_nodes()
+            elif kind == 'history':
+                flush_nodes()
+                note_id = id_map.get(record.get('note_id'))
+                if note_id is None:
+                    stats['skipped'] += 1
+                    continue
+                history_batch.append({
+                    'note_id': note_id,
+                    'title': record.get('title'),
+                    'content': record.get('content'),
+                    'created_at': _parse_datetime(record.get('created_at'))
+                })
+                if len(history_batch) >= IMPORT_BATCH_SIZE:
+                    flush_history()
+            elif kind != 'meta':
+                stats['skipped'] += 1
+        flush_nodes()
+        flush_history()
+        
+        # 回填父节点；源父节点缺失时挂到目标目录
+        if pending_parents:
+            db.session.execute(
+                sa.update(node_table).where(node_table.c.id == sa.bindparam('node_id')).values(parent_id=sa.bindparam('new_parent')),
+                [{'node_id': new_id, 'new_parent': id_map.get(source_parent, target_parent_id)}
+                 for new_id, source_parent in pending_parents]
+            )
+        
+        # 索引在全部数据写入后一次性重建
+        restore_secondary_indexes(dropped_indexes)
+        
+        # 批量导入不逐条记流水，通知客户端全量刷新；汇总也整体重算
+        record_change([None], 'reset')
+        recompute_rollups()
+        
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        if dropped_indexes:
+            # pysqlite 在没有显式 BEGIN 时自动提交 DDL，回滚撤销不了 DROP INDEX，需要单独重建
+            restore_secondary_indexes(dropped_indexes)
+            db.session.commit()
+        raise
+    
+    clear_node_cache()
+    report()
+    return stats
+
+@app.route('/api/export')
+def export_data():
+    """流式导出全部节点（可选历史记录），格式为 ndjson 或 zip"""
+    fmt = request.args.get('format', 'ndjson')
+    include_history = request.args.get('history', '0') in ['1', 'true', 'yes']
+    stamp = datetime.now().strftime('%Y%m%d%H%M%S')
+    
+    if fmt == 'zip':
+        body = stream_with_context(iter_export_zip(include_history))
+        mimetype, filename = 'application/zip', f'wiki-export-{stamp}.zip'
+    elif fmt == 'ndjson':
+        body = stream_with_context(iter_export_ndjson(include_history))
+        mimetype, filename = 'application/x-ndjson', f'wiki-export-{stamp}.ndjson'
+    else:
+        return jsonify({'code': 400, 'msg': '不支持的导出格式'}), 400
+    
+    return Response(body, mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename={filename}'
+    })
+
+@app.route('/api/import', methods=['POST'])
+@handle_errors
+def import_data():
+    """批量导入 ndjson 或 zip 导出文件"""
+    upload = request.files.get('file')
+    if upload:
+        fileobj = upload.stream
+    else:
+        fileobj = io.BytesIO(request.get_data())
+    
+    target_parent_id = request.args.get('parent_id', type=int) or None
+    if target_parent_id:
+        target = Node.query.get(target_parent_id)
+        if not target or target.type != 'folder':
+            return jsonify({'code': 400, 'msg': '目标不是有效的文件夹'}), 400
+    
+    try:
+        stats = import_records(iter_import_records(fileobj), target_parent_id=target_parent_id)
+    except (ValueError, KeyError, zipfile.BadZipFile) as e:
+        return jsonify({'code': 400, 'msg': f'导入文件格式错误: {str(e)}'}), 400
+    
+    return jsonify({'code': 200, 'msg': '导入成功', 'data': stats})
+
 # ========== 初始化数据 ==========
 def init_data():
     with app.app_context():
-        db.create_all()
-        create_indexes()  # 创建索引
-        
-        # 确保至少有一个根目录存在
-        if not Node.query.first():
-            root_folder = Node(
-                title="根目录", 
-                type="folder", 
-                is_expanded=True,
-                tags="系统,根目录"
-            )
-            db.session.add(root_folder)
-            db.session.commit()
-            
-            app.logger.info("数据库初始化完成，创建根目录")
+        init_database()
+
+def init_database():
+    """建表、补列、索引检查与根目录，并构建常驻索引；作用于当前工作区的库，工作区分片打开时也调用"""
+    migrate_database()
+    
+    # 启动时构建联想索引
+    refresh_suggest_index()
+    if app.config['TREE_REPLICA']:
+        refresh_tree_replica()
+
+def migrate_database():
+    """把当前工作区的库升级到当前表结构（幂等），命令行工具读写数据前也先调用"""
+    db.create_all()
+    ensure_preview_columns()
+    ensure_trash_columns()
+    ensure_position_column()
+    create_indexes()  # 创建索引
+    
+    # 确保至少有一个根目录存在
+    if not Node.query.first():
+        root_folder = Node(
+            title="根目录", 
+            type="folder", 
+            position=POSITION_GAP,
+            is_expanded=True,
+            tags="系统,根目录"
+        )
+        db.session.add(root_folder)
+        db.session.commit()
+        
+        app.logger.info("数据库初始化完成，创建根目录")
+    
+    ensure_rollup_table()
+
+def warm_caches():
+    """预热 fork 之后仍然有效的常驻状态：全部节点的 JSON 片段、联想索引和树副本（开启时）
+    
+    接口缓存（node_cache）只保留 CACHE_TIMEOUT 秒，在 master 中填充等不到第一个请求就已过期；
+    连接池在 post_fork 中丢弃。这两者都不在这里预热。
+    """
+    started = time.perf_counter()
+    with app.app_context():
+        render_tree_json()  # 拼整树会为每个节点生成片段
+        suggest = refresh_suggest_index().stats()
+        if app.config['TREE_REPLICA']:
+            refresh_tree_replica()
+        db.session.remove()
+    app.logger.info(f"缓存预热完成: {len(fragment_cache)} 个节点片段, 联想索引 {suggest['nodes']} 个节点, "
+                    f"耗时 {time.perf_counter() - started:.2f}s")
 
 # ========== 启动应用 ==========
 if __name__ == '__main__':
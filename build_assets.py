@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+前端静态资源构建工具（纯 Python，可离线运行）
+构建: python build_assets.py [--keep-old]
+    1. 把 templates/index.html 中内联的 <style>/<script> 抽取到 static/src/，模板改为 asset_url() 引用
+    2. 压缩 static/src/ 与 static/ 下的 js/css，写出带内容哈希的文件到 static/dist/
+    3. 生成 static/dist/manifest.json，asset_url() 据此输出带哈希的地址
+未构建时 asset_url() 回退到 static/src/ 下的源文件
+"""
+
+import os
+import re
+import sys
+import json
+import hashlib
+import argparse
+import textwrap
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+TEMPLATE_PATH = os.path.join(BASE_DIR, 'templates', 'index.html')
+STATIC_DIR = os.path.join(BASE_DIR, 'static')
+SOURCE_DIR = os.path.join(STATIC_DIR, 'src')
+DIST_DIR = os.path.join(STATIC_DIR, 'dist')
+MANIFEST_NAME = 'manifest.json'
+
+# 只抽取不带属性的内联块，type="application/json" 等数据块保留在模板中
+INLINE_STYLE_RE = re.compile(r'^([ \t]*)<style>\n(.*?)\n[ \t]*</style>[ \t]*$', re.S | re.M)
+INLINE_SCRIPT_RE = re.compile(r'^([ \t]*)<script>\n(.*?)\n[ \t]*</script>[ \t]*$', re.S | re.M)
+
+# ========== 抽取内联资源 ==========
+def extract_inline_assets(template_path=TEMPLATE_PATH, name='index'):
+    """把模板中的内联样式和脚本移到 static/src/，返回抽取的文件列表"""
+    with open(template_path, 'r', encoding='utf-8') as f:
+        template = f.read()
+
+    extracted = []
+    for pattern, ext, tag in [
+        (INLINE_STYLE_RE, 'css', '{indent}<link rel="stylesheet" href="{{{{ asset_url(\'{file}\') }}}}">'),
+        (INLINE_SCRIPT_RE, 'js', '{indent}<script src="{{{{ asset_url(\'{file}\') }}}}"></script>'),
+    ]:
+        blocks = list(pattern.finditer(template))
+        if not blocks:
+            continue
+
+        filename = f'{name}.{ext}'
+        source_path = os.path.join(SOURCE_DIR, filename)
+        # 多个内联块按出现顺序追加到同一个源文件，引用放在第一个块的位置
+        parts = []
+        if os.path.exists(source_path):
+            with open(source_path, 'r', encoding='utf-8') as f:
+                parts.append(f.read().rstrip('\n'))
+        parts.extend(textwrap.dedent(m.group(2)).strip('\n') for m in blocks)
+
+        os.makedirs(SOURCE_DIR, exist_ok=True)
+        with open(source_path, 'w', encoding='utf-8') as f:
+            f.write('\n\n'.join(parts) + '\n')
+
+        first = blocks[0]
+        reference = tag.format(indent=first.group(1), file=filename)
+        for m in reversed(blocks):
+            replacement = reference if m is first else ''
+            template = template[:m.start()] + replacement + template[m.end():]
+        extracted.append(filename)
+
+    if extracted:
+        with open(template_path, 'w', encoding='utf-8') as f:
+            f.write(template)
+    return extracted
+
+# ========== 压缩 ==========
+def _skip_quoted(source, i, quote):
+    """跳过字符串字面量，返回结束位置（不含）"""
+    i += 1
+    while i < len(source):
+        ch = source[i]
+        if ch == '\\':
+            i += 2
+            continue
+        if ch == quote or (ch == '\n' and quote != '`'):
+            return i + 1
+        if quote == '`' and source.startswith('${', i):
+            i = _skip_js_expression(source, i + 2)
+            continue
+        i += 1
+    return i
+
+def _skip_js_expression(source, i):
+    """跳过模板字符串中的 ${...} 表达式，支持嵌套字符串和大括号"""
+    depth = 1
+    while i < len(source):
+        ch = source[i]
+        if ch in '"\'`':
+            i = _skip_quoted(source, i, ch)
+            continue
+        if ch == '{':
+            depth += 1
+        elif ch == '}':
+            depth -= 1
+            if depth == 0:
+                return i + 1
+        i += 1
+    return i
+
+def _skip_regex(source, i):
+    """跳过正则字面量（含字符类和标志位）"""
+    i += 1
+    in_class = False
+    while i < len(source):
+        ch = source[i]
+        if ch == '\\':
+            i += 2
+            continue
+        if ch == '\n':
+            return i
+        if ch == '[':
+            in_class = True
+        elif ch == ']':
+            in_class = False
+        elif ch == '/' and not in_class:
+            i += 1
+            while i < len(source) and (source[i].isalnum() or source[i] in '_$'):
+                i += 1
+            return i
+        i += 1
+    return i
+
+REGEX_PRECEDING_CHARS = set('(,=:[!&|?{};+-*%<>~^')
+REGEX_PRECEDING_WORDS = {'return', 'typeof', 'case', 'do', 'else', 'in', 'of', 'new', 'delete', 'void', 'throw', 'yield', 'await'}
+
+def minify_js(source):
+    """保守的 JS 压缩：去注释、去缩进和空行、合并空白，保留换行以免影响自动分号插入"""
+    out = []
+
+    def emit_space(token):
+        # 连续空白合并为一个，含换行时保留换行
+        if out and out[-1] in (' ', '\n'):
+            if token == '\n':
+                out[-1] = '\n'
+        else:
+            out.append(token)
+
+    i = 0
+    n = len(source)
+    last = ''       # 上一个非空白字符
+    last_word = ''  # 上一个标识符，用于判断 / 是否为正则
+    while i < n:
+        ch = source[i]
+        if ch in '"\'`':
+            j = _skip_quoted(source, i, ch)
+            out.append(source[i:j])
+            last, last_word = ch, ''
+            i = j
+        elif ch == '/' and source.startswith('//', i):
+            while i < n and source[i] != '\n':
+                i += 1
+        elif ch == '/' and source.startswith('/*', i):
+            end = source.find('*/', i + 2)
+            end = n if end == -1 else end + 2
+            emit_space('\n' if '\n' in source[i:end] else ' ')
+            i = end
+        elif ch == '/' and (last == '' or last in REGEX_PRECEDING_CHARS or last_word in REGEX_PRECEDING_WORDS):
+            j = _skip_regex(source, i)
+            out.append(source[i:j])
+            last, last_word = '/', ''
+            i = j
+        elif ch in ' \t\r\n':
+            j = i
+            while j < n and source[j] in ' \t\r\n':
+                j += 1
+            emit_space('\n' if '\n' in source[i:j] else ' ')
+            i = j
+        else:
+            j = i
+            while j < n and (source[j].isalnum() or source[j] in '_$'):
+                j += 1
+            if j > i:
+                last_word = source[i:j]
+                last = source[j - 1]
+                out.append(last_word)
+                i = j
+            else:
+                out.append(ch)
+                last, last_word = ch, ''
+                i += 1
+
+    return ''.join(out).strip() + '\n'
+
+def minify_css(source):
+    """CSS 压缩：去注释、合并空白、去掉符号两侧和末尾多余的分号"""
+    out = []
+    i = 0
+    n = len(source)
+    while i < n:
+        ch = source[i]
+        if ch in '"\'':
+            j = _skip_quoted(source, i, ch)
+            out.append(source[i:j])
+            i = j
+        elif source.startswith('/*', i):
+            end = source.find('*/', i + 2)
+            i = n if end == -1 else end + 2
+        elif ch in ' \t\r\n':
+            while i < n and source[i] in ' \t\r\n':
+                i += 1
+            out.append(' ')
+        else:
+            out.append(ch)
+            i += 1
+
+    # 字符串已整体保留，下面的替换只需避开其中内容
+    result = []
+    for part in re.split(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')', ''.join(out)):
+        if part[:1] in ('"', "'"):
+            result.append(part)
+            continue
+        part = re.sub(r'\s*([{};,>])\s*', r'\1', part)
+        part = re.sub(r':\s+', ':', part)
+        part = part.replace(';}', '}')
+        result.append(part)
+    return ''.join(result).strip() + '\n'
+
+MINIFIERS = {'.js': minify_js, '.css': minify_css}
+
+# ========== 构建 ==========
+def collect_sources():
+    """待构建的资源：static/src/ 下的抽取结果和 static/ 下原有的 js/css"""
+    sources = {}
+    for directory in [STATIC_DIR, SOURCE_DIR]:
+        if not os.path.isdir(directory):
+            continue
+        for filename in sorted(os.listdir(directory)):
+            path = os.path.join(directory, filename)
+            if os.path.isfile(path) and os.path.splitext(filename)[1] in MINIFIERS:
+                sources[filename] = path
+    return sources
+
+def build_assets(keep_old=False):
+    """压缩并写出带哈希的文件，返回清单"""
+    os.makedirs(DIST_DIR, exist_ok=True)
+    manifest = {}
+    for name, path in collect_sources().items():
+        with open(path, 'r', encoding='utf-8') as f:
+            source = f.read()
+        stem, ext = os.path.splitext(name)
+        minified = MINIFIERS[ext](source)
+        digest = hashlib.sha256(minified.encode('utf-8')).hexdigest()[:12]
+        hashed = f'{stem}.{digest}{ext}'
+        with open(os.path.join(DIST_DIR, hashed), 'w', encoding='utf-8') as f:
+            f.write(minified)
+        manifest[name] = hashed
+        print(f"  {name} -> dist/{hashed}  ({len(source.encode('utf-8'))} -> {len(minified.encode('utf-8'))} 字节)")
+
+    # 先写临时文件再替换，运行中的服务不会读到半份清单
+    manifest_path = os.path.join(DIST_DIR, MANIFEST_NAME)
+    with open(manifest_path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(manifest_path + '.tmp', manifest_path)
+
+    if not keep_old:
+        current = set(manifest.values()) | {MANIFEST_NAME}
+        for filename in os.listdir(DIST_DIR):
+            if filename not in current:
+                os.remove(os.path.join(DIST_DIR, filename))
+    return manifest
+
+def main():
+    parser = argparse.ArgumentParser(description='前端静态资源构建')
+    parser.add_argument('--keep-old', action='store_true', help='保留旧版本的哈希文件（滚动发布时给旧页面使用）')
+    args = parser.parse_args()
+    try:
+        extracted = extract_inline_assets()
+        for filename in extracted:
+            print(f"✓ 已抽取内联资源: static/src/{filename}")
+        manifest = build_assets(keep_old=args.keep_old)
+        print(f"✓ 构建完成: {len(manifest)} 个文件, 清单 static/dist/{MANIFEST_NAME}")
+    except Exception as e:
+        print(f"✗ 构建失败: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -2,14 +2,24 @@
 """
 PythonAnywhere部署问题排查脚本
 运行此脚本来诊断常见的部署问题
+    python deployment_debug.py                 部署环境检查
+    python deployment_debug.py db [选项]       数据库性能诊断（索引、查询计划、碎片、历史增长、孤儿节点）
 """
 
 import os
+import re
 import sys
+import shutil
+import logging
+import sqlite3
+import argparse
+import tempfile
 import subprocess
 import json
 from pathlib import Path
 
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
 def check_python_version():
     """检查Python版本"""
     print("=== Python版本检查 ===")
@@ -176,7 +186,479 @@ def generate_report():
         print(f"保存报告失败: {e}")
     print()
 
+# ========== 数据库性能诊断 ==========
+def resolve_db_path(db_path=None):
+    """数据库文件路径：命令行参数 > DATABASE_URL > 默认的 wiki_enhanced.db"""
+    if db_path:
+        return os.path.abspath(db_path)
+    url = os.environ.get('DATABASE_URL')
+    if not url:
+        return os.path.join(BASE_DIR, 'wiki_enhanced.db')
+    if not url.startswith('sqlite:///'):
+        return None
+    return os.path.abspath(url[len('sqlite:///'):])
+
+def connect_readonly(db_path):
+    """只读打开数据库，诊断过程不会改动线上文件"""
+    return sqlite3.connect(Path(db_path).as_uri() + '?mode=ro', uri=True)
+
+def format_size(num_bytes):
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if num_bytes < 1024 or unit == 'GB':
+            return f"{num_bytes:.0f}{unit}" if unit == 'B' else f"{num_bytes:.1f}{unit}"
+        num_bytes /= 1024
+
+def list_tables(conn):
+    return [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+    )]
+
+def list_indexes(conn):
+    """所有索引及其列、唯一性、来源（c=CREATE INDEX, u=UNIQUE 约束, pk=主键）和部分索引条件"""
+    index_sql = dict(conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'index'"))
+    indexes = []
+    for table in list_tables(conn):
+        for _, name, unique, origin, partial in conn.execute(f'PRAGMA index_list("{table}")'):
+            columns = tuple(
+                (row[2] or '<expr>') + (' DESC' if row[3] else '')
+                for row in conn.execute(f'PRAGMA index_xinfo("{name}")') if row[5]
+            )
+            where = None
+            if partial and index_sql.get(name):
+                match = re.search(r'\bWHERE\b(.*)$', index_sql[name], re.I | re.S)
+                where = ' '.join(match.group(1).split()) if match else None
+            indexes.append({
+                'name': name, 'table': table, 'columns': columns, 'unique': bool(unique),
+                'origin': origin, 'where': where,
+                # 约束自动生成的索引不能 DROP INDEX
+                'droppable': origin == 'c'
+            })
+    return indexes
+
+def check_db_sizes(conn, report):
+    """表和索引占用空间、空闲页与页内碎片"""
+    print("=== 空间占用 ===")
+    page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+    page_count = conn.execute('PRAGMA page_count').fetchone()[0]
+    freelist_count = conn.execute('PRAGMA freelist_count').fetchone()[0]
+    free_ratio = freelist_count / page_count if page_count else 0
+    print(f"文件大小: {format_size(page_size * page_count)} ({page_count} 页 x {page_size}B)")
+    mark = '⚠' if free_ratio > 0.2 else '✓'
+    print(f"{mark} 空闲页: {freelist_count} 页 ({free_ratio:.1%})，可由 VACUUM 回收 {format_size(freelist_count * page_size)}")
+    report['storage'] = {'page_size': page_size, 'page_count': page_count,
+                         'freelist_count': freelist_count, 'objects': {}}
+
+    object_types = dict(conn.execute("SELECT name, type FROM sqlite_master WHERE type IN ('table', 'index')"))
+    row_counts = {table: conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+                  for table in list_tables(conn)}
+    try:
+        # dbstat 虚拟表需要 SQLITE_ENABLE_DBSTAT_VTAB，多数发行版的 sqlite3 都带
+        stats = conn.execute(
+            'SELECT name, COUNT(*), SUM(pgsize), SUM(unused) FROM dbstat GROUP BY name ORDER BY SUM(pgsize) DESC'
+        ).fetchall()
+    except sqlite3.OperationalError:
+        print("⚠ 当前 sqlite3 不支持 dbstat，仅显示行数")
+        for table, count in row_counts.items():
+            print(f"  表 {table}: {count} 行")
+            report['storage']['objects'][table] = {'type': 'table', 'rows': count}
+        print()
+        return
+
+    total_size = sum(row[2] for row in stats) or 1
+    total_unused = sum(row[3] for row in stats)
+    print(f"页内未使用空间: {format_size(total_unused)} ({total_unused / total_size:.1%})")
+    print(f"{'对象':<32}{'类型':<8}{'行数':>10}{'大小':>12}{'页内空闲':>10}")
+    for name, pages, size, unused in stats:
+        kind = object_types.get(name, 'table' if name == 'sqlite_schema' else 'index')
+        rows = row_counts.get(name, '')
+        print(f"{name:<32}{kind:<8}{rows:>10}{format_size(size):>12}{unused / size if size else 0:>10.1%}")
+        report['storage']['objects'][name] = {
+            'type': kind, 'rows': row_counts.get(name), 'pages': pages, 'bytes': size, 'unused_bytes': unused
+        }
+    print()
+
+def find_redundant_indexes(indexes):
+    """完全重复的索引（同表同列同条件）和被更长索引前缀覆盖的索引"""
+    duplicates, covered = [], []
+    groups = {}
+    for index in indexes:
+        groups.setdefault((index['table'], index['columns'], index['where']), []).append(index)
+    for group in groups.values():
+        if len(group) < 2:
+            continue
+        # 优先保留约束索引和模型声明的 ix_ 索引，db.create_all() 在新库上也只会建这些
+        group.sort(key=lambda i: (i['droppable'], not i['name'].startswith('ix_'), i['name']))
+        keep = group[0]
+        for index in group[1:]:
+            duplicates.append({'index': index['name'], 'table': index['table'], 'duplicate_of': keep['name'],
+                               'columns': list(index['columns']), 'droppable': index['droppable']})
+
+    duplicate_names = {d['index'] for d in duplicates}
+    for index in indexes:
+        if index['name'] in duplicate_names or index['unique'] or index['where']:
+            continue
+        for other in indexes:
+            if (other is not index and other['table'] == index['table'] and not other['where']
+                    and other['name'] not in duplicate_names
+                    and len(other['columns']) > len(index['columns'])
+                    and other['columns'][:len(index['columns'])] == index['columns']):
+                covered.append({'index': index['name'], 'table': index['table'], 'covered_by': other['name']})
+                break
+    return duplicates, covered
+
+def check_indexes(conn, report):
+    print("=== 索引检查 ===")
+    indexes = list_indexes(conn)
+    duplicates, covered = find_redundant_indexes(indexes)
+    for index in indexes:
+        where = f" WHERE {index['where']}" if index['where'] else ''
+        unique = ' UNIQUE' if index['unique'] else ''
+        print(f"  {index['table']}.{index['name']}{unique} ({', '.join(index['columns'])}){where}")
+    if duplicates:
+        print(f"✗ 重复索引 {len(duplicates)} 个（每次写入都要多维护一份）:")
+        for d in duplicates:
+            print(f"  - {d['index']} 与 {d['duplicate_of']} 完全相同 ({', '.join(d['columns'])})")
+    else:
+        print("✓ 没有重复索引")
+    for c in covered:
+        print(f"⚠ {c['index']} 是 {c['covered_by']} 的前缀，通常可以删除")
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone():
+        print("⚠ 尚未执行 ANALYZE，查询规划器没有统计信息")
+    report['indexes'] = indexes
+    report['duplicate_indexes'] = duplicates
+    report['covered_indexes'] = covered
+    print()
+    return indexes, duplicates
+
+# 巡检中不需要分析计划的语句
+EXPLAIN_SKIP_RE = re.compile(r'^\s*(BEGIN|COMMIT|ROLLBACK|SAVEPOINT|RELEASE|PRAGMA|CREATE|DROP|ANALYZE)\b', re.I)
+PLAN_INDEX_RE = re.compile(r'USING (?:COVERING )?INDEX (\w+)')
+CTE_NAME_RE = re.compile(r'(?:\bWITH(?:\s+RECURSIVE)?|,)\s*(\w+)\s*(?:\([^)]*\))?\s+AS\s*\(', re.I)
+
+def route_tour(client, sample):
+    """按前端的使用方式依次调用各路由，写操作只作用于快照"""
+    note_id, folder_id, keyword = sample['note_id'], sample['folder_id'], sample['keyword']
+    steps = [
+        ('GET', '/', None),
+        ('GET', '/api/bootstrap', None),
+        ('GET', '/api/tree', None),
+        ('GET', '/api/folder/0', None),
+        ('GET', f'/api/folder/{folder_id}', None),
+        ('GET', f'/api/node/{note_id}', None),
+        ('GET', f'/api/node/{note_id}?highlight=1', None),
+        ('GET', f'/api/breadcrumbs/{note_id}', None),
+        ('GET', f'/api/search?q={keyword}', None),
+        ('GET', f'/api/suggest?q={keyword}', None),
+        ('GET', '/api/favorites', None),
+        ('GET', '/api/recent', None),
+        ('GET', f'/api/history/{note_id}', None),
+        ('GET', '/api/changes?since=0', None),
+        ('GET', '/api/trash', None),
+        ('GET', '/api/export', None),
+    ]
+    for method, path, payload in steps:
+        client.open(path, method=method, json=payload).get_data()
+
+    def post(path, payload):
+        return (client.post(path, json=payload).get_json() or {}).get('data') or {}
+
+    folder = post('/api/save', {'title': '诊断目录', 'type': 'folder', 'parent_id': folder_id})
+    note = post('/api/save', {'title': '诊断笔记', 'type': 'note', 'parent_id': folder.get('id'), 'usage': keyword})
+    post('/api/save', {'id': note.get('id'), 'title': '诊断笔记', 'type': 'note',
+                       'parent_id': folder.get('id'), 'usage': keyword * 2})
+    post('/api/toggle_favorite', {'id': note.get('id')})
+    post('/api/reorder', {'id': note.get('id'), 'parent_id': folder.get('id')})
+    copy = post('/api/copy', {'itemId': note_id, 'targetId': folder.get('id')})
+    post('/api/reorder', {'id': copy.get('id'), 'before_id': note.get('id')})
+    post('/api/move', {'itemId': copy.get('id'), 'targetId': folder_id})
+    history = client.get(f"/api/history/{note.get('id')}").get_json().get('data') or []
+    if history:
+        client.get(f"/api/restore/{history[0]['id']}")
+    post('/api/delete', {'ids': [folder.get('id')]})
+    post('/api/trash/restore', {'id': folder.get('id')})
+    client.get('/api/changes?since=0')
+
+def capture_route_queries(db_path):
+    """在数据库快照上走一遍路由，记录每条 SQL 及其所属路由，并在快照上取查询计划"""
+    workdir = tempfile.mkdtemp(prefix='wiki_diag_')
+    snapshot = os.path.join(workdir, 'snapshot.db')
+    source = connect_readonly(db_path)
+    target = sqlite3.connect(snapshot)
+    source.backup(target)  # 在线备份，应用运行中也能拿到一致的快照
+    target.close()
+    source.close()
+
+    os.environ['DATABASE_URL'] = f'sqlite:///{snapshot}'
+    os.environ['TRASH_PURGE_INTERVAL'] = str(10 ** 9)  # 快照上不做后台清理
+    os.environ.pop('PROFILE_SECRET', None)
+    os.environ.pop('PROFILE_SAMPLE_RATE', None)
+    sys.path.insert(0, BASE_DIR)
+    import app as wiki
+    from flask import has_request_context, request
+    logging.getLogger().setLevel(logging.WARNING)
+    wiki.app.logger.setLevel(logging.WARNING)
+
+    statements = {}
+    try:
+        wiki.init_data()
+        with wiki.app.app_context():
+            note = wiki.Node.query.filter_by(type='note').order_by(wiki.Node.id).first()
+            folder = wiki.Node.query.filter_by(type='folder').order_by(wiki.Node.id).first()
+            sample = {
+                'note_id': note.id if note else 0,
+                'folder_id': folder.id if folder else (note.parent_id if note else None),
+                'keyword': (note.title[:2] if note else '') or 'a',
+            }
+
+        def record_statement(conn, cursor, statement, parameters, context, executemany):
+            if not has_request_context():
+                return
+            entry = statements.setdefault(statement, {
+                'sql': statement, 'params': parameters[0] if executemany and parameters else parameters,
+                'routes': set(), 'count': 0
+            })
+            entry['routes'].add(request.url_rule.rule if request.url_rule else request.path)
+            entry['count'] += 1
+
+        with wiki.app.app_context():
+            engine = wiki.db.engine
+        wiki.sa.event.listen(engine, 'before_cursor_execute', record_statement)
+        try:
+            route_tour(wiki.app.test_client(), sample)
+        finally:
+            wiki.sa.event.remove(engine, 'before_cursor_execute', record_statement)
+        engine.dispose()
+
+        conn = sqlite3.connect(snapshot)
+        for entry in statements.values():
+            sql = entry['sql']
+            entry['routes'] = sorted(entry['routes'])
+            if re.match(r'^\s*CREATE\s+TEMP', sql, re.I):
+                # 复制子树用的临时表只在当前连接可见，先建出来后续语句才能分析
+                conn.execute(sql)
+            if EXPLAIN_SKIP_RE.match(sql):
+                entry['plan'] = None
+                continue
+            try:
+                params = entry['params'] if isinstance(entry['params'], (tuple, list, dict)) else ()
+                entry['plan'] = [row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql, params)]
+            except sqlite3.Error as e:
+                entry['plan'] = None
+                entry['error'] = str(e)
+        conn.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return list(statements.values())
+
+def check_query_plans(db_path, indexes, report, verbose=False):
+    print("=== 路由查询计划 ===")
+    try:
+        statements = capture_route_queries(db_path)
+    except Exception as e:
+        print(f"✗ 路由巡检失败: {e}")
+        print()
+        return
+    used_indexes = set()
+    problems = 0
+    for entry in sorted(statements, key=lambda e: e['routes']):
+        plan = entry.get('plan')
+        if plan is None:
+            if entry.get('error'):
+                print(f"⚠ 无法分析 ({entry['error']}): {' '.join(entry['sql'].split())[:100]}")
+            continue
+        for line in plan:
+            used_indexes.update(PLAN_INDEX_RE.findall(line))
+        # 全表扫描和临时排序是路由变慢的主要原因；带索引的 SCAN 是按索引顺序遍历，
+        # 扫描递归 CTE 的中间结果也不算
+        ctes = set(CTE_NAME_RE.findall(entry['sql']))
+        for name in list(ctes):
+            ctes.update(re.findall(rf'\b{name}\s+(?:AS\s+)?(\w+)\s+ON\b', entry['sql'], re.I))
+        issues = [line for line in plan
+                  if (line.startswith('SCAN ') and 'INDEX' not in line and 'CONSTANT ROW' not in line
+                      and line.split()[1] not in ctes)
+                  or 'TEMP B-TREE' in line]
+        entry['issues'] = issues
+        if not issues and not verbose:
+            continue
+        problems += bool(issues)
+        mark = '⚠' if issues else '✓'
+        print(f"{mark} [{', '.join(entry['routes'])}] x{entry['count']}")
+        print(f"    {' '.join(entry['sql'].split())[:200]}")
+        for line in plan:
+            print(f"      {line}")
+    print(f"共捕获 {len(statements)} 条不同的 SQL，{problems} 条含全表扫描或临时排序")
+
+    unused = [index['name'] for index in indexes
+              if index['droppable'] and index['name'] not in used_indexes]
+    if unused:
+        print(f"⚠ 巡检中未被任何查询使用的索引: {', '.join(unused)}")
+        print("  （只反映本次巡检覆盖的路由，删除前请确认没有其他查询依赖）")
+    report['queries'] = [{k: v for k, v in entry.items() if k != 'params'} for entry in statements]
+    report['unused_indexes'] = unused
+    print()
+
+def check_history_growth(conn, report, limit=10):
+    print("=== 历史记录增长 ===")
+    if 'history' not in list_tables(conn):
+        print("未找到 history 表")
+        print()
+        return
+    total, size = conn.execute('SELECT COUNT(*), COALESCE(SUM(LENGTH(content)), 0) FROM history').fetchone()
+    print(f"历史记录: {total} 条, 内容 {format_size(size)}")
+    top = conn.execute('''
+        SELECT h.note_id, n.title, COUNT(*), COALESCE(SUM(LENGTH(h.content)), 0), MAX(h.created_at)
+        FROM history h LEFT JOIN node n ON n.id = h.note_id
+        GROUP BY h.note_id ORDER BY COUNT(*) DESC LIMIT ?
+    ''', (limit,)).fetchall()
+    for note_id, title, count, content_size, last in top:
+        print(f"  #{note_id} {title or '(已删除)'}: {count} 条, {format_size(content_size)}, 最近 {last}")
+    daily = conn.execute('''
+        SELECT date(created_at), COUNT(*) FROM history
+        WHERE created_at >= date('now', '-14 day') GROUP BY 1 ORDER BY 1
+    ''').fetchall()
+    if daily:
+        print("近14天每日新增: " + ', '.join(f"{day[5:]}:{count}" for day, count in daily))
+    orphaned = conn.execute(
+        'SELECT COUNT(*) FROM history h WHERE NOT EXISTS (SELECT 1 FROM node n WHERE n.id = h.note_id)'
+    ).fetchone()[0]
+    if orphaned:
+        print(f"⚠ {orphaned} 条历史记录对应的笔记已不存在")
+    report['history'] = {
+        'total': total, 'bytes': size, 'orphaned': orphaned, 'daily': daily,
+        'top_notes': [{'note_id': r[0], 'title': r[1], 'count': r[2], 'bytes': r[3], 'last': r[4]} for r in top]
+    }
+    print()
+
+def check_orphan_nodes(conn, report, limit=10):
+    print("=== 孤儿节点 ===")
+    orphans = conn.execute('''
+        SELECT n.id, n.title, n.parent_id FROM node n
+        WHERE n.parent_id IS NOT NULL AND NOT EXISTS (SELECT 1 FROM node p WHERE p.id = n.parent_id)
+        ORDER BY n.id
+    ''').fetchall()
+    if orphans:
+        print(f"✗ {len(orphans)} 个节点的父节点不存在（树中不可见）:")
+        for node_id, title, parent_id in orphans[:limit]:
+            print(f"  - #{node_id} {title} (parent_id={parent_id})")
+    else:
+        print("✓ 没有父节点缺失的节点")
+
+    columns = {row[1] for row in conn.execute('PRAGMA table_info(node)')}
+    hidden = []
+    if 'deleted_at' in columns:
+        # 父节点在回收站而自身未删除，同样无法从树中访问到
+        hidden = conn.execute('''
+            SELECT n.id, n.title, n.parent_id FROM node n JOIN node p ON p.id = n.parent_id
+            WHERE n.deleted_at IS NULL AND p.deleted_at IS NOT NULL ORDER BY n.id
+        ''').fetchall()
+        if hidden:
+            print(f"⚠ {len(hidden)} 个未删除节点挂在回收站中的父节点下:")
+            for node_id, title, parent_id in hidden[:limit]:
+                print(f"  - #{node_id} {title} (parent_id={parent_id})")
+    report['orphan_nodes'] = [{'id': r[0], 'title': r[1], 'parent_id': r[2]} for r in orphans]
+    report['hidden_nodes'] = [{'id': r[0], 'title': r[1], 'parent_id': r[2]} for r in hidden]
+    print()
+
+def drop_duplicate_indexes(db_path, duplicates):
+    print("=== 删除重复索引 ===")
+    droppable = [d for d in duplicates if d['droppable']]
+    if not droppable:
+        print("没有可删除的重复索引")
+        print()
+        return
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        for d in droppable:
+            conn.execute(f'DROP INDEX IF EXISTS "{d["index"]}"')
+            print(f"✓ 已删除 {d['index']}（保留 {d['duplicate_of']}）")
+        conn.commit()
+    finally:
+        conn.close()
+    print()
+
+def run_analyze(db_path):
+    print("=== ANALYZE ===")
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        conn.execute('ANALYZE')
+        conn.commit()
+        print("✓ 已更新查询规划器统计信息 (sqlite_stat1)")
+    finally:
+        conn.close()
+    print()
+
+def vacuum_into(db_path, target_path):
+    """把整理后的副本写到新文件，原库不动；确认无误后在停机窗口替换"""
+    print("=== VACUUM INTO ===")
+    target_path = os.path.abspath(target_path)
+    if os.path.exists(target_path):
+        raise FileExistsError(f"目标文件已存在: {target_path}")
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        conn.execute('VACUUM INTO ?', (target_path,))
+    finally:
+        conn.close()
+    print(f"✓ {format_size(os.path.getsize(db_path))} -> {format_size(os.path.getsize(target_path))}: {target_path}")
+    print()
+
+def run_db_diagnostics(args):
+    db_path = resolve_db_path(args.db)
+    if db_path is None:
+        print("✗ 数据库诊断目前只支持 SQLite")
+        sys.exit(1)
+    if not os.path.exists(db_path):
+        print(f"✗ 数据库文件不存在: {db_path}")
+        sys.exit(1)
+
+    print(f"数据库性能诊断: {db_path}")
+    print("=" * 50)
+    report = {'database': db_path, 'timestamp': str(os.popen('date').read()).strip()}
+    try:
+        conn = connect_readonly(db_path)
+        try:
+            check_db_sizes(conn, report)
+            indexes, duplicates = check_indexes(conn, report)
+            check_history_growth(conn, report, limit=args.top)
+            check_orphan_nodes(conn, report, limit=args.top)
+        finally:
+            conn.close()
+        if not args.no_explain:
+            check_query_plans(db_path, indexes, report, verbose=args.verbose)
+
+        if args.drop_duplicates:
+            drop_duplicate_indexes(db_path, duplicates)
+        if args.analyze:
+            run_analyze(db_path)
+        if args.vacuum_into:
+            vacuum_into(db_path, args.vacuum_into)
+    except Exception as e:
+        print(f"✗ 诊断失败: {e}")
+        sys.exit(1)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False, default=str)
+        print(f"✓ 报告已保存到 {args.json}")
+    print("=" * 50)
+    print("诊断完成！")
+
 def main():
+    parser = argparse.ArgumentParser(description='PythonAnywhere部署问题排查脚本')
+    subparsers = parser.add_subparsers(dest='command')
+    db_parser = subparsers.add_parser('db', help='数据库性能诊断')
+    db_parser.add_argument('--db', help='数据库文件路径，默认取 DATABASE_URL 或 wiki_enhanced.db')
+    db_parser.add_argument('--top', type=int, default=10, help='历史记录和孤儿节点最多列出的条数')
+    db_parser.add_argument('--no-explain', action='store_true', help='跳过路由巡检和查询计划')
+    db_parser.add_argument('--verbose', action='store_true', help='列出所有查询计划，而不只是有问题的')
+    db_parser.add_argument('--json', help='把完整报告写到指定 JSON 文件')
+    db_parser.add_argument('--drop-duplicates', action='store_true', help='删除完全重复的索引')
+    db_parser.add_argument('--analyze', action='store_true', help='执行 ANALYZE 更新统计信息')
+    db_parser.add_argument('--vacuum-into', metavar='PATH', help='把整理后的数据库副本写到 PATH')
+    args = parser.parse_args()
+    if args.command == 'db':
+        run_db_diagnostics(args)
+        return
+
     print("PythonAnywhere部署问题排查脚本")
     print("=" * 50)
     
@@ -0,0 +1,51 @@
+"""gunicorn 配置 - 针对 SQLite 后端的默认值，均可用环境变量覆盖
+
+    gunicorn -c gunicorn.conf.py wsgi:application
+"""
+import os
+import multiprocessing
+
+IS_SQLITE = os.environ.get('DATABASE_URL', 'sqlite:///').startswith('sqlite')
+
+bind = os.environ.get('GUNICORN_BIND', f"127.0.0.1:{os.environ.get('PORT', '5000')}")
+wsgi_app = 'wsgi:application'
+
+# 在 master 中加载应用：init_data() 与缓存预热只执行一次
+preload_app = True
+
+# SQLite 同一时刻只允许一个写者，多进程只会加剧锁竞争；
+# 用少量进程 + 线程处理并发读，线程数不超过单进程连接池容量（DB_POOL_SIZE + DB_MAX_OVERFLOW）
+if IS_SQLITE:
+    default_workers = 2
+else:
+    default_workers = min(multiprocessing.cpu_count() * 2 + 1, 8)
+workers = int(os.environ.get('GUNICORN_WORKERS', default_workers))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+# gthread 下每个请求独占一个线程直到返回：页面用短轮询 /api/changes 同步变更，不占用线程；
+# /api/changes/stream（SSE）每个连接会占住一个线程最长 CHANGE_STREAM_MAX_AGE 秒，
+# 有外部客户端订阅时要把 GUNICORN_THREADS 加上预计的同时连接数
+# 导入导出等长请求需要较长超时
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+
+# 定期重启 worker，防止内存缓慢增长
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 200))
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-')
+errorlog = os.environ.get('GUNICORN_ERROR_LOG', '-')
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+
+def post_fork(server, worker):
+    """worker 不能复用 master 初始化时打开的数据库连接，丢弃继承来的连接池"""
+    from app import app, db
+    with app.app_context():
+        db.engine.dispose(close=False)
+
+
+def when_ready(server):
+    server.log.info(f"应用已预加载，启动 {workers} 个 worker x {threads} 线程")
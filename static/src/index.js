@@ -0,0 +1,2812 @@
+// 工作区前缀（/w/<名称>），默认工作区为空字符串，接口地址都以它开头
+const API_ROOT = document.documentElement.dataset.apiRoot || '';
+
+// ===== 应用状态 =====
+const AppState = {
+    currentFolderId: 0,
+    currentNoteId: null,
+    viewMode: localStorage.getItem('aurora_view_mode') || 'grid',
+    selectedItems: new Set(),
+    isSelectionMode: false,
+    searchQuery: '',
+    breadcrumbs: [{id: 0, title: '根目录', type: 'folder'}],
+    isLoading: false,
+    isSidebarOpen: false,
+    isEditing: false,
+    treeData: [],
+    expandedNodes: new Set(),
+    recentHistory: JSON.parse(localStorage.getItem('aurora_recent_history') || '[]'),
+    currentModules: [],
+    contextMenu: {
+        targetId: null,
+        targetType: null,
+        targetElement: null,
+        x: 0,
+        y: 0,
+        isFavorite: false
+    },
+    pendingOperation: {
+        type: '', // 'delete', 'move', 'rename'
+        items: [],
+        targetId: null,
+        extraData: null
+    },
+    longPressTimer: null,
+    touchStartTime: 0,
+    changeSeq: 0,
+    changeTimer: null,
+
+    // 根目录保护相关
+    ROOT_DIRECTORY_ID: 0,
+    ROOT_DIRECTORY_NAME: '根目录'
+};
+
+// ===== DOM 元素缓存 =====
+const Elements = {
+    // 主布局
+    appContainer: document.getElementById('appContainer'),
+    sidebar: document.getElementById('sidebar'),
+    sidebarOverlay: document.getElementById('sidebarOverlay'),
+    loadingOverlay: document.getElementById('loadingOverlay'),
+
+    // 头部
+    headerTitle: document.getElementById('headerTitle'),
+    menuToggle: document.getElementById('menuToggle'),
+    mobileBackButton: document.getElementById('mobileBackButton'),
+    breadcrumbs: document.getElementById('breadcrumbs'),
+    viewToggle: document.getElementById('viewToggle'),
+    mobileActions: document.getElementById('mobileActions'),
+    batchActions: document.getElementById('batchActions'),
+    batchDeleteBtn: document.getElementById('batchDeleteBtn'),
+
+    // 侧边栏
+    searchInput: document.getElementById('searchInput'),
+    treeContainer: document.getElementById('treeContainer'),
+    quickAccess: document.getElementById('quickAccess'),
+
+    // 内容区
+    contentBody: document.getElementById('contentBody'),
+    emptyView: document.getElementById('emptyView'),
+    searchResults: document.getElementById('searchResults'),
+    searchResultsList: document.getElementById('searchResultsList'),
+    searchCount: document.getElementById('searchCount'),
+    folderView: document.getElementById('folderView'),
+    folderGrid: document.getElementById('folderGrid'),
+    folderList: document.getElementById('folderList'),
+    detailView: document.getElementById('detailView'),
+    editorView: document.getElementById('editorView'),
+    editorContainer: document.getElementById('editorContainer'),
+
+    // 菜单
+    contextMenu: document.getElementById('contextMenu'),
+    mobileContextMenu: document.getElementById('mobileContextMenu'),
+    contextMenuHeader: document.getElementById('contextMenuHeader'),
+    mobileContextHeader: document.getElementById('mobileContextHeader'),
+    contextFavoriteText: document.getElementById('contextFavoriteText'),
+    mobileFavoriteText: document.getElementById('mobileFavoriteText'),
+    contextDeleteBtn: document.getElementById('contextDeleteBtn'),
+    mobileContextDeleteBtn: document.getElementById('mobileContextDeleteBtn'),
+
+    // FAB 和操作面板
+    fabMenu: document.getElementById('fabMenu'),
+    fabButton: document.getElementById('fabButton'),
+    actionPanel: document.getElementById('actionPanel'),
+    mobileDeleteBtn: document.getElementById('mobileDeleteBtn'),
+
+    // 模态框
+    createFolderModal: document.getElementById('createFolderModal'),
+    createNoteModal: document.getElementById('createNoteModal'),
+    moveModal: document.getElementById('moveModal'),
+    deleteConfirmModal: document.getElementById('deleteConfirmModal'),
+    batchRenameModal: document.getElementById('batchRenameModal'),
+    editModal: document.getElementById('editModal'),
+    historyModal: document.getElementById('historyModal'),
+    historyList: document.getElementById('historyList')
+};
+
+// ===== API 管理器 =====
+const API = {
+    // 首屏数据（页面内嵌或 /api/bootstrap），每项只消费一次
+    preloaded: {},
+
+    takePreloaded(key) {
+        if (!(key in this.preloaded)) return undefined;
+        const data = this.preloaded[key];
+        delete this.preloaded[key];
+        return data;
+    },
+
+    async loadBootstrap() {
+        const embedded = document.getElementById('bootstrapData');
+        let data = null;
+        if (embedded) {
+            try {
+                data = JSON.parse(embedded.textContent);
+            } catch (error) {
+                console.error('解析内嵌首屏数据失败:', error);
+            }
+        }
+        if (!data) {
+            data = await this.request('/bootstrap');
+        }
+        AppState.changeSeq = data.seq || 0;
+        this.preloaded = {
+            tree: data.tree,
+            folder_0: data.folder,
+            recent: data.recent,
+            favorites: data.favorites
+        };
+    },
+
+    async request(endpoint, options = {}) {
+        try {
+            const defaultOptions = {
+                headers: {
+                    'Content-Type': 'application/json',
+                },
+                credentials: 'include',
+                timeout: 30000
+            };
+
+            const controller = new AbortController();
+            const timeoutId = setTimeout(() => controller.abort(), 30000);
+
+            const response = await fetch(`${API_ROOT}/api${endpoint}`, {
+                ...defaultOptions,
+                ...options,
+                signal: controller.signal,
+                headers: {
+                    ...defaultOptions.headers,
+                    ...options.headers
+                }
+            });
+
+            clearTimeout(timeoutId);
+
+            if (!response.ok) {
+                const errorText = await response.text();
+                throw new Error(`HTTP ${response.status}: ${errorText}`);
+            }
+
+            const result = await response.json();
+            if (result.code !== 200) {
+                throw new Error(result.msg || 'API请求失败');
+            }
+
+            return result.data;
+        } catch (error) {
+            console.error('API请求失败:', error);
+            throw error;
+        }
+    },
+
+    // 获取数据
+    async getTree() {
+        return this.takePreloaded('tree') ?? await this.request('/tree');
+    },
+
+    async getFolder(fid) {
+        return this.takePreloaded(`folder_${fid}`) ?? await this.request(`/folder/${fid}`);
+    },
+
+    async getNode(nid, options = {}) {
+        const query = options.highlight ? '?highlight=1' : '';
+        return await this.request(`/node/${nid}${query}`);
+    },
+
+    async getBreadcrumbs(nid) {
+        return await this.request(`/breadcrumbs/${nid}`);
+    },
+
+    async search(query) {
+        return await this.request(`/search?q=${encodeURIComponent(query)}`);
+    },
+
+    async getFavorites() {
+        return this.takePreloaded('favorites') ?? await this.request('/favorites');
+    },
+
+    async getRecent() {
+        return this.takePreloaded('recent') ?? await this.request('/recent');
+    },
+
+    async getHistory(noteId) {
+        return await this.request(`/history/${noteId}`);
+    },
+
+    // 操作数据
+    async saveNode(data) {
+        return await this.request('/save', {
+            method: 'POST',
+            body: JSON.stringify(data)
+        });
+    },
+
+    async deleteNodes(ids) {
+        // 检查是否包含根目录
+        if (ids.includes(AppState.ROOT_DIRECTORY_ID)) {
+            throw new Error('根目录不能被删除');
+        }
+        return await this.request('/delete', {
+            method: 'POST',
+            body: JSON.stringify({ ids })
+        });
+    },
+
+    async moveNode(itemId, targetId) {
+        // 检查是否是根目录
+        if (itemId === AppState.ROOT_DIRECTORY_ID) {
+            throw new Error('根目录不能被移动');
+        }
+        return await this.request('/move', {
+            method: 'POST',
+            body: JSON.stringify({ itemId, targetId })
+        });
+    },
+
+    async toggleFavorite(id) {
+        return await this.request('/toggle_favorite', {
+            method: 'POST',
+            body: JSON.stringify({ id })
+        });
+    },
+
+    async restoreHistory(historyId) {
+        return await this.request(`/restore/${historyId}`);
+    }
+};
+
+// ===== 工具函数 =====
+function showLoading() {
+    if (Elements.loadingOverlay) {
+        Elements.loadingOverlay.classList.add('show');
+    }
+}
+
+function hideLoading() {
+    if (Elements.loadingOverlay) {
+        Elements.loadingOverlay.classList.remove('show');
+    }
+}
+
+function showToast(message, type = 'info') {
+    const toast = document.createElement('div');
+    toast.className = `toast ${type}`;
+    toast.innerHTML = `
+        <div class="toast-icon">${type === 'success' ? '✅' : type === 'error' ? '❌' : type === 'warning' ? '⚠️' : 'ℹ️'}</div>
+        <div>${escapeHtml(message)}</div>
+    `;
+
+    document.body.appendChild(toast);
+
+    setTimeout(() => {
+        toast.style.opacity = '0';
+        toast.style.transform = 'translateX(-50%) translateY(-20px)';
+        setTimeout(() => {
+            if (toast.parentNode) {
+                document.body.removeChild(toast);
+            }
+        }, 300);
+    }, 3000);
+}
+
+function escapeHtml(text) {
+    if (text === null || text === undefined) return '';
+    const div = document.createElement('div');
+    div.textContent = text;
+    return div.innerHTML;
+}
+
+function formatDate(dateString) {
+    if (!dateString) return '';
+    try {
+        const date = new Date(dateString);
+        if (isNaN(date.getTime())) return '';
+
+        const now = new Date();
+        const diff = now - date;
+
+        if (diff < 60000) return '刚刚';
+        if (diff < 3600000) return `${Math.floor(diff / 60000)}分钟前`;
+        if (diff < 86400000) return `${Math.floor(diff / 3600000)}小时前`;
+        if (diff < 604800000) return `${Math.floor(diff / 86400000)}天前`;
+
+        return date.toLocaleDateString('zh-CN');
+    } catch (error) {
+        return '';
+    }
+}
+
+function formatBytes(bytes) {
+    if (!bytes) return '0 B';
+    const units = ['B', 'KB', 'MB', 'GB'];
+    let index = 0;
+    while (bytes >= 1024 && index < units.length - 1) {
+        bytes /= 1024;
+        index++;
+    }
+    return `${index === 0 ? bytes : bytes.toFixed(1)} ${units[index]}`;
+}
+
+// 文件夹的子树汇总：笔记数和正文大小
+function formatRollup(rollup) {
+    if (!rollup) return '';
+    return `${rollup.note_count} 篇笔记 · ${formatBytes(rollup.byte_size)}`;
+}
+
+function debounce(func, wait) {
+    let timeout;
+    return function executedFunction(...args) {
+        const later = () => {
+            clearTimeout(timeout);
+            func(...args);
+        };
+        clearTimeout(timeout);
+        timeout = setTimeout(later, wait);
+    };
+}
+
+function findNode(id, nodes = AppState.treeData) {
+    if (!nodes) return null;
+    for (const node of nodes) {
+        if (node.id == id) return node;
+        if (node.children && node.children.length > 0) {
+            const found = findNode(id, node.children);
+            if (found) return found;
+        }
+    }
+    return null;
+}
+
+// ===== 增量同步 =====
+function removeTreeNode(id, nodes = AppState.treeData) {
+    if (!nodes) return null;
+    const index = nodes.findIndex(node => node.id == id);
+    if (index !== -1) {
+        return nodes.splice(index, 1)[0];
+    }
+    for (const node of nodes) {
+        if (node.children && node.children.length > 0) {
+            const removed = removeTreeNode(id, node.children);
+            if (removed) return removed;
+        }
+    }
+    return null;
+}
+
+// 同级节点按服务端的 position 排序
+function sortSiblings(parentId) {
+    const parent = parentId ? findNode(parentId) : null;
+    const siblings = parent ? parent.children : AppState.treeData;
+    if (siblings) {
+        siblings.sort((a, b) => (a.position - b.position) || (a.id - b.id));
+    }
+}
+
+async function applyChanges(delta) {
+    AppState.changeSeq = delta.seq;
+    if (delta.reset) {
+        await loadTree();
+        await refreshCurrentView();
+        return;
+    }
+
+    const touchedParents = new Set();
+    delta.deleted.forEach(id => {
+        const removed = removeTreeNode(id);
+        if (removed) touchedParents.add(removed.parent_id || 0);
+    });
+
+    delta.changed.forEach(changed => {
+        const existing = findNode(changed.id);
+        if (existing && existing.parent_id === changed.parent_id) {
+            Object.assign(existing, changed);
+            sortSiblings(changed.parent_id);
+        } else {
+            // 新节点或父节点变化：从原位置摘下后挂到新父节点
+            const children = existing ? existing.children : [];
+            if (existing) {
+                touchedParents.add(existing.parent_id || 0);
+                removeTreeNode(changed.id);
+            }
+            const node = { ...changed, children: children || [] };
+            const parent = changed.parent_id ? findNode(changed.parent_id) : null;
+            if (parent) {
+                parent.children = parent.children || [];
+                parent.children.push(node);
+            } else {
+                AppState.treeData.push(node);
+            }
+            sortSiblings(changed.parent_id);
+        }
+        touchedParents.add(changed.parent_id || 0);
+    });
+
+    renderTree(AppState.treeData);
+
+    // 当前打开的文件夹受影响时刷新内容区
+    if (!AppState.searchQuery && !AppState.currentNoteId && touchedParents.has(AppState.currentFolderId)) {
+        await enterFolder(AppState.currentFolderId);
+    }
+}
+
+// 增量同步用短轮询：每次请求立即返回，不像 SSE 长连接那样占住服务端线程；页面隐藏时暂停
+const CHANGE_POLL_INTERVAL = 3000;
+
+function startChangeSync() {
+    if (AppState.changeTimer) return;
+
+    const poll = async () => {
+        if (!document.hidden) {
+            try {
+                const delta = await API.request(`/changes?since=${AppState.changeSeq}`);
+                if (delta.reset || delta.seq > AppState.changeSeq) {
+                    await applyChanges(delta);
+                }
+            } catch (error) {
+                console.error('应用增量变更失败:', error);
+            }
+        }
+        AppState.changeTimer = setTimeout(poll, CHANGE_POLL_INTERVAL);
+    };
+    AppState.changeTimer = setTimeout(poll, CHANGE_POLL_INTERVAL);
+}
+
+// ===== 根目录保护功能 =====
+function isRootDirectory(itemId) {
+    return itemId == AppState.ROOT_DIRECTORY_ID;
+}
+
+function checkRootDirectoryProtection(itemId, operation = 'delete') {
+    if (isRootDirectory(itemId)) {
+        showToast(`根目录不能被${operation === 'delete' ? '删除' : '移动'}`, 'warning');
+        return false;
+    }
+    return true;
+}
+
+function updateDeleteButtonsState() {
+    const deleteButtons = [
+        Elements.batchDeleteBtn,
+        Elements.mobileDeleteBtn,
+        Elements.contextDeleteBtn,
+        Elements.mobileContextDeleteBtn
+    ];
+
+    const isRootInSelection = Array.from(AppState.selectedItems).some(id => isRootDirectory(id));
+    const isCurrentRoot = isRootDirectory(AppState.currentFolderId) || isRootDirectory(AppState.currentNoteId);
+
+    deleteButtons.forEach(btn => {
+        if (btn) {
+            if (isRootInSelection || (AppState.selectedItems.size === 0 && isCurrentRoot)) {
+                btn.classList.add('disabled');
+                btn.style.cursor = 'not-allowed';
+                btn.disabled = true;
+            } else {
+                btn.classList.remove('disabled');
+                btn.style.cursor = 'pointer';
+                btn.disabled = false;
+            }
+        }
+    });
+}
+
+// ===== 树形结构功能 =====
+async function loadTree() {
+    try {
+        showLoading();
+        const treeData = await API.getTree();
+        AppState.treeData = treeData;
+        renderTree(treeData);
+    } catch (error) {
+        console.error('加载树状结构失败:', error);
+        showToast('加载目录失败', 'error');
+    } finally {
+        hideLoading();
+    }
+}
+
+function renderTree(nodes, parentElement = null, level = 0) {
+    const container = parentElement || Elements.treeContainer;
+    if (!container) return;
+
+    if (!parentElement) {
+        container.innerHTML = '';
+    }
+
+    if (!nodes || !Array.isArray(nodes)) return;
+
+    nodes.forEach(node => {
+        const isRoot = isRootDirectory(node.id);
+        const isExpanded = AppState.expandedNodes.has(node.id);
+        const hasChildren = node.children && node.children.length > 0;
+
+        const treeNode = document.createElement('div');
+        treeNode.className = `tree-node ${isRoot ? 'root-directory' : ''}`;
+        treeNode.dataset.id = node.id;
+        treeNode.dataset.type = node.type;
+
+        treeNode.innerHTML = `
+            ${hasChildren ? `
+                <div class="node-toggle ${isExpanded ? 'expanded' : ''}" onclick="toggleNode(${node.id}, event)">
+                    ›
+                </div>
+            ` : '<div class="node-toggle-placeholder" style="width: 28px;"></div>'}
+
+            <div class="node-icon">
+                ${node.type === 'folder' ? '📁' : '📄'}
+            </div>
+
+            <div class="node-label">
+                ${escapeHtml(node.title || '未命名')}
+            </div>
+
+            ${node.is_favorite ? `
+                <div class="node-badge">⭐</div>
+            ` : ''}
+        `;
+
+        // 添加点击事件
+        const label = treeNode.querySelector('.node-label');
+        if (label) {
+            label.onclick = () => enterNode(node.id, node.type);
+        }
+
+        // 添加右键菜单和长按支持
+        treeNode.addEventListener('contextmenu', (e) => {
+            e.preventDefault();
+            e.stopPropagation();
+            showContextMenu(e, treeNode, node.id, node.type);
+        });
+
+        setupLongPress(treeNode, node.id, node.type);
+
+        container.appendChild(treeNode);
+
+        if (hasChildren) {
+            const childrenContainer = document.createElement('div');
+            childrenContainer.className = `tree-children ${isExpanded ? 'expanded' : ''}`;
+            childrenContainer.dataset.parentId = node.id;
+
+            renderTree(node.children, childrenContainer, level + 1);
+            container.appendChild(childrenContainer);
+        }
+    });
+}
+
+function toggleNode(nodeId, event) {
+    if (event) {
+        event.stopPropagation();
+    }
+
+    const toggle = document.querySelector(`.node-toggle[onclick*="${nodeId}"]`);
+    if (toggle) {
+        toggle.classList.toggle('expanded');
+    }
+
+    const childrenContainer = document.querySelector(`.tree-children[data-parent-id="${nodeId}"]`);
+    if (childrenContainer) {
+        childrenContainer.classList.toggle('expanded');
+    }
+
+    if (AppState.expandedNodes.has(nodeId)) {
+        AppState.expandedNodes.delete(nodeId);
+    } else {
+        AppState.expandedNodes.add(nodeId);
+    }
+}
+
+function expandAll() {
+    const expandAllNodes = (nodes) => {
+        if (!nodes || !Array.isArray(nodes)) return;
+        nodes.forEach(node => {
+            AppState.expandedNodes.add(node.id);
+            if (node.children && node.children.length > 0) {
+                expandAllNodes(node.children);
+            }
+        });
+    };
+
+    expandAllNodes(AppState.treeData);
+    renderTree(AppState.treeData);
+    showToast('已展开所有节点', 'success');
+}
+
+// ===== 导航功能 =====
+async function enterNode(id, type) {
+    if (AppState.isLoading) return;
+
+    AppState.isLoading = true;
+
+    try {
+        if (type === 'folder') {
+            await enterFolder(id);
+        } else {
+            await openNote(id);
+        }
+
+        if (window.innerWidth <= 768 && AppState.isSidebarOpen) {
+            toggleSidebar();
+        }
+    } catch (error) {
+        console.error('导航失败:', error);
+        showToast('导航失败', 'error');
+    } finally {
+        AppState.isLoading = false;
+    }
+}
+
+async function enterFolder(folderId) {
+    try {
+        AppState.currentFolderId = folderId;
+        AppState.currentNoteId = null;
+        AppState.selectedItems.clear();
+        updateSelectionUI();
+        updateDeleteButtonsState();
+
+        if (folderId === 0) {
+            AppState.breadcrumbs = [{id: 0, title: '根目录', type: 'folder'}];
+        } else {
+            const crumbs = await API.getBreadcrumbs(folderId);
+            AppState.breadcrumbs = [{id: 0, title: '根目录', type: 'folder'}, ...crumbs];
+        }
+
+        renderBreadcrumbs();
+
+        if (folderId === 0) {
+            Elements.headerTitle.textContent = '根目录';
+        } else {
+            const folder = findNode(folderId);
+            Elements.headerTitle.textContent = folder?.title || '文件夹';
+        }
+
+        if (Elements.viewToggle) {
+            Elements.viewToggle.style.display = window.innerWidth > 768 ? 'flex' : 'none';
+        }
+        if (Elements.batchActions) {
+            Elements.batchActions.classList.remove('show');
+        }
+        if (Elements.mobileActions) {
+            Elements.mobileActions.style.display = window.innerWidth <= 768 ? 'flex' : 'none';
+        }
+
+        const items = await API.getFolder(folderId);
+
+        if (Elements.emptyView) Elements.emptyView.classList.add('hidden');
+        if (Elements.searchResults) Elements.searchResults.classList.add('hidden');
+        if (Elements.detailView) Elements.detailView.classList.add('hidden');
+        if (Elements.editorView) Elements.editorView.classList.add('hidden');
+        if (Elements.folderView) Elements.folderView.classList.remove('hidden');
+
+        renderFolderItems(items);
+        updateTreeSelection();
+
+        addToRecentHistory({
+            id: folderId,
+            type: 'folder',
+            title: Elements.headerTitle ? Elements.headerTitle.textContent : '文件夹'
+        });
+
+    } catch (error) {
+        console.error('进入文件夹失败:', error);
+        showToast('无法进入文件夹', 'error');
+    }
+}
+
+async function openNote(noteId) {
+    try {
+        AppState.currentNoteId = noteId;
+        AppState.selectedItems.clear();
+        updateSelectionUI();
+        updateDeleteButtonsState();
+
+        const note = await API.getNode(noteId, { highlight: true });
+
+        const crumbs = await API.getBreadcrumbs(noteId);
+        AppState.breadcrumbs = [{id: 0, title: '根目录', type: 'folder'}, ...crumbs];
+        renderBreadcrumbs();
+
+        if (Elements.headerTitle) {
+            Elements.headerTitle.textContent = note.title;
+        }
+
+        if (Elements.viewToggle) {
+            Elements.viewToggle.style.display = 'none';
+        }
+        if (Elements.batchActions) {
+            Elements.batchActions.classList.remove('show');
+        }
+        if (Elements.mobileActions) {
+            Elements.mobileActions.style.display = window.innerWidth <= 768 ? 'flex' : 'none';
+        }
+
+        if (Elements.emptyView) Elements.emptyView.classList.add('hidden');
+        if (Elements.searchResults) Elements.searchResults.classList.add('hidden');
+        if (Elements.folderView) Elements.folderView.classList.add('hidden');
+        if (Elements.editorView) Elements.editorView.classList.add('hidden');
+        if (Elements.detailView) Elements.detailView.classList.remove('hidden');
+
+        renderNoteDetail(note);
+        updateTreeSelection();
+
+        addToRecentHistory({
+            id: noteId,
+            type: 'note',
+            title: note.title
+        });
+
+    } catch (error) {
+        console.error('打开笔记失败:', error);
+        showToast('无法打开笔记', 'error');
+    }
+}
+
+function renderBreadcrumbs() {
+    if (!Elements.breadcrumbs) return;
+    Elements.breadcrumbs.innerHTML = '';
+
+    AppState.breadcrumbs.forEach((crumb, index) => {
+        const isLast = index === AppState.breadcrumbs.length - 1;
+        const item = document.createElement('div');
+        item.className = `breadcrumb-item ${isLast ? 'active' : ''}`;
+        if (!isLast) {
+            item.onclick = () => {
+                if (crumb.id !== undefined && crumb.type) {
+                    enterNode(crumb.id, crumb.type || 'folder');
+                }
+            };
+        }
+        item.innerHTML = `
+            ${index === 0 ? '<div class="node-icon">🏠</div>' : ''}
+            <div>${escapeHtml(crumb.title || '未知')}</div>
+        `;
+        Elements.breadcrumbs.appendChild(item);
+        if (!isLast) {
+            const separator = document.createElement('div');
+            separator.className = 'breadcrumb-separator';
+            separator.textContent = '›';
+            Elements.breadcrumbs.appendChild(separator);
+        }
+    });
+}
+
+function goBack() {
+    if (AppState.currentNoteId) {
+        const currentNote = findNode(AppState.currentNoteId);
+        if (currentNote && currentNote.parent_id !== undefined) {
+            enterNode(currentNote.parent_id || 0, 'folder');
+        } else {
+            enterNode(0, 'folder');
+        }
+    } else if (AppState.currentFolderId !== 0) {
+        const currentFolder = findNode(AppState.currentFolderId);
+        if (currentFolder && currentFolder.parent_id !== undefined) {
+            enterNode(currentFolder.parent_id || 0, 'folder');
+        } else {
+            enterNode(0, 'folder');
+        }
+    } else {
+        showToast('已在根目录', 'info');
+    }
+}
+
+function goToRoot() {
+    enterNode(0, 'folder');
+}
+
+// ===== 文件管理功能 =====
+function showCreateFolderModal() {
+    populateParentSelect('folderParent');
+    document.getElementById('folderName').value = '';
+    Elements.createFolderModal.classList.add('show');
+    toggleFabMenu();
+}
+
+function hideCreateFolderModal() {
+    Elements.createFolderModal.classList.remove('show');
+}
+
+async function createFolder() {
+    const name = document.getElementById('folderName').value.trim();
+    const parentId = document.getElementById('folderParent').value;
+
+    if (!name) {
+        showToast('请输入文件夹名称', 'error');
+        return;
+    }
+
+    try {
+        showLoading();
+        await API.saveNode({
+            title: name,
+            type: 'folder',
+            parent_id: parentId
+        });
+
+        hideCreateFolderModal();
+        await loadTree();
+
+        if (parentId == AppState.currentFolderId) {
+            await enterFolder(AppState.currentFolderId);
+        } else if (parentId == 0 && AppState.currentFolderId == 0) {
+            await enterFolder(0);
+        }
+
+        showToast('文件夹创建成功', 'success');
+    } catch (error) {
+        console.error('创建文件夹失败:', error);
+        showToast('创建文件夹失败', 'error');
+    } finally {
+        hideLoading();
+    }
+}
+
+function showCreateNoteModal() {
+    populateParentSelect('noteParent');
+    document.getElementById('noteTitle').value = '';
+    Elements.createNoteModal.classList.add('show');
+    toggleFabMenu();
+}
+
+function hideCreateNoteModal() {
+    Elements.createNoteModal.classList.remove('show');
+}
+
+async function createNote() {
+    const title = document.getElementById('noteTitle').value.trim();
+    const parentId = document.getElementById('noteParent').value;
+
+    if (!title) {
+        showToast('请输入笔记标题', 'error');
+        return;
+    }
+
+    try {
+        showLoading();
+        const result = await API.saveNode({
+            title: title,
+            type: 'note',
+            parent_id: parentId,
+            usage: '',
+            code_snippet: '',
+            custom_modules: [],
+            tags: [],
+            is_favorite: false
+        });
+
+        hideCreateNoteModal();
+        await loadTree();
+        await openNote(result.id);
+
+        showToast('笔记创建成功', 'success');
+    } catch (error) {
+        console.error('创建笔记失败:', error);
+        showToast('创建笔记失败', 'error');
+    } finally {
+        hideLoading();
+    }
+}
+
+// ===== 右键菜单功能 =====
+function showContextMenu(event, element, itemId, itemType) {
+    if (event) {
+        event.preventDefault();
+        event.stopPropagation();
+    }
+
+    const contextMenu = Elements.contextMenu;
+    const mobileContextMenu = Elements.mobileContextMenu;
+
+    // 如果是根目录，禁用删除按钮
+    const isRoot = isRootDirectory(itemId);
+    if (Elements.contextDeleteBtn) {
+        if (isRoot) {
+            Elements.contextDeleteBtn.classList.add('disabled');
+            Elements.contextDeleteBtn.style.cursor = 'not-allowed';
+            Elements.contextDeleteBtn.onclick = null;
+        } else {
+            Elements.contextDeleteBtn.classList.remove('disabled');
+            Elements.contextDeleteBtn.style.cursor = 'pointer';
+            Elements.contextDeleteBtn.onclick = contextMenuDelete;
+        }
+    }
+
+    if (Elements.mobileContextDeleteBtn) {
+        if (isRoot) {
+            Elements.mobileContextDeleteBtn.classList.add('disabled');
+            Elements.mobileContextDeleteBtn.style.cursor = 'not-allowed';
+            Elements.mobileContextDeleteBtn.onclick = null;
+        } else {
+            Elements.mobileContextDeleteBtn.classList.remove('disabled');
+            Elements.mobileContextDeleteBtn.style.cursor = 'pointer';
+            Elements.mobileContextDeleteBtn.onclick = mobileContextDelete;
+        }
+    }
+
+    if (window.innerWidth <= 768) {
+        // 移动端显示底部菜单
+        AppState.contextMenu.targetId = itemId;
+        AppState.contextMenu.targetType = itemType;
+        AppState.contextMenu.targetElement = element;
+
+        const node = findNode(itemId);
+        if (Elements.mobileFavoriteText && node) {
+            Elements.mobileFavoriteText.textContent = node.is_favorite ? '取消收藏' : '收藏';
+        }
+
+        if (Elements.mobileContextHeader && node) {
+            Elements.mobileContextHeader.textContent = node.title || '操作菜单';
+        }
+
+        if (mobileContextMenu) {
+            mobileContextMenu.classList.add('show');
+        }
+    } else {
+        // 桌面端显示右键菜单
+        if (contextMenu) {
+            contextMenu.classList.remove('show');
+
+            AppState.contextMenu.targetId = itemId;
+            AppState.contextMenu.targetType = itemType;
+            AppState.contextMenu.targetElement = element;
+
+            const node = findNode(itemId);
+            if (Elements.contextFavoriteText && node) {
+                Elements.contextFavoriteText.textContent = node.is_favorite ? '取消收藏' : '收藏';
+            }
+
+            if (Elements.contextMenuHeader && node) {
+                Elements.contextMenuHeader.textContent = node.title || '操作菜单';
+                Elements.contextMenuHeader.style.display = 'block';
+            }
+
+            // 定位菜单
+            const x = event.clientX;
+            const y = event.clientY;
+
+            contextMenu.style.left = x + 'px';
+            contextMenu.style.top = y + 'px';
+
+            // 确保菜单不超出屏幕
+            setTimeout(() => {
+                const rect = contextMenu.getBoundingClientRect();
+                const viewportWidth = window.innerWidth;
+                const viewportHeight = window.innerHeight;
+
+                if (rect.right > viewportWidth) {
+                    contextMenu.style.left = (viewportWidth - rect.width - 10) + 'px';
+                }
+                if (rect.bottom > viewportHeight) {
+                    contextMenu.style.top = (viewportHeight - rect.height - 10) + 'px';
+                }
+
+                contextMenu.classList.add('show');
+            }, 0);
+        }
+    }
+}
+
+function hideContextMenu() {
+    if (Elements.contextMenu) {
+        Elements.contextMenu.classList.remove('show');
+    }
+    if (Elements.mobileContextMenu) {
+        Elements.mobileContextMenu.classList.remove('show');
+    }
+}
+
+function hideMobileContextMenu() {
+    if (Elements.mobileContextMenu) {
+        Elements.mobileContextMenu.classList.remove('show');
+    }
+}
+
+function setupLongPress(element, itemId, itemType) {
+    if (!element) return;
+
+    let pressTimer;
+    let touchStartY = 0;
+    let touchStartX = 0;
+
+    element.addEventListener('contextmenu', function(e) {
+        e.preventDefault();
+        showContextMenu(e, element, itemId, itemType);
+    });
+
+    // 触摸开始
+    element.addEventListener('touchstart', function(e) {
+        if (e.touches.length !== 1) return;
+
+        const touch = e.touches[0];
+        touchStartY = touch.clientY;
+        touchStartX = touch.clientX;
+
+        pressTimer = setTimeout(() => {
+            // 创建模拟的鼠标事件来显示上下文菜单
+            const fakeEvent = new MouseEvent('contextmenu', {
+                bubbles: true,
+                cancelable: true,
+                clientX: touch.clientX,
+                clientY: touch.clientY
+            });
+
+            element.dispatchEvent(fakeEvent);
+        }, 800); // 800ms 长按时间
+    });
+
+    // 触摸结束
+    element.addEventListener('touchend', function() {
+        clearTimeout(pressTimer);
+    });
+
+    // 触摸移动 - 检查是否是滚动
+    element.addEventListener('touchmove', function(e) {
+        if (e.touches.length !== 1) return;
+
+        const touch = e.touches[0];
+        const deltaY = Math.abs(touch.clientY - touchStartY);
+        const deltaX = Math.abs(touch.clientX - touchStartX);
+
+        // 如果移动距离超过10px，认为是滚动，取消长按
+        if (deltaY > 10 || deltaX > 10) {
+            clearTimeout(pressTimer);
+        }
+    });
+}
+
+// 右键菜单操作函数
+function contextMenuEdit() {
+    const itemId = AppState.contextMenu.targetId;
+    const itemType = AppState.contextMenu.targetType;
+
+    if (itemType === 'note') {
+        showEditModal(itemId);
+    } else {
+        showToast('只能编辑笔记', 'info');
+    }
+    hideContextMenu();
+}
+
+function contextMenuRename() {
+    const itemId = AppState.contextMenu.targetId;
+    const node = findNode(itemId);
+
+    if (node) {
+        const newName = prompt('请输入新的名称：', node.title || '');
+        if (newName && newName.trim()) {
+            renameItem(itemId, newName.trim());
+        }
+    }
+    hideContextMenu();
+}
+
+function contextMenuMove() {
+    const itemId = AppState.contextMenu.targetId;
+    if (isRootDirectory(itemId)) {
+        showToast('根目录不能被移动', 'warning');
+        hideContextMenu();
+        return;
+    }
+
+    AppState.selectedItems.clear();
+    AppState.selectedItems.add(itemId);
+    showMoveModal('batch');
+    hideContextMenu();
+}
+
+function contextMenuCopy() {
+    const itemId = AppState.contextMenu.targetId;
+    const node = findNode(itemId);
+
+    if (node) {
+        const nodeData = JSON.stringify(node, null, 2);
+        navigator.clipboard.writeText(nodeData).then(() => {
+            showToast('已复制到剪贴板', 'success');
+        }).catch(err => {
+            console.error('复制失败:', err);
+            showToast('复制失败', 'error');
+        });
+    }
+    hideContextMenu();
+}
+
+function contextMenuFavorite() {
+    const itemId = AppState.contextMenu.targetId;
+    toggleFavorite(itemId);
+    hideContextMenu();
+}
+
+function contextMenuDelete() {
+    const itemId = AppState.contextMenu.targetId;
+
+    // 检查根目录保护
+    if (!checkRootDirectoryProtection(itemId, 'delete')) {
+        hideContextMenu();
+        return;
+    }
+
+    const node = findNode(itemId);
+
+    if (node) {
+        showDeleteConfirmModal([{
+            id: itemId,
+            title: node.title,
+            type: node.type
+        }]);
+    }
+    hideContextMenu();
+}
+
+function contextMenuExport() {
+    const itemId = AppState.contextMenu.targetId;
+    const node = findNode(itemId);
+
+    if (node) {
+        exportItem(itemId);
+    }
+    hideContextMenu();
+}
+
+function contextMenuShare() {
+    const itemId = AppState.contextMenu.targetId;
+    const node = findNode(itemId);
+
+    if (node) {
+        shareItem(itemId);
+    }
+    hideContextMenu();
+}
+
+// 移动端菜单操作函数
+function mobileContextEdit() { contextMenuEdit(); hideMobileContextMenu(); }
+function mobileContextRename() { contextMenuRename(); hideMobileContextMenu(); }
+function mobileContextMove() { 
+    const itemId = AppState.contextMenu.targetId;
+    if (isRootDirectory(itemId)) {
+        showToast('根目录不能被移动', 'warning');
+        hideMobileContextMenu();
+        return;
+    }
+    contextMenuMove(); 
+    hideMobileContextMenu(); 
+}
+function mobileContextCopy() { contextMenuCopy(); hideMobileContextMenu(); }
+function mobileContextFavorite() { contextMenuFavorite(); hideMobileContextMenu(); }
+function mobileContextDelete() { 
+    const itemId = AppState.contextMenu.targetId;
+    if (!checkRootDirectoryProtection(itemId, 'delete')) {
+        hideMobileContextMenu();
+        return;
+    }
+    contextMenuDelete(); 
+    hideMobileContextMenu(); 
+}
+function mobileContextExport() { contextMenuExport(); hideMobileContextMenu(); }
+
+// ===== 搜索功能 =====
+const handleSearch = debounce(async function() {
+    const query = Elements.searchInput.value.trim();
+    if (query) {
+        try {
+            showLoading();
+            const results = await API.search(query);
+            AppState.searchQuery = query;
+            AppState.currentFolderId = null;
+            AppState.currentNoteId = null;
+
+            renderSearchResults(results, query);
+        } catch (error) {
+            console.error('搜索失败:', error);
+            showToast('搜索失败', 'error');
+        } finally {
+            hideLoading();
+        }
+    } else {
+        AppState.searchQuery = '';
+        if (Elements.searchResults) {
+            Elements.searchResults.classList.add('hidden');
+        }
+        if (AppState.currentFolderId !== null) {
+            enterFolder(AppState.currentFolderId);
+        } else {
+            showEmptyView();
+        }
+    }
+}, 300);
+
+function renderSearchResults(results, query) {
+    if (!Elements.searchResults || !Elements.searchResultsList) return;
+
+    if (Elements.emptyView) Elements.emptyView.classList.add('hidden');
+    if (Elements.folderView) Elements.folderView.classList.add('hidden');
+    if (Elements.detailView) Elements.detailView.classList.add('hidden');
+    if (Elements.editorView) Elements.editorView.classList.add('hidden');
+    if (Elements.searchResults) Elements.searchResults.classList.remove('hidden');
+
+    if (Elements.headerTitle) {
+        Elements.headerTitle.textContent = `搜索: ${query}`;
+    }
+    if (Elements.searchCount) {
+        Elements.searchCount.textContent = `找到 ${results.length} 个结果`;
+    }
+
+    Elements.searchResultsList.innerHTML = '';
+
+    if (!results || results.length === 0) {
+        Elements.searchResultsList.innerHTML = `
+            <div class="empty-state">
+                <div class="empty-icon">🔍</div>
+                <div class="empty-title">未找到结果</div>
+                <div class="empty-description">
+                    尝试使用其他关键词搜索
+                </div>
+            </div>
+        `;
+        return;
+    }
+
+    results.forEach(result => {
+        const item = document.createElement('div');
+        item.className = 'search-result-item';
+        item.onclick = () => {
+            if (result.id && result.type) {
+                enterNode(result.id, result.type);
+            }
+        };
+
+        let preview = '';
+        if (result.match_details && result.match_details.length > 0) {
+            const firstMatch = result.match_details[0];
+            preview = firstMatch.content || result.preview || '';
+        } else {
+            preview = result.preview || '';
+        }
+
+        item.innerHTML = `
+            <div class="result-title">
+                ${escapeHtml(result.title || '未命名')}
+                <div class="result-badge">${result.type === 'folder' ? '📁' : '📄'}</div>
+            </div>
+            <div class="result-preview">${preview}</div>
+            <div class="result-meta">
+                <span>${formatDate(result.updated_at)}</span>
+                <span>${result.breadcrumbs ? result.breadcrumbs.map(b => escapeHtml(b.title)).join(' > ') : ''}</span>
+            </div>
+        `;
+
+        Elements.searchResultsList.appendChild(item);
+    });
+}
+
+// ===== 选择模式功能 =====
+function toggleSelectionMode() {
+    AppState.isSelectionMode = !AppState.isSelectionMode;
+    if (!AppState.isSelectionMode) {
+        AppState.selectedItems.clear();
+    }
+    updateSelectionUI();
+    updateDeleteButtonsState();
+    toggleFabMenu();
+}
+
+function toggleItemSelection(itemId, element) {
+    if (!element) return;
+
+    if (isRootDirectory(itemId)) {
+        showToast('根目录不能被选择', 'warning');
+        return;
+    }
+
+    if (AppState.selectedItems.has(itemId)) {
+        AppState.selectedItems.delete(itemId);
+    } else {
+        AppState.selectedItems.add(itemId);
+    }
+
+    updateSelectionUI();
+    updateDeleteButtonsState();
+}
+
+function updateSelectionUI() {
+    const checkboxes = document.querySelectorAll('.selection-checkbox');
+    checkboxes.forEach(cb => {
+        const parent = cb.closest('[data-id]');
+        if (parent) {
+            const itemId = parseInt(parent.dataset.id);
+            cb.classList.toggle('checked', AppState.selectedItems.has(itemId));
+
+            // 根目录禁用复选框
+            if (isRootDirectory(itemId)) {
+                cb.style.opacity = '0.5';
+                cb.style.cursor = 'not-allowed';
+                cb.onclick = null;
+            } else {
+                cb.style.opacity = '1';
+                cb.style.cursor = 'pointer';
+                cb.onclick = (e) => {
+                    e.stopPropagation();
+                    toggleItemSelection(itemId, parent);
+                };
+            }
+        }
+    });
+
+    if (Elements.batchActions) {
+        if (AppState.isSelectionMode && AppState.selectedItems.size > 0) {
+            Elements.batchActions.classList.add('show');
+            if (Elements.viewToggle) Elements.viewToggle.style.display = 'none';
+        } else {
+            Elements.batchActions.classList.remove('show');
+            if (!AppState.currentNoteId && window.innerWidth > 768 && Elements.viewToggle) {
+                Elements.viewToggle.style.display = 'flex';
+            }
+        }
+    }
+}
+
+function exitSelectionMode() {
+    AppState.isSelectionMode = false;
+    AppState.selectedItems.clear();
+    updateSelectionUI();
+    updateDeleteButtonsState();
+}
+
+// ===== 删除功能 =====
+function deleteCurrent() {
+    let items = [];
+    if (AppState.currentNoteId) {
+        if (isRootDirectory(AppState.currentNoteId)) {
+            showToast('根目录不能被删除', 'warning');
+            return;
+        }
+        items.push({
+            id: AppState.currentNoteId,
+            title: findNode(AppState.currentNoteId)?.title || '笔记',
+            type: 'note'
+        });
+    } else if (AppState.currentFolderId !== 0) {
+        if (isRootDirectory(AppState.currentFolderId)) {
+            showToast('根目录不能被删除', 'warning');
+            return;
+        }
+        items.push({
+            id: AppState.currentFolderId,
+            title: findNode(AppState.currentFolderId)?.title || '文件夹',
+            type: 'folder'
+        });
+    } else {
+        showToast('请先选择一个项目', 'error');
+        return;
+    }
+
+    showDeleteConfirmModal(items);
+}
+
+function deleteSelected() {
+    if (AppState.selectedItems.size === 0) {
+        showToast('请先选择项目', 'error');
+        return;
+    }
+
+    // 检查是否包含根目录
+    const hasRoot = Array.from(AppState.selectedItems).some(id => isRootDirectory(id));
+    if (hasRoot) {
+        showToast('根目录不能被删除', 'warning');
+        return;
+    }
+
+    const items = Array.from(AppState.selectedItems).map(id => {
+        const node = findNode(id);
+        return {
+            id: id,
+            title: node?.title || '项目',
+            type: node?.type || 'note'
+        };
+    });
+
+    showDeleteConfirmModal(items);
+}
+
+function showDeleteConfirmModal(items) {
+    // 检查是否包含根目录
+    const hasRoot = items.some(item => isRootDirectory(item.id));
+    if (hasRoot) {
+        showToast('根目录不能被删除', 'warning');
+        return;
+    }
+
+    AppState.pendingOperation = {
+        type: 'delete',
+        items: items,
+        targetId: null,
+        extraData: null
+    };
+
+    const deleteMessage = document.getElementById('deleteMessage');
+    const deleteSubMessage = document.getElementById('deleteSubMessage');
+
+    if (items.length === 1) {
+        deleteMessage.textContent = `确定要删除 "${escapeHtml(items[0].title)}" 吗？`;
+        deleteSubMessage.textContent = items[0].type === 'folder' 
+            ? '此文件夹及其所有内容将被永久删除' 
+            : '此笔记将被永久删除';
+    } else {
+        deleteMessage.textContent = `确定要删除 ${items.length} 个项目吗？`;
+        deleteSubMessage.textContent = '这些项目将被永久删除';
+    }
+
+    Elements.deleteConfirmModal.classList.add('show');
+}
+
+function hideDeleteConfirmModal() {
+    Elements.deleteConfirmModal.classList.remove('show');
+}
+
+async function performDelete() {
+    const items = AppState.pendingOperation.items;
+    const ids = items.map(item => item.id);
+
+    // 再次检查根目录保护
+    if (ids.some(id => isRootDirectory(id))) {
+        showToast('根目录不能被删除', 'warning');
+        hideDeleteConfirmModal();
+        return;
+    }
+
+    try {
+        showLoading();
+        await API.deleteNodes(ids);
+
+        hideDeleteConfirmModal();
+        await loadTree();
+
+        if (AppState.isSelectionMode) {
+            exitSelectionMode();
+        }
+
+        if (AppState.currentNoteId && ids.includes(AppState.currentNoteId)) {
+            await enterFolder(0);
+        } else if (AppState.currentFolderId && ids.includes(AppState.currentFolderId)) {
+            await enterFolder(0);
+        } else {
+            await refreshCurrentView();
+        }
+
+        showToast(`已将 ${ids.length} 个项目移入回收站`, 'success');
+    } catch (error) {
+        console.error('删除失败:', error);
+        if (error.message.includes('根目录')) {
+            showToast('根目录不能被删除', 'warning');
+        } else {
+            showToast('删除失败', 'error');
+        }
+    } finally {
+        hideLoading();
+    }
+}
+
+// ===== 移动功能 =====
+function showMoveModal(type) {
+    let items = [];
+
+    if (type === 'single') {
+        if (AppState.currentNoteId) {
+            if (isRootDirectory(AppState.currentNoteId)) {
+                showToast('根目录不能被移动', 'warning');
+                return;
+            }
+            items.push({
+                id: AppState.currentNoteId,
+                title: findNode(AppState.currentNoteId)?.title || '笔记',
+                type: 'note'
+            });
+        } else if (AppState.currentFolderId !== 0) {
+            if (isRootDirectory(AppState.currentFolderId)) {
+                showToast('根目录不能被移动', 'warning');
+                return;
+            }
+            items.push({
+                id: AppState.currentFolderId,
+                title: findNode(AppState.currentFolderId)?.title || '文件夹',
+                type: 'folder'
+            });
+        } else {
+            showToast('请先选择一个项目', 'error');
+            return;
+        }
+    } else if (type === 'batch') {
+        if (AppState.selectedItems.size === 0) {
+            showToast('请先选择要移动的项目', 'error');
+            return;
+        }
+
+        // 检查是否包含根目录
+        const hasRoot = Array.from(AppState.selectedItems).some(id => isRootDirectory(id));
+        if (hasRoot) {
+            showToast('根目录不能被移动', 'warning');
+            return;
+        }
+
+        items = Array.from(AppState.selectedItems).map(id => {
+            const node = findNode(id);
+            return {
+                id: id,
+                title: node?.title || '项目',
+                type: node?.type || 'note'
+            };
+        });
+    }
+
+    AppState.pendingOperation = {
+        type: 'move',
+        items: items,
+        targetId: null,
+        extraData: null
+    };
+
+    populateMoveTargetSelect();
+    Elements.moveModal.classList.add('show');
+}
+
+function hideMoveModal() {
+    Elements.moveModal.classList.remove('show');
+}
+
+function populateMoveTargetSelect() {
+    const select = document.getElementById('moveTarget');
+    if (!select) return;
+
+    select.innerHTML = '<option value="0">根目录</option>';
+
+    const addOptions = (nodes, depth = 0) => {
+        nodes.forEach(node => {
+            if (node.type === 'folder') {
+                const isDisabled = AppState.pendingOperation.items.some(
+                    item => item.id == node.id || isDescendant(node.id, item.id)
+                );
+
+                const option = document.createElement('option');
+                option.value = node.id;
+                option.textContent = '  '.repeat(depth) + node.title;
+                option.disabled = isDisabled;
+                select.appendChild(option);
+
+                if (node.children && node.children.length > 0) {
+                    addOptions(node.children, depth + 1);
+                }
+            }
+        });
+    };
+
+    addOptions(AppState.treeData || []);
+}
+
+function isDescendant(parentId, childId) {
+    const node = findNode(childId);
+    if (!node) return false;
+
+    let current = node;
+    while (current && current.parent_id) {
+        if (current.parent_id == parentId) {
+            return true;
+        }
+        current = findNode(current.parent_id);
+    }
+    return false;
+}
+
+async function performMove() {
+    const targetId = document.getElementById('moveTarget').value;
+    const items = AppState.pendingOperation.items;
+
+    // 检查是否包含根目录
+    const hasRoot = items.some(item => isRootDirectory(item.id));
+    if (hasRoot) {
+        showToast('根目录不能被移动', 'warning');
+        hideMoveModal();
+        return;
+    }
+
+    try {
+        showLoading();
+
+        for (const item of items) {
+            await API.moveNode(item.id, targetId);
+        }
+
+        hideMoveModal();
+        await loadTree();
+
+        if (AppState.isSelectionMode) {
+            exitSelectionMode();
+        }
+
+        await refreshCurrentView();
+
+        showToast(`成功移动 ${items.length} 个项目`, 'success');
+    } catch (error) {
+        console.error('移动失败:', error);
+        if (error.message.includes('根目录')) {
+            showToast('根目录不能被移动', 'warning');
+        } else {
+            showToast('移动失败: ' + error.message, 'error');
+        }
+    } finally {
+        hideLoading();
+    }
+}
+
+// ===== 批量重命名功能 =====
+function batchRename() {
+    if (AppState.selectedItems.size === 0) {
+        showToast('请先选择要重命名的项目', 'error');
+        return;
+    }
+
+    // 检查是否包含根目录
+    const hasRoot = Array.from(AppState.selectedItems).some(id => isRootDirectory(id));
+    if (hasRoot) {
+        showToast('根目录不能被重命名', 'warning');
+        return;
+    }
+
+    const items = Array.from(AppState.selectedItems).map(id => {
+        const node = findNode(id);
+        return {
+            id: id,
+            title: node?.title || '项目',
+            type: node?.type || 'note'
+        };
+    });
+
+    AppState.pendingOperation = {
+        type: 'rename',
+        items: items,
+        targetId: null,
+        extraData: null
+    };
+
+    document.getElementById('renameText').value = '';
+    document.getElementById('replaceFrom').value = '';
+    document.getElementById('replaceTo').value = '';
+    updateRenamePreview();
+    Elements.batchRenameModal.classList.add('show');
+}
+
+function hideBatchRenameModal() {
+    Elements.batchRenameModal.classList.remove('show');
+}
+
+function updateRenamePreview() {
+    const pattern = document.getElementById('renamePattern').value;
+    const text = document.getElementById('renameText').value;
+    const replaceFrom = document.getElementById('replaceFrom').value;
+    const replaceTo = document.getElementById('replaceTo').value;
+
+    const preview = document.getElementById('renamePreview');
+    if (!preview) return;
+
+    preview.innerHTML = '';
+
+    AppState.pendingOperation.items.forEach(item => {
+        let newName = item.title;
+
+        switch (pattern) {
+            case 'prefix':
+                newName = text + newName;
+                break;
+            case 'suffix':
+                newName = newName + text;
+                break;
+            case 'replace':
+                if (replaceFrom) {
+                    newName = newName.replace(new RegExp(replaceFrom, 'g'), replaceTo);
+                }
+                break;
+            case 'custom':
+                newName = text;
+                break;
+        }
+
+        const div = document.createElement('div');
+        div.className = 'text-sm mb-1';
+        div.innerHTML = `
+            <span class="text-tertiary">${escapeHtml(item.title)}</span>
+            <span class="mx-2">→</span>
+            <span class="text-primary">${escapeHtml(newName)}</span>
+        `;
+        preview.appendChild(div);
+    });
+
+    const replaceGroup = document.getElementById('replaceGroup');
+    if (replaceGroup) {
+        replaceGroup.style.display = pattern === 'replace' ? 'block' : 'none';
+    }
+
+    const renameTextLabel = document.getElementById('renameTextLabel');
+    if (renameTextLabel) {
+        const labels = {
+            'prefix': '前缀',
+            'suffix': '后缀',
+            'replace': '替换文本',
+            'custom': '新名称'
+        };
+        renameTextLabel.textContent = labels[pattern] || '文本';
+    }
+}
+
+async function performBatchRename() {
+    const pattern = document.getElementById('renamePattern').value;
+    const text = document.getElementById('renameText').value;
+    const replaceFrom = document.getElementById('replaceFrom').value;
+    const replaceTo = document.getElementById('replaceTo').value;
+
+    try {
+        showLoading();
+
+        for (const item of AppState.pendingOperation.items) {
+            let newName = item.title;
+
+            switch (pattern) {
+                case 'prefix':
+                    newName = text + newName;
+                    break;
+                case 'suffix':
+                    newName = newName + text;
+                    break;
+                case 'replace':
+                    if (replaceFrom) {
+                        newName = newName.replace(new RegExp(replaceFrom, 'g'), replaceTo);
+                    }
+                    break;
+                case 'custom':
+                    newName = text;
+                    break;
+            }
+
+            // 树数据只含预览，需取完整节点再保存
+            const node = await API.getNode(item.id);
+            if (node) {
+                await API.saveNode({
+                    id: item.id,
+                    title: newName,
+                    type: node.type,
+                    parent_id: node.parent_id,
+                    usage: node.usage,
+                    code_snippet: node.code_snippet,
+                    custom_modules: node.custom_modules || [],
+                    tags: node.tags || []
+                });
+            }
+        }
+
+        hideBatchRenameModal();
+        await loadTree();
+        exitSelectionMode();
+        await refreshCurrentView();
+
+        showToast(`成功重命名 ${AppState.pendingOperation.items.length} 个项目`, 'success');
+    } catch (error) {
+        console.error('重命名失败:', error);
+        showToast('重命名失败', 'error');
+    } finally {
+        hideLoading();
+    }
+}
+
+// ===== 编辑功能 =====
+function editCurrent() {
+    if (AppState.currentNoteId) {
+        showEditModal(AppState.currentNoteId);
+    } else {
+        showToast('请先选择一个笔记进行编辑', 'error');
+    }
+}
+
+async function showEditModal(noteId) {
+    try {
+        showLoading();
+        const note = await API.getNode(noteId);
+
+        document.getElementById('editTitle').value = note.title || '';
+        document.getElementById('editUsage').value = note.usage || '';
+        document.getElementById('editCode').value = note.code_snippet || '';
+        document.getElementById('editTags').value = note.tags ? note.tags.join(', ') : '';
+
+        populateParentSelect('editParent');
+        document.getElementById('editParent').value = note.parent_id || 0;
+
+        AppState.currentModules = note.custom_modules || [];
+        renderModules();
+
+        Elements.editModal.classList.add('show');
+        toggleFabMenu();
+    } catch (error) {
+        console.error('加载笔记失败:', error);
+        showToast('无法加载笔记', 'error');
+    } finally {
+        hideLoading();
+    }
+}
+
+function hideEditModal() {
+    Elements.editModal.classList.remove('show');
+}
+
+function renderModules() {
+    const container = document.getElementById('modulesContainer');
+    if (!container) return;
+
+    if (!AppState.currentModules || AppState.currentModules.length === 0) {
+        container.innerHTML = '<div class="text-tertiary text-center p-4">暂无自定义模块</div>';
+        return;
+    }
+
+    container.innerHTML = AppState.currentModules.map((module, index) => `
+        <div class="module-editor">
+            <div class="module-header">
+                <input type="text" class="module-title-input" 
+                       value="${escapeHtml(module.title || '')}" 
+                       placeholder="模块标题"
+                       oninput="updateModuleTitle(${index}, this.value)">
+                <div class="module-actions">
+                    <button class="btn btn-sm btn-secondary" onclick="moveModuleUp(${index})" 
+                            ${index === 0 ? 'disabled' : ''}>↑</button>
+                    <button class="btn btn-sm btn-secondary" onclick="moveModuleDown(${index})" 
+                            ${index === AppState.currentModules.length - 1 ? 'disabled' : ''}>↓</button>
+                    <button class="btn btn-sm btn-danger" onclick="removeModule(${index})">删除</button>
+                </div>
+            </div>
+            <textarea class="module-content-textarea" 
+                      placeholder="模块内容"
+                      oninput="updateModuleContent(${index}, this.value)">${escapeHtml(module.content || '')}</textarea>
+        </div>
+    `).join('');
+}
+
+function addModule() {
+    AppState.currentModules.push({
+        title: '新模块',
+        content: ''
+    });
+    renderModules();
+}
+
+function removeModule(index) {
+    AppState.currentModules.splice(index, 1);
+    renderModules();
+}
+
+function moveModuleUp(index) {
+    if (index > 0) {
+        const temp = AppState.currentModules[index];
+        AppState.currentModules[index] = AppState.currentModules[index - 1];
+        AppState.currentModules[index - 1] = temp;
+        renderModules();
+    }
+}
+
+function moveModuleDown(index) {
+    if (index < AppState.currentModules.length - 1) {
+        const temp = AppState.currentModules[index];
+        AppState.currentModules[index] = AppState.currentModules[index + 1];
+        AppState.currentModules[index + 1] = temp;
+        renderModules();
+    }
+}
+
+function updateModuleTitle(index, value) {
+    if (AppState.currentModules[index]) {
+        AppState.currentModules[index].title = value;
+    }
+}
+
+function updateModuleContent(index, value) {
+    if (AppState.currentModules[index]) {
+        AppState.currentModules[index].content = value;
+    }
+}
+
+async function saveNote() {
+    const title = document.getElementById('editTitle').value.trim();
+    const parentId = document.getElementById('editParent').value;
+    const usage = document.getElementById('editUsage').value;
+    const code_snippet = document.getElementById('editCode').value;
+    const tags = document.getElementById('editTags').value
+        .split(',')
+        .map(tag => tag.trim())
+        .filter(tag => tag.length > 0);
+
+    if (!title) {
+        showToast('请输入标题', 'error');
+        return;
+    }
+
+    try {
+        showLoading();
+
+        await API.saveNode({
+            id: AppState.currentNoteId,
+            title: title,
+            type: 'note',
+            parent_id: parentId,
+            usage: usage,
+            code_snippet: code_snippet,
+            custom_modules: AppState.currentModules,
+            tags: tags
+        });
+
+        hideEditModal();
+        await loadTree();
+        await openNote(AppState.currentNoteId);
+
+        showToast('笔记保存成功', 'success');
+    } catch (error) {
+        console.error('保存笔记失败:', error);
+        showToast('保存笔记失败', 'error');
+    } finally {
+        hideLoading();
+    }
+}
+
+// ===== 历史记录功能 =====
+async function showHistoryModal(noteId) {
+    try {
+        showLoading();
+        const history = await API.getHistory(noteId);
+
+        const historyList = Elements.historyList;
+        if (historyList) {
+            if (history && history.length > 0) {
+                historyList.innerHTML = history.map(item => `
+                    <div class="history-item" onclick="restoreHistory(${item.id})">
+                        <div class="history-title">${escapeHtml(item.title || '未命名')}</div>
+                        <div class="history-time">${formatDate(item.created_at)}</div>
+                        ${item.content && item.content.usage ? `
+                            <div class="history-preview">${escapeHtml(item.content.usage.substring(0, 100) + (item.content.usage.length > 100 ? '...' : ''))}</div>
+                        ` : ''}
+                    </div>
+                `).join('');
+            } else {
+                historyList.innerHTML = '<div class="text-center p-6 text-tertiary">暂无历史记录</div>';
+            }
+        }
+
+        Elements.historyModal.classList.add('show');
+    } catch (error) {
+        console.error('加载历史记录失败:', error);
+        showToast('加载历史记录失败', 'error');
+    } finally {
+        hideLoading();
+    }
+}
+
+function hideHistoryModal() {
+    Elements.historyModal.classList.remove('show');
+}
+
+async function restoreHistory(historyId) {
+    try {
+        showLoading();
+        const result = await API.restoreHistory(historyId);
+
+        if (result && result.id) {
+            hideHistoryModal();
+            await loadTree();
+            await openNote(result.id);
+            showToast('恢复成功', 'success');
+        }
+    } catch (error) {
+        console.error('恢复失败:', error);
+        showToast('恢复失败', 'error');
+    } finally {
+        hideLoading();
+    }
+}
+
+// ===== 收藏功能 =====
+async function toggleFavorite(noteId) {
+    try {
+        await API.toggleFavorite(noteId);
+        await loadTree();
+        if (AppState.currentNoteId === noteId) {
+            await openNote(noteId);
+        }
+        showToast('收藏状态已更新', 'success');
+    } catch (error) {
+        console.error('切换收藏状态失败:', error);
+        showToast('操作失败', 'error');
+    }
+}
+
+// ===== 辅助函数 =====
+function renderFolderItems(items) {
+    if (!Elements.folderView) return;
+
+    if (!items || items.length === 0) {
+        Elements.folderView.innerHTML = `
+            <div class="empty-state">
+                <div class="empty-icon">📁</div>
+                <div class="empty-title">文件夹为空</div>
+                <div class="empty-description">
+                    点击右下角按钮创建新项目
+                </div>
+                <div class="mt-6">
+                    <button class="btn btn-primary" onclick="showCreateMenu()">
+                        <div class="mr-2">+</div>
+                        <div>创建新项目</div>
+                    </button>
+                </div>
+            </div>
+        `;
+        return;
+    }
+
+    if (Elements.folderGrid) {
+        Elements.folderGrid.innerHTML = '';
+    }
+    if (Elements.folderList) {
+        Elements.folderList.innerHTML = '';
+    }
+
+    items.forEach(item => {
+        const isRoot = isRootDirectory(item.id);
+
+        // 网格视图
+        if (Elements.folderGrid) {
+            const card = document.createElement('div');
+            card.className = `folder-item ${isRoot ? 'root-directory' : ''}`;
+            card.dataset.id = item.id;
+            card.dataset.type = item.type;
+
+            card.innerHTML = `
+                ${AppState.isSelectionMode ? `
+                    <div class="selection-checkbox ${AppState.selectedItems.has(item.id) ? 'checked' : ''} ${isRoot ? 'disabled' : ''}"
+                         style="${isRoot ? 'opacity: 0.5; cursor: not-allowed;' : ''}">
+                    </div>
+                ` : ''}
+                <div class="${item.type === 'folder' ? 'folder-icon' : 'file-icon'}">
+                    ${item.type === 'folder' ? '📁' : '📄'}
+                </div>
+                <div class="item-title">${escapeHtml(item.title || '未命名')}</div>
+                ${item.tags && item.tags.length > 0 ? `
+                    <div class="item-badge" title="${escapeHtml(item.tags.join(', '))}">
+                        ${item.tags.length}
+                    </div>
+                ` : ''}
+            `;
+
+            card.onclick = () => {
+                if (AppState.isSelectionMode && !isRoot) {
+                    toggleItemSelection(item.id);
+                } else {
+                    enterNode(item.id, item.type);
+                }
+            };
+
+            // 添加右键菜单和长按支持
+            card.addEventListener('contextmenu', (e) => {
+                e.preventDefault();
+                showContextMenu(e, card, item.id, item.type);
+            });
+
+            setupLongPress(card, item.id, item.type);
+
+            Elements.folderGrid.appendChild(card);
+        }
+
+        // 列表视图
+        if (Elements.folderList) {
+            const row = document.createElement('div');
+            row.className = `list-item ${isRoot ? 'root-directory' : ''}`;
+            row.dataset.id = item.id;
+            row.dataset.type = item.type;
+
+            row.innerHTML = `
+                ${AppState.isSelectionMode ? `
+                    <div class="selection-checkbox ${AppState.selectedItems.has(item.id) ? 'checked' : ''} ${isRoot ? 'disabled' : ''}"
+                         style="${isRoot ? 'opacity: 0.5; cursor: not-allowed;' : ''}">
+                    </div>
+                ` : ''}
+                <div class="list-icon">
+                    ${item.type === 'folder' ? '📁' : '📄'}
+                </div>
+                <div class="list-content">
+                    <div class="list-title">${escapeHtml(item.title || '未命名')}</div>
+                    <div class="list-subtitle">
+                        ${item.rollup ? formatRollup(item.rollup) : item.usage ? (escapeHtml(item.usage.substring(0, 80)) + (item.usage.length > 80 ? '...' : '')) : '暂无描述'}
+                    </div>
+                    <div class="list-meta">
+                        ${item.tags && item.tags.length > 0 ? `
+                            <div class="list-tag">${escapeHtml(item.tags[0])}</div>
+                        ` : ''}
+                        <div class="list-date">
+                            ${formatDate(item.rollup && item.rollup.max_updated_at > item.updated_at ? item.rollup.max_updated_at : item.updated_at)}
+                        </div>
+                    </div>
+                </div>
+            `;
+
+            row.onclick = () => {
+                if (AppState.isSelectionMode && !isRoot) {
+                    toggleItemSelection(item.id);
+                } else {
+                    enterNode(item.id, item.type);
+                }
+            };
+
+            // 添加右键菜单和长按支持
+            row.addEventListener('contextmenu', (e) => {
+                e.preventDefault();
+                showContextMenu(e, row, item.id, item.type);
+            });
+
+            setupLongPress(row, item.id, item.type);
+
+            Elements.folderList.appendChild(row);
+        }
+    });
+
+    switchView(AppState.viewMode);
+}
+
+function renderNoteDetail(note) {
+    if (!Elements.detailView) return;
+
+    const container = Elements.detailView.querySelector('.detail-view');
+    if (!container) return;
+
+    // 检查是否是根目录
+    const isRoot = isRootDirectory(note.id);
+
+    container.innerHTML = `
+        <div class="detail-header">
+            <div class="detail-title">${escapeHtml(note.title || '未命名')}</div>
+            <div class="detail-actions">
+                ${!isRoot ? `
+                    <button class="action-btn" onclick="showEditModal(${note.id})">
+                        <div class="mr-2">✏️</div>
+                        <div>编辑</div>
+                    </button>
+                    <button class="action-btn" onclick="showHistoryModal(${note.id})">
+                        <div class="mr-2">🕐</div>
+                        <div>历史记录</div>
+                    </button>
+                ` : ''}
+                <button class="action-btn primary" onclick="toggleFavorite(${note.id})">
+                    <div class="mr-2">${note.is_favorite ? '⭐' : '☆'}</div>
+                    <div>${note.is_favorite ? '取消收藏' : '收藏'}</div>
+                </button>
+            </div>
+        </div>
+
+        ${note.usage ? `
+            <div class="detail-section">
+                <div class="section-label">
+                    <div>📝</div>
+                    <div>描述</div>
+                </div>
+                <div class="section-content">
+                    <div class="usage-content">${escapeHtml(note.usage)}</div>
+                </div>
+            </div>
+        ` : ''}
+
+        ${note.code_snippet ? `
+            <div class="detail-section">
+                <div class="section-label">
+                    <div>💻</div>
+                    <div>代码</div>
+                </div>
+                <div class="section-content">
+                    <div class="code-block">
+                        <span class="code-language">python</span>
+                        <pre><code class="hljs language-python">${note.code_html || escapeHtml(note.code_snippet)}</code></pre>
+                    </div>
+                </div>
+            </div>
+        ` : ''}
+
+        ${note.custom_modules && note.custom_modules.length > 0 ? `
+            <div class="detail-section">
+                <div class="section-label">
+                    <div>🧩</div>
+                    <div>自定义模块</div>
+                </div>
+                <div class="section-content">
+                    ${note.custom_modules.map(module => `
+                        <div class="module-item">
+                            <div class="module-title">${escapeHtml(module.title || '未命名')}</div>
+                            <div class="module-content">${escapeHtml(module.content || '')}</div>
+                        </div>
+                    `).join('')}
+                </div>
+            </div>
+        ` : ''}
+
+        <div class="detail-section">
+            <div class="section-label">
+                <div>🏷️</div>
+                <div>标签</div>
+            </div>
+            <div class="section-content">
+                <div class="flex flex-wrap gap-2">
+                    ${note.tags && note.tags.length > 0
+                        ? note.tags.map(tag => `
+                            <div class="form-tag">${escapeHtml(tag)}</div>
+                        `).join('')
+                        : '<div class="text-tertiary">暂无标签</div>'
+                    }
+                </div>
+            </div>
+        </div>
+    `;
+}
+
+function updateTreeSelection() {
+    document.querySelectorAll('.tree-node').forEach(node => {
+        const nodeId = parseInt(node.dataset.id);
+        node.classList.remove('selected');
+        if (nodeId === AppState.currentFolderId || nodeId === AppState.currentNoteId) {
+            node.classList.add('selected');
+        }
+    });
+}
+
+function showEmptyView() {
+    if (!Elements.emptyView) return;
+    Elements.emptyView.classList.remove('hidden');
+    if (Elements.searchResults) Elements.searchResults.classList.add('hidden');
+    if (Elements.folderView) Elements.folderView.classList.add('hidden');
+    if (Elements.detailView) Elements.detailView.classList.add('hidden');
+    if (Elements.editorView) Elements.editorView.classList.add('hidden');
+}
+
+function switchView(mode) {
+    AppState.viewMode = mode;
+
+    const gridView = document.getElementById('folderGrid');
+    const listView = document.getElementById('folderList');
+    const viewBtns = document.querySelectorAll('.view-btn');
+
+    if (mode === 'grid') {
+        if (gridView) gridView.classList.remove('hidden');
+        if (listView) listView.classList.add('hidden');
+        viewBtns[0]?.classList.add('active');
+        viewBtns[1]?.classList.remove('active');
+    } else {
+        if (gridView) gridView.classList.add('hidden');
+        if (listView) listView.classList.remove('hidden');
+        viewBtns[0]?.classList.remove('active');
+        viewBtns[1]?.classList.add('active');
+    }
+
+    localStorage.setItem('aurora_view_mode', mode);
+}
+
+// ===== 侧边栏功能 =====
+function toggleSidebar() {
+    AppState.isSidebarOpen = !AppState.isSidebarOpen;
+    if (Elements.sidebar) {
+        Elements.sidebar.classList.toggle('show');
+    }
+    if (Elements.sidebarOverlay) {
+        Elements.sidebarOverlay.classList.toggle('show');
+    }
+
+    if (AppState.isSidebarOpen) {
+        document.body.classList.add('scroll-lock');
+    } else {
+        document.body.classList.remove('scroll-lock');
+    }
+}
+
+function toggleFabMenu() {
+    if (!Elements.fabMenu || !Elements.fabButton) return;
+
+    const isShowing = Elements.fabMenu.classList.contains('show');
+
+    if (isShowing) {
+        Elements.fabMenu.classList.remove('show');
+        Elements.fabButton.textContent = '+';
+    } else {
+        Elements.fabMenu.classList.add('show');
+        Elements.fabButton.textContent = '×';
+    }
+}
+
+function showActionPanel() {
+    if (Elements.actionPanel) {
+        Elements.actionPanel.classList.add('show');
+    }
+}
+
+function hideActionPanel() {
+    if (Elements.actionPanel) {
+        Elements.actionPanel.classList.remove('show');
+    }
+}
+
+// ===== 侧边栏点击空白处关闭 =====
+function setupSidebarClose() {
+    // 点击侧边栏外部关闭
+    document.addEventListener('click', function(event) {
+        const sidebar = Elements.sidebar;
+        const sidebarOverlay = Elements.sidebarOverlay;
+        const menuToggle = Elements.menuToggle;
+
+        if (window.innerWidth <= 768 && 
+            AppState.isSidebarOpen && 
+            sidebar && 
+            !sidebar.contains(event.target) && 
+            menuToggle && 
+            !menuToggle.contains(event.target)) {
+            toggleSidebar();
+        }
+    });
+
+    // ESC键关闭侧边栏
+    document.addEventListener('keydown', function(e) {
+        if (e.key === 'Escape' && AppState.isSidebarOpen) {
+            toggleSidebar();
+        }
+    });
+}
+
+// ===== 增删改查优化函数 =====
+async function renameItem(itemId, newName) {
+    try {
+        showLoading();
+        // 树数据只含预览，需取完整节点再保存
+        const node = await API.getNode(itemId);
+
+        if (node) {
+            await API.saveNode({
+                id: itemId,
+                title: newName,
+                type: node.type,
+                parent_id: node.parent_id,
+                usage: node.usage,
+                code_snippet: node.code_snippet,
+                custom_modules: node.custom_modules || [],
+                tags: node.tags || []
+            });
+
+            await loadTree();
+            await refreshCurrentView();
+            showToast('重命名成功', 'success');
+        }
+    } catch (error) {
+        console.error('重命名失败:', error);
+        showToast('重命名失败', 'error');
+    } finally {
+        hideLoading();
+    }
+}
+
+async function exportItem(itemId) {
+    try {
+        const node = findNode(itemId);
+        if (node) {
+            const dataStr = JSON.stringify(node, null, 2);
+            const dataBlob = new Blob([dataStr], {type: 'application/json'});
+            const url = URL.createObjectURL(dataBlob);
+
+            const a = document.createElement('a');
+            a.href = url;
+            a.download = `${node.title || 'export'}.json`;
+            document.body.appendChild(a);
+            a.click();
+            document.body.removeChild(a);
+            URL.revokeObjectURL(url);
+
+            showToast('导出成功', 'success');
+        }
+    } catch (error) {
+        console.error('导出失败:', error);
+        showToast('导出失败', 'error');
+    }
+}
+
+async function shareItem(itemId) {
+    const node = findNode(itemId);
+    if (node) {
+        if (navigator.share) {
+            try {
+                await navigator.share({
+                    title: node.title,
+                    text: node.usage || node.code_snippet || '',
+                    url: window.location.href
+                });
+                showToast('分享成功', 'success');
+            } catch (error) {
+                console.error('分享失败:', error);
+                showToast('分享失败', 'error');
+            }
+        } else {
+            showToast('当前浏览器不支持分享功能', 'info');
+        }
+    }
+}
+
+// ===== 初始化函数 =====
+function populateParentSelect(selectId) {
+    const select = document.getElementById(selectId);
+    if (!select) return;
+
+    select.innerHTML = '<option value="0">根目录</option>';
+
+    const addOptions = (nodes, depth = 0) => {
+        nodes.forEach(node => {
+            if (node.type === 'folder') {
+                const option = document.createElement('option');
+                option.value = node.id;
+                option.textContent = '  '.repeat(depth) + node.title;
+                select.appendChild(option);
+
+                if (node.children && node.children.length > 0) {
+                    addOptions(node.children, depth + 1);
+                }
+            }
+        });
+    };
+
+    addOptions(AppState.treeData || []);
+}
+
+function addToRecentHistory(item) {
+    if (!item || !item.id) return;
+
+    AppState.recentHistory = AppState.recentHistory.filter(h => h.id !== item.id);
+    AppState.recentHistory.unshift({
+        ...item,
+        timestamp: new Date().toISOString()
+    });
+
+    if (AppState.recentHistory.length > 20) {
+        AppState.recentHistory = AppState.recentHistory.slice(0, 20);
+    }
+
+    localStorage.setItem('aurora_recent_history', JSON.stringify(AppState.recentHistory));
+}
+
+async function refreshCurrentView() {
+    if (AppState.searchQuery) {
+        await handleSearch();
+    } else if (AppState.currentNoteId) {
+        await openNote(AppState.currentNoteId);
+    } else if (AppState.currentFolderId !== null) {
+        await enterFolder(AppState.currentFolderId);
+    } else {
+        showEmptyView();
+    }
+}
+
+async function loadFavorites() {
+    try {
+        showLoading();
+        const favorites = await API.getFavorites();
+
+        if (favorites.length === 0) {
+            showToast('暂无收藏内容', 'info');
+            return;
+        }
+
+        showToast(`加载了 ${favorites.length} 个收藏项目`, 'success');
+    } catch (error) {
+        console.error('加载收藏失败:', error);
+        showToast('加载收藏失败', 'error');
+    } finally {
+        hideLoading();
+    }
+}
+
+async function loadRecent() {
+    try {
+        showLoading();
+        const recent = await API.getRecent();
+
+        if (recent.length === 0) {
+            showToast('暂无最近查看内容', 'info');
+            return;
+        }
+
+        showToast(`加载了 ${recent.length} 个最近项目`, 'success');
+    } catch (error) {
+        console.error('加载最近查看失败:', error);
+        showToast('加载最近查看失败', 'error');
+    } finally {
+        hideLoading();
+    }
+}
+
+function refreshQuickAccess() {
+    loadTree();
+    showToast('快速访问已刷新', 'success');
+}
+
+function showCreateMenu() {
+    toggleFabMenu();
+}
+
+function importData() {
+    const input = document.createElement('input');
+    input.type = 'file';
+    input.accept = '.ndjson,.zip';
+    input.onchange = async () => {
+        const file = input.files[0];
+        if (!file) return;
+
+        const formData = new FormData();
+        formData.append('file', file);
+        try {
+            showLoading();
+            const response = await fetch(`${API_ROOT}/api/import?parent_id=${AppState.currentFolderId || 0}`, {
+                method: 'POST',
+                body: formData,
+                credentials: 'include'
+            });
+            const result = await response.json();
+            if (result.code !== 200) {
+                throw new Error(result.msg || '导入失败');
+            }
+            showToast(`导入了 ${result.data.nodes} 个项目`, 'success');
+            await loadTree();
+            await enterFolder(AppState.currentFolderId);
+        } catch (error) {
+            console.error('导入失败:', error);
+            showToast(error.message || '导入失败', 'error');
+        } finally {
+            hideLoading();
+        }
+    };
+    input.click();
+}
+
+function exportData() {
+    window.location.href = `${API_ROOT}/api/export?format=zip&history=1`;
+}
+
+// ===== 初始化应用 =====
+async function initApp() {
+    try {
+        // 等待DOM加载完成
+        if (document.readyState === 'loading') {
+            await new Promise(resolve => {
+                document.addEventListener('DOMContentLoaded', resolve);
+            });
+        }
+
+        showLoading();
+
+        // 初始化事件监听器
+        initEventListeners();
+
+        // 加载初始数据（首屏数据失败时退回逐个接口请求）
+        try {
+            await API.loadBootstrap();
+        } catch (error) {
+            console.error('加载首屏数据失败:', error);
+        }
+        await loadTree();
+        await enterFolder(0);
+
+        // 恢复用户设置
+        const savedViewMode = localStorage.getItem('aurora_view_mode');
+        if (savedViewMode && ['grid', 'list'].includes(savedViewMode)) {
+            switchView(savedViewMode);
+        }
+
+        // 设置响应式
+        handleResize();
+
+        // 更新删除按钮状态
+        updateDeleteButtonsState();
+
+        hideLoading();
+        showToast('Aurora OS 已加载完成，根目录保护已启用', 'success');
+
+        // 定期拉取增量变更，其他标签页的修改同步到目录树
+        startChangeSync();
+
+    } catch (error) {
+        console.error('初始化失败:', error);
+        showToast('应用初始化失败，请刷新页面重试', 'error');
+        hideLoading();
+    }
+}
+
+function initEventListeners() {
+    // 窗口大小变化
+    window.addEventListener('resize', handleResize);
+
+    // 键盘快捷键
+    document.addEventListener('keydown', handleKeyboardShortcuts);
+
+    // 点击关闭侧边栏
+    if (Elements.sidebarOverlay) {
+        Elements.sidebarOverlay.addEventListener('click', toggleSidebar);
+    }
+
+    // 点击关闭FAB菜单
+    document.addEventListener('click', function(e) {
+        if (!e.target.closest('.fab-container') &&
+            Elements.fabMenu &&
+            Elements.fabMenu.classList.contains('show')) {
+            Elements.fabMenu.classList.remove('show');
+            if (Elements.fabButton) {
+                Elements.fabButton.textContent = '+';
+            }
+        }
+    }, true);
+
+    // 点击关闭右键菜单
+    document.addEventListener('click', function(e) {
+        const contextMenu = Elements.contextMenu;
+        if (contextMenu && !contextMenu.contains(e.target)) {
+            hideContextMenu();
+        }
+    });
+
+    // ESC键关闭右键菜单和侧边栏
+    document.addEventListener('keydown', function(e) {
+        if (e.key === 'Escape') {
+            hideContextMenu();
+            hideMobileContextMenu();
+            if (AppState.isSidebarOpen) {
+                toggleSidebar();
+            }
+        }
+    });
+
+    // 侧边栏空白处关闭
+    setupSidebarClose();
+}
+
+function handleResize() {
+    if (window.innerWidth > 768 && AppState.isSidebarOpen) {
+        toggleSidebar();
+    }
+
+    if (window.innerWidth <= 768) {
+        if (Elements.menuToggle) Elements.menuToggle.style.display = 'flex';
+        if (Elements.mobileBackButton) Elements.mobileBackButton.style.display = 'flex';
+        if (Elements.mobileActions) Elements.mobileActions.style.display = 'flex';
+        if (Elements.viewToggle) Elements.viewToggle.style.display = 'none';
+    } else {
+        if (Elements.menuToggle) Elements.menuToggle.style.display = 'none';
+        if (Elements.mobileBackButton) Elements.mobileBackButton.style.display = 'none';
+        if (Elements.mobileActions) Elements.mobileActions.style.display = 'none';
+        if (Elements.viewToggle) Elements.viewToggle.style.display = 'flex';
+    }
+}
+
+function handleKeyboardShortcuts(e) {
+    // 忽略输入框中的按键
+    if (e.target.tagName === 'INPUT' || e.target.tagName === 'TEXTAREA' || e.target.tagName === 'SELECT') {
+        return;
+    }
+
+    // Ctrl/Command + 快捷键
+    if (e.ctrlKey || e.metaKey) {
+        switch(e.key.toLowerCase()) {
+            case 'n':
+                e.preventDefault();
+                if (e.shiftKey) {
+                    showCreateFolderModal();
+                } else {
+                    showCreateNoteModal();
+                }
+                break;
+            case 'f':
+                e.preventDefault();
+                if (Elements.searchInput) {
+                    Elements.searchInput.focus();
+                }
+                break;
+            case 's':
+                e.preventDefault();
+                if (Elements.editModal.classList.contains('show')) {
+                    saveNote();
+                }
+                break;
+            case 'd':
+                e.preventDefault();
+                toggleSelectionMode();
+                break;
+        }
+    } else {
+        // 其他快捷键
+        switch(e.key.toLowerCase()) {
+            case 'escape':
+                if (AppState.isSelectionMode) {
+                    exitSelectionMode();
+                } else if (Elements.editModal.classList.contains('show')) {
+                    hideEditModal();
+                } else if (AppState.isSidebarOpen) {
+                    toggleSidebar();
+                }
+                break;
+            case 'delete':
+                if (AppState.selectedItems.size > 0) {
+                    deleteSelected();
+                } else if (AppState.currentNoteId) {
+                    deleteCurrent();
+                }
+                break;
+        }
+    }
+}
+
+// 启动应用
+initApp();
+
+// ===== 全局导出函数 =====
+window.toggleSidebar = toggleSidebar;
+window.enterNode = enterNode;
+window.toggleNode = toggleNode;
+window.switchView = switchView;
+window.goBack = goBack;
+window.goToRoot = goToRoot;
+window.toggleSelectionMode = toggleSelectionMode;
+window.showCreateFolderModal = showCreateFolderModal;
+window.showCreateNoteModal = showCreateNoteModal;
+window.editCurrent = editCurrent;
+window.deleteCurrent = deleteCurrent;
+window.showActionPanel = showActionPanel;
+window.hideActionPanel = hideActionPanel;
+window.showCreateMenu = showCreateMenu;
+window.refreshQuickAccess = refreshQuickAccess;
+window.loadFavorites = loadFavorites;
+window.loadRecent = loadRecent;
+window.expandAll = expandAll;
+window.exitSelectionMode = exitSelectionMode;
+window.deleteSelected = deleteSelected;
+window.showMoveModal = showMoveModal;
+window.batchRename = batchRename;
+window.toggleFavorite = toggleFavorite;
+window.handleSearch = handleSearch;
+window.toggleItemSelection = toggleItemSelection;
+window.showEditModal = showEditModal;
+window.addModule = addModule;
+window.removeModule = removeModule;
+window.moveModuleUp = moveModuleUp;
+window.moveModuleDown = moveModuleDown;
+window.updateModuleTitle = updateModuleTitle;
+window.updateModuleContent = updateModuleContent;
+window.importData = importData;
+window.exportData = exportData;
+window.updateRenamePreview = updateRenamePreview;
+window.performDelete = performDelete;
+window.performMove = performMove;
+window.performBatchRename = performBatchRename;
+window.saveNote = saveNote;
+window.hideCreateFolderModal = hideCreateFolderModal;
+window.hideCreateNoteModal = hideCreateNoteModal;
+window.hideMoveModal = hideMoveModal;
+window.hideDeleteConfirmModal = hideDeleteConfirmModal;
+window.hideBatchRenameModal = hideBatchRenameModal;
+window.hideEditModal = hideEditModal;
+window.createFolder = createFolder;
+window.createNote = createNote;
+window.showContextMenu = showContextMenu;
+window.hideContextMenu = hideContextMenu;
+window.hideMobileContextMenu = hideMobileContextMenu;
+window.contextMenuEdit = contextMenuEdit;
+window.contextMenuRename = contextMenuRename;
+window.contextMenuMove = contextMenuMove;
+window.contextMenuCopy = contextMenuCopy;
+window.contextMenuFavorite = contextMenuFavorite;
+window.contextMenuDelete = contextMenuDelete;
+window.contextMenuExport = contextMenuExport;
+window.contextMenuShare = contextMenuShare;
+window.mobileContextEdit = mobileContextEdit;
+window.mobileContextRename = mobileContextRename;
+window.mobileContextMove = mobileContextMove;
+window.mobileContextCopy = mobileContextCopy;
+window.mobileContextFavorite = mobileContextFavorite;
+window.mobileContextDelete = mobileContextDelete;
+window.mobileContextExport = mobileContextExport;
+window.showHistoryModal = showHistoryModal;
+window.hideHistoryModal = hideHistoryModal;
+window.restoreHistory = restoreHistory;
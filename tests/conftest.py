@@ -0,0 +1,29 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# app.py 在导入时读取配置，先指向临时数据库
+TEST_DIR = tempfile.mkdtemp(prefix='wiki_test_')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(TEST_DIR, 'test.db')}"
+os.environ.setdefault('TRASH_PURGE_INTERVAL', str(10 ** 9))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as wiki  # noqa: E402
+
+wiki.init_data()
+
+@pytest.fixture
+def client():
+    return wiki.app.test_client()
+
+@pytest.fixture
+def api(client):
+    """调用 JSON 接口，返回 data 字段，状态码不是 200 时断言失败"""
+    def call(path, payload=None):
+        response = client.post(path, json=payload) if payload is not None else client.get(path)
+        body = response.get_json()
+        assert response.status_code == 200, body
+        return body['data']
+    return call
@@ -0,0 +1,24 @@
+from conftest import wiki
+
+def test_streaming_export_does_not_hold_a_read_slot(client):
+    read_gate = wiki.admission_gates['read']
+    export_gate = wiki.admission_gates['export']
+    
+    response = client.get('/api/export')  # 还没读取响应体，导出仍在进行
+    try:
+        assert response.status_code == 200
+        assert export_gate.snapshot()['active'] == 1
+        assert read_gate.snapshot()['active'] == 0
+    finally:
+        response.close()
+    assert export_gate.snapshot()['active'] == 0
+
+def test_rate_limit_ignores_spoofed_forwarded_for(client, monkeypatch):
+    monkeypatch.setitem(wiki.app.config, 'RATE_LIMIT_PER_SEC', 0.001)
+    monkeypatch.setitem(wiki.app.config, 'RATE_LIMIT_BURST', 1)
+    monkeypatch.setattr(wiki, 'client_buckets', {})
+    
+    assert client.get('/api/tree', headers={'X-Forwarded-For': '10.0.0.1'}).status_code == 200
+    # 没有配置可信代理时，换一个 X-Forwarded-For 也还是同一个令牌桶
+    response = client.get('/api/tree', headers={'X-Forwarded-For': '10.0.0.2'})
+    assert response.status_code == 429
@@ -0,0 +1,78 @@
+from conftest import wiki
+
+def write_from_other_worker(title):
+    """模拟其他进程的写入：提交数据和变更流水，但不清除本进程的缓存"""
+    with wiki.app.app_context():
+        node = wiki.Node(title=title, type='note', position=wiki.next_position(None))
+        wiki.db.session.add(node)
+        wiki.db.session.flush()
+        wiki.record_change([node.id])
+        wiki.db.session.commit()
+        return node.id
+
+def poll_elapsed():
+    """模拟过了 TREE_REPLICA_POLL：下一次读取重新查询变更流水序号"""
+    wiki.workspaces.default.change_seq_checked_at = 0.0
+
+def count_queries(call):
+    statements = []
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+    with wiki.app.app_context():
+        engine = wiki.db.default_engine
+    wiki.sa.event.listen(engine, 'before_cursor_execute', record)
+    try:
+        call()
+    finally:
+        wiki.sa.event.remove(engine, 'before_cursor_execute', record)
+    return statements
+
+def test_bootstrap_seq_covers_cached_payload(api):
+    api('/api/bootstrap')  # 首屏各部分进入缓存
+    node_id = write_from_other_worker('其他进程写入')
+    poll_elapsed()
+    
+    data = api('/api/bootstrap')
+    in_tree = node_id in [node['id'] for node in data['tree']]
+    changes = api(f"/api/changes?since={data['seq']}")
+    in_changes = node_id in [node['id'] for node in changes['changed']]
+    # 写入要么已经在首屏数据里，要么能从首屏给出的序号增量同步到
+    assert in_tree or in_changes
+
+def test_write_from_other_worker_invalidates_cache(api):
+    api('/api/tree')
+    api('/api/folder/0')
+    node_id = write_from_other_worker('其他进程新建')
+    poll_elapsed()
+    
+    assert node_id in [node['id'] for node in api('/api/tree')]
+    assert node_id in [node['id'] for node in api('/api/folder/0')]
+
+def test_stale_while_revalidate_still_sees_other_worker_writes(api):
+    wiki.app.config['CACHE_STALE_WHILE_REVALIDATE'] = True
+    try:
+        api('/api/tree')
+        # 让缓存超过 CACHE_TIMEOUT，进入可以返回旧值的窗口
+        for key, (data, timestamp, seq) in list(wiki.node_cache.items()):
+            wiki.node_cache[key] = (data, timestamp - wiki.timedelta(seconds=wiki.CACHE_TIMEOUT + 1), seq)
+        node_id = write_from_other_worker('旧值窗口内写入')
+        poll_elapsed()
+        assert node_id in [node['id'] for node in api('/api/tree')]
+    finally:
+        wiki.app.config['CACHE_STALE_WHILE_REVALIDATE'] = False
+
+def test_cache_hit_checks_change_seq_once_per_poll(api, monkeypatch):
+    monkeypatch.setitem(wiki.app.config, 'TREE_REPLICA_POLL', 60)
+    api('/api/tree')
+    api('/api/tree')  # 前一次读取已经查过一次流水序号
+    assert count_queries(lambda: api('/api/tree')) == []
+    
+    node_id = write_from_other_worker('轮询间隔内写入')
+    # 其他进程的写入最迟一个轮询间隔后可见
+    assert node_id not in [node['id'] for node in api('/api/tree')]
+    poll_elapsed()
+    assert node_id in [node['id'] for node in api('/api/tree')]
+    
+    # 本进程的写入下一次读取就能看到
+    created = api('/api/save', {'title': '本进程写入', 'type': 'note', 'parent_id': 0})
+    assert created['id'] in [node['id'] for node in api('/api/tree')]
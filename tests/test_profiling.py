@@ -0,0 +1,44 @@
+import threading
+
+import pytest
+
+from conftest import wiki
+
+@pytest.fixture
+def profiled(monkeypatch):
+    monkeypatch.setitem(wiki.app.config, 'PROFILE_SECRET', 'secret')
+    return {'X-Profile': 'secret'}
+
+def test_concurrent_profiled_request_is_skipped(profiled):
+    with wiki.app.test_request_context('/api/tree', headers=profiled):
+        wiki.start_profiling()
+        assert wiki.g.get('profiler') is not None
+        # 另一个线程里的请求在第一个剖析结束前到达
+        other = {}
+        def concurrent_request():
+            with wiki.app.test_request_context('/api/tree', headers=profiled):
+                wiki.start_profiling()
+                other['profiler'] = wiki.g.get('profiler')
+        thread = threading.Thread(target=concurrent_request)
+        thread.start()
+        thread.join()
+        assert other['profiler'] is None
+        response = wiki.finish_profiling(wiki.jsonify({'code': 200, 'data': []}))
+        assert 'Server-Timing' in response.headers
+    assert not wiki.profile_lock.locked()
+
+def test_profiler_conflict_does_not_fail_the_request(profiled, monkeypatch):
+    class BusyProfile:
+        def enable(self):
+            raise ValueError('Another profiling tool is already active')
+    monkeypatch.setattr(wiki.cProfile, 'Profile', BusyProfile)
+    with wiki.app.test_request_context('/api/tree', headers=profiled):
+        wiki.start_profiling()
+        assert wiki.g.get('profiler') is None
+    assert not wiki.profile_lock.locked()
+
+def test_teardown_releases_profiler_after_error(profiled):
+    with wiki.app.test_request_context('/api/tree', headers=profiled):
+        wiki.start_profiling()
+        wiki.stop_profiling(RuntimeError('请求出错'))
+    assert not wiki.profile_lock.locked()
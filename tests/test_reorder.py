@@ -0,0 +1,13 @@
+def test_reorder_rejects_non_numeric_parent_id(client, api):
+    node_id = api('/api/save', {'title': '待排序', 'type': 'note', 'parent_id': 0})['id']
+    
+    response = client.post('/api/reorder', json={'id': node_id, 'parent_id': 'abc'})
+    assert response.status_code == 400
+    assert response.get_json()['msg'] == '无效的节点ID'
+
+def test_reorder_to_end_of_parent(api):
+    folder_id = api('/api/save', {'title': '目标目录', 'type': 'folder', 'parent_id': 0})['id']
+    node_id = api('/api/save', {'title': '移入目录', 'type': 'note', 'parent_id': 0})['id']
+    
+    api('/api/reorder', {'id': node_id, 'parent_id': folder_id})
+    assert node_id in [node['id'] for node in api(f'/api/folder/{folder_id}')]
@@ -0,0 +1,18 @@
+from conftest import wiki
+
+def test_query_matches_word_in_middle_of_title(api):
+    node_id = api('/api/save', {'title': '项目周报模板', 'type': 'note', 'parent_id': 0})['id']
+    
+    for query in ('周报', '报', '模板'):
+        found = [item['id'] for item in api(f'/api/suggest?q={query}')]
+        assert node_id in found, query
+
+def test_index_keeps_char_postings_in_sync():
+    index = wiki.SuggestIndex()
+    index.rebuild([(1, '会议纪要', '', 'note', None), (2, '周会', '例会', 'note', None)], 0)
+    assert [item['id'] for item in index.query('议')] == [1]
+    assert {item['id'] for item in index.query('会')} == {1, 2}
+    
+    index.apply({'seq': 1, 'deleted': [1], 'changed': []})
+    assert index.query('议') == []
+    assert '议' not in index.char_postings
@@ -0,0 +1,33 @@
+import io
+import json
+import zipfile
+
+import pytest
+
+from conftest import wiki
+
+def test_zip_export_entry_uses_zip64(client):
+    response = client.get('/api/export?format=zip')
+    assert response.status_code == 200
+    with zipfile.ZipFile(io.BytesIO(response.get_data())) as archive:
+        info = archive.getinfo('export.ndjson')
+        # 流式写入时大小未知，必须预先按 ZIP64 写条目头，否则超过 2GB 会报错
+        assert info.extract_version >= zipfile.ZIP64_VERSION
+        lines = archive.read('export.ndjson').decode('utf-8').splitlines()
+    assert all(json.loads(line) for line in lines)
+
+def index_names():
+    rows = wiki.db.session.execute(wiki.sa.text("SELECT name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL"))
+    return {name for name, in rows}
+
+def test_failed_import_keeps_secondary_indexes():
+    lines = [
+        json.dumps({'kind': 'node', 'id': 1, 'title': '导入', 'type': 'note'}),
+        '{不是JSON',
+    ]
+    source = io.BytesIO('\n'.join(lines).encode('utf-8'))
+    with wiki.app.app_context():
+        before = index_names()
+        with pytest.raises(ValueError):
+            wiki.import_records(wiki.iter_import_records(source), defer_indexes=True)
+        assert before and index_names() == before
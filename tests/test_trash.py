@@ -0,0 +1,33 @@
+def find(tree, node_id, parent=None):
+    """在树中查找节点，返回 (节点, 父节点)"""
+    for node in tree:
+        if node['id'] == node_id:
+            return node, parent
+        found = find(node.get('children') or [], node_id, node)
+        if found:
+            return found
+    return None
+
+def test_restore_after_parent_gone_moves_to_top_level(api):
+    parent_id = api('/api/save', {'title': '父目录', 'type': 'folder', 'parent_id': 0})['id']
+    child_id = api('/api/save', {'title': '子笔记', 'type': 'note', 'parent_id': parent_id})['id']
+    api('/api/tree')  # 让树和节点片段进入缓存
+    
+    api('/api/delete', {'ids': [child_id]})
+    # 回收站按叶子优先清理，子节点还在回收站时父节点不会被物理删除；父节点在回收站中即视为已不在
+    api('/api/delete', {'ids': [parent_id]})
+    api('/api/trash/restore', {'id': child_id})
+    
+    tree = api('/api/tree')
+    node, parent = find(tree, child_id)
+    assert parent is None
+    assert node['parent_id'] is None
+    assert find(tree, parent_id) is None
+    
+    # 排在已有顶层节点之后，位置不与其他节点重复
+    positions = [n['position'] for n in tree]
+    assert len(positions) == len(set(positions))
+    assert node['position'] == max(positions)
+    
+    top_level = api('/api/folder/0')
+    assert child_id in [n['id'] for n in top_level]
@@ -0,0 +1,42 @@
+import tempfile
+
+import pytest
+
+from conftest import wiki
+
+@pytest.fixture
+def shards(monkeypatch):
+    """开启多工作区，分片放在临时目录，最多同时打开一个分片"""
+    monkeypatch.setitem(wiki.app.config, 'WORKSPACES', True)
+    monkeypatch.setitem(wiki.app.config, 'WORKSPACE_DIR', tempfile.mkdtemp(prefix='wiki_shards_'))
+    monkeypatch.setitem(wiki.app.config, 'WORKSPACE_MAX_OPEN', 1)
+    monkeypatch.setattr(wiki, 'workspaces', wiki.WorkspaceRegistry())
+    return wiki.workspaces
+
+def shard_api(client, name, path):
+    response = client.get(path, headers={wiki.WORKSPACE_HEADER: name})
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()['data']
+
+def test_pool_stats_are_kept_per_shard(client, shards):
+    wiki.create_workspace('team-a')
+    shard_api(client, 'team-a', '/api/tree')
+    
+    pools = shard_api(client, 'team-a', '/api/pool_stats')['workspaces']['pools']
+    assert set(pools) == {wiki.DEFAULT_WORKSPACE, 'team-a'}
+    with wiki.app.app_context():
+        assert shards.state('team-a').engine.pool.stats is not wiki.db.default_engine.pool.stats
+    assert pools['team-a']['connects'] >= 1
+
+def test_reopened_shard_is_not_migrated_again(client, shards, monkeypatch):
+    wiki.create_workspace('team-a')
+    wiki.create_workspace('team-b')  # 超过 WORKSPACE_MAX_OPEN，team-a 被关闭
+    
+    calls = []
+    original = wiki.init_database
+    monkeypatch.setattr(wiki, 'init_database', lambda: calls.append(1) or original())
+    for name in ('team-a', 'team-b', 'team-a'):
+        shard_api(client, name, '/api/tree')
+    
+    assert shards.closed >= 2
+    assert calls == []
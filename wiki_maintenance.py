@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+知识库数据维护工具
+压缩迁移: CONTENT_COMPRESSION=1 python wiki_maintenance.py recompress [--batch-size 500]
+关闭压缩后以 CONTENT_COMPRESSION=0 再运行一次即可还原为明文
+清空回收站: python wiki_maintenance.py purge-trash [--all] [--batch-size 200]
+重算子树汇总: python wiki_maintenance.py recompute-rollups
+新建工作区: WORKSPACES=1 python wiki_maintenance.py create-workspace <名称>
+以上命令加 --workspace <名称> 作用于指定工作区的分片，默认作用于 DATABASE_URL 对应的库
+"""
+
+import sys
+import argparse
+
+from contextlib import contextmanager
+from datetime import datetime
+
+from app import (DEFAULT_WORKSPACE, app, create_workspace, db, migrate_database, purge_trash,
+                 recompress_content, recompute_rollups, workspace_context, workspaces)
+
+@contextmanager
+def target_context(args):
+    """命令作用的库：默认库或 --workspace 指定的分片，先升级到当前表结构"""
+    if args.workspace == DEFAULT_WORKSPACE:
+        context = app.app_context()
+    elif workspaces.exists(args.workspace):
+        context = workspace_context(args.workspace)
+    else:
+        raise ValueError(f"工作区不存在: {args.workspace}")
+    with context:
+        migrate_database()
+        yield
+
+def run_recompress(args):
+    """按当前配置分批重写正文和历史快照"""
+    def progress(table_name, stats):
+        print(f"\r[{table_name}] 已扫描 {stats['scanned']} 行, 重写 {stats['rewritten']} 行", end='', flush=True)
+    
+    mode = '压缩' if app.config['CONTENT_COMPRESSION'] else '明文'
+    print(f"目标存储格式: {mode}")
+    with target_context(args):
+        stats = recompress_content(batch_size=args.batch_size, progress=progress)
+    print()
+    print(f"✓ 完成: 扫描 {stats['scanned']} 行, 重写 {stats['rewritten']} 行")
+
+def run_purge_trash(args):
+    """分批物理删除回收站节点，默认只清理超过保留期的"""
+    def progress(stats):
+        print(f"\r已删除 节点 {stats['nodes']} / 历史 {stats['history']}", end='', flush=True)
+    
+    older_than = datetime.now() if args.all else None
+    with target_context(args):
+        stats = purge_trash(older_than=older_than, batch_size=args.batch_size, progress=progress)
+    print()
+    print(f"✓ 完成: 删除节点 {stats['nodes']} 个, 历史记录 {stats['history']} 条")
+
+def run_recompute_rollups(args):
+    """全量重算文件夹的子树汇总，修正增量维护的偏差"""
+    with target_context(args):
+        count = recompute_rollups()
+        db.session.commit()
+    print(f"✓ 完成: 重算 {count} 个文件夹的汇总")
+
+def run_create_workspace(args):
+    """新建工作区分片：建表、索引和根目录"""
+    if not create_workspace(args.name):
+        raise ValueError(f"工作区已存在: {args.name}")
+    print(f"✓ 完成: 工作区 {args.name} -> {workspaces.path(args.name)}")
+
+def main():
+    parser = argparse.ArgumentParser(description='知识库数据维护')
+    parser.add_argument('--workspace', default=DEFAULT_WORKSPACE, help='作用的工作区，默认为 DATABASE_URL 对应的库')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    
+    recompress_parser = subparsers.add_parser('recompress', help='按 CONTENT_COMPRESSION 配置重写正文和历史快照')
+    recompress_parser.add_argument('--batch-size', type=int, default=500, help='每批处理行数')
+    
+    purge_parser = subparsers.add_parser('purge-trash', help='清理回收站中超过保留期的节点')
+    purge_parser.add_argument('--all', action='store_true', help='忽略保留期，清空整个回收站')
+    purge_parser.add_argument('--batch-size', type=int, default=None, help='每个事务删除的节点数')
+    
+    subparsers.add_parser('recompute-rollups', help='全量重算文件夹的子树汇总')
+    
+    create_parser = subparsers.add_parser('create-workspace', help='新建工作区分片')
+    create_parser.add_argument('name', help='工作区名称（小写字母、数字、- 和 _）')
+    
+    args = parser.parse_args()
+    try:
+        if args.command == 'recompress':
+            run_recompress(args)
+        elif args.command == 'purge-trash':
+            run_purge_trash(args)
+        elif args.command == 'recompute-rollups':
+            run_recompute_rollups(args)
+        elif args.command == 'create-workspace':
+            run_create_workspace(args)
+    except Exception as e:
+        print(f"✗ 操作失败: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
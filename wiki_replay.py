@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+流量回放压测工具
+录制: TRAFFIC_CAPTURE=1 启动服务，请求写入 traffic/traffic-<pid>.ndjson（按大小轮转）
+回放: python wiki_replay.py traffic/*.ndjson* [--speed 1] [--concurrency 8] [--json report.json]
+    默认在数据库副本上用进程内实例回放（--db 指定源库，默认取 DATABASE_URL 或 wiki_enhanced.db），
+    也可以用 --url 指向已按副本启动的本地服务。副本应取自录制开始时，写操作的响应才能对得上
+    录制中带工作区的请求通过 X-Wiki-Workspace 头回放，进程内回放同时复制 WORKSPACE_DIR 下的分片
+输出各路由的延迟分布（与录制时对比），以及状态码和响应内容不一致的请求
+"""
+
+import os
+import re
+import sys
+import glob
+import json
+import time
+import shutil
+import sqlite3
+import argparse
+import tempfile
+import threading
+import urllib.error
+import urllib.request
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+ID_SEGMENT_RE = re.compile(r'/\d+(?=/|$)')
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# ========== 读取录制 ==========
+def load_records(patterns, limit=None):
+    """读取录制文件（支持通配符和轮转出的 .1 .2 文件），按请求开始时间合并排序"""
+    paths = sorted({path for pattern in patterns for path in (glob.glob(pattern) or [pattern])})
+    records = []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    pass  # 轮转或进程退出时可能留下半行
+    records.sort(key=lambda r: r['ts'])
+    return records[:limit] if limit else records
+
+def route_key(method, path):
+    """按路由聚合统计，路径中的数字ID归并为 <id>"""
+    return f"{method} {ID_SEGMENT_RE.sub('/<id>', path)}"
+
+# ========== 回放目标 ==========
+def snapshot_database(db_path, workdir, name='replay.db'):
+    """在线备份出一份副本，回放中的写操作不会影响源库"""
+    snapshot = os.path.join(workdir, name)
+    source = sqlite3.connect(db_path)
+    target = sqlite3.connect(snapshot)
+    source.backup(target)
+    target.close()
+    source.close()
+    return snapshot
+
+def snapshot_workspaces(workspace_dir, workdir):
+    """逐个备份工作区分片，返回副本目录"""
+    target_dir = os.path.join(workdir, 'workspaces')
+    os.makedirs(target_dir, exist_ok=True)
+    for path in glob.glob(os.path.join(workspace_dir, '*.db')):
+        snapshot_database(path, target_dir, os.path.basename(path))
+    return target_dir
+
+def workspace_headers(record):
+    return {'X-Wiki-Workspace': record['workspace']} if record.get('workspace') else {}
+
+class InProcessTarget:
+    """在数据库副本上启动进程内实例，每个线程一个测试客户端"""
+    def __init__(self, snapshot, workspace_dir=None):
+        os.environ['DATABASE_URL'] = f'sqlite:///{snapshot}'
+        if workspace_dir:
+            os.environ['WORKSPACES'] = '1'
+            os.environ['WORKSPACE_DIR'] = workspace_dir
+        os.environ['TRAFFIC_CAPTURE'] = '0'  # 回放的请求不再录制
+        os.environ['TRASH_PURGE_INTERVAL'] = str(10 ** 9)
+        sys.path.insert(0, BASE_DIR)
+        import logging
+        import app as wiki
+        logging.getLogger().setLevel(logging.WARNING)
+        wiki.app.logger.setLevel(logging.WARNING)
+        wiki.init_data()
+        wiki.warm_caches()
+        self.wiki = wiki
+        self.local = threading.local()
+
+    def send(self, record):
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = self.local.client = self.wiki.app.test_client()
+        body = record.get('body')
+        response = client.open(
+            record['path'], method=record['method'], query_string=record.get('query') or None,
+            data=body.encode('utf-8') if body is not None else None,
+            content_type=record.get('content_type') if body is not None else None,
+            headers=workspace_headers(record)
+        )
+        data = response.get_data()
+        return response.status_code, data, response.is_json
+
+class HttpTarget:
+    """回放到已启动的服务"""
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+
+    def send(self, record):
+        url = self.base_url + record['path'] + (f"?{record['query']}" if record.get('query') else '')
+        body = record.get('body')
+        request = urllib.request.Request(url, method=record['method'], headers=workspace_headers(record),
+                                         data=body.encode('utf-8') if body is not None else None)
+        if body is not None and record.get('content_type'):
+            request.add_header('Content-Type', record['content_type'])
+        try:
+            with urllib.request.urlopen(request, timeout=60) as response:
+                status, data, content_type = response.status, response.read(), response.headers.get_content_type()
+        except urllib.error.HTTPError as e:
+            status, data, content_type = e.code, e.read(), e.headers.get_content_type()
+        return status, data, content_type == 'application/json'
+
+# ========== 回放 ==========
+def replay(records, target, digest, speed=1.0, concurrency=8, progress=None):
+    """按录制时的间隔（除以 speed）发出请求，speed<=0 时不等待、按并发上限尽快发送
+
+    读请求并发执行；写请求作为屏障，等之前的请求全部完成后单独执行，
+    保证写入顺序和录制时一致，后续读到的数据才能对得上
+    """
+    results = []
+    lock = threading.Lock()
+
+    def run(record, scheduled):
+        started = time.perf_counter()
+        try:
+            status, data, is_json = target.send(record)
+            error = None
+        except Exception as e:
+            status, data, is_json, error = None, b'', False, str(e)
+        elapsed = time.perf_counter() - started
+        result = {
+            'record': record,
+            'status': status,
+            'latency_ms': elapsed * 1000,
+            'lag_ms': max(0.0, (started - scheduled) * 1000) if scheduled else 0.0,
+            'error': error,
+            'digest': digest(data, is_json) if record.get('response_digest') and status is not None else None
+        }
+        with lock:
+            results.append(result)
+            if progress:
+                progress(len(results), len(records))
+
+    first_ts = records[0]['ts'] if records else 0
+    began = time.perf_counter()
+    pending = []
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for record in records:
+            scheduled = None
+            if speed > 0:
+                scheduled = began + (record['ts'] - first_ts) / speed
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            if record['method'] in READ_METHODS:
+                pending.append(pool.submit(run, record, scheduled))
+                continue
+            wait(pending)
+            pending = []
+            run(record, scheduled)
+    return results, time.perf_counter() - began
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+def summarize(results, elapsed):
+    """按路由汇总延迟分布和不一致的响应"""
+    routes = OrderedDict()
+    mismatches = []
+    for result in sorted(results, key=lambda r: r['record']['ts']):
+        record = result['record']
+        stats = routes.setdefault(route_key(record['method'], record['path']), {
+            'count': 0, 'recorded': [], 'replayed': [], 'status_mismatch': 0, 'body_mismatch': 0, 'errors': 0
+        })
+        stats['count'] += 1
+        stats['recorded'].append(record.get('duration_ms') or 0.0)
+        stats['replayed'].append(result['latency_ms'])
+        if result['error']:
+            stats['errors'] += 1
+            mismatches.append({'kind': 'error', 'request': record, 'detail': result['error']})
+        elif result['status'] != record.get('status'):
+            stats['status_mismatch'] += 1
+            mismatches.append({'kind': 'status', 'request': record,
+                               'detail': f"录制 {record.get('status')} / 回放 {result['status']}"})
+        elif result['digest'] and result['digest'] != record['response_digest']:
+            stats['body_mismatch'] += 1
+            mismatches.append({'kind': 'body', 'request': record, 'detail': '响应内容不同'})
+
+    report = {'requests': len(results), 'elapsed_s': round(elapsed, 3), 'routes': {}, 'mismatches': mismatches}
+    for key, stats in routes.items():
+        report['routes'][key] = {
+            'count': stats['count'],
+            'recorded_p50_ms': round(percentile(stats['recorded'], 50), 2),
+            'recorded_p95_ms': round(percentile(stats['recorded'], 95), 2),
+            'p50_ms': round(percentile(stats['replayed'], 50), 2),
+            'p95_ms': round(percentile(stats['replayed'], 95), 2),
+            'p99_ms': round(percentile(stats['replayed'], 99), 2),
+            'max_ms': round(max(stats['replayed']), 2),
+            'status_mismatch': stats['status_mismatch'],
+            'body_mismatch': stats['body_mismatch'],
+            'errors': stats['errors']
+        }
+    all_latencies = [r['latency_ms'] for r in results]
+    report['overall'] = {
+        'p50_ms': round(percentile(all_latencies, 50), 2),
+        'p95_ms': round(percentile(all_latencies, 95), 2),
+        'p99_ms': round(percentile(all_latencies, 99), 2),
+        'max_lag_ms': round(max((r['lag_ms'] for r in results), default=0.0), 2),
+        'throughput_rps': round(len(results) / elapsed, 1) if elapsed else 0.0
+    }
+    return report
+
+def print_report(report, max_mismatches=20):
+    print(f"{'路由':<36}{'次数':>6}{'录制p50':>10}{'录制p95':>10}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}{'状态不符':>9}{'内容不符':>9}")
+    for key, stats in sorted(report['routes'].items(), key=lambda item: -item[1]['count']):
+        print(f"{key[:35]:<36}{stats['count']:>6}{stats['recorded_p50_ms']:>10}{stats['recorded_p95_ms']:>10}"
+              f"{stats['p50_ms']:>9}{stats['p95_ms']:>9}{stats['p99_ms']:>9}{stats['max_ms']:>9}"
+              f"{stats['status_mismatch'] + stats['errors']:>9}{stats['body_mismatch']:>9}")
+    overall = report['overall']
+    print(f"共 {report['requests']} 个请求, 用时 {report['elapsed_s']}s ({overall['throughput_rps']} req/s), "
+          f"p50 {overall['p50_ms']}ms, p95 {overall['p95_ms']}ms, p99 {overall['p99_ms']}ms, "
+          f"最大调度延迟 {overall['max_lag_ms']}ms")
+
+    mismatches = report['mismatches']
+    if mismatches:
+        print(f"⚠ {len(mismatches)} 个请求与录制结果不一致:")
+        for item in mismatches[:max_mismatches]:
+            request = item['request']
+            query = f"?{request['query']}" if request.get('query') else ''
+            print(f"  - [{item['kind']}] {request['method']} {request['path']}{query}: {item['detail']}")
+        if len(mismatches) > max_mismatches:
+            print(f"  ... 还有 {len(mismatches) - max_mismatches} 个")
+    else:
+        print("✓ 所有响应与录制一致")
+
+def main():
+    parser = argparse.ArgumentParser(description='按录制的真实流量回放压测')
+    parser.add_argument('files', nargs='+', help='录制文件，支持通配符，如 traffic/*.ndjson*')
+    parser.add_argument('--db', help='回放使用的源数据库（会先复制一份），默认取 DATABASE_URL 或 wiki_enhanced.db')
+    parser.add_argument('--url', help='回放到已启动的服务，如 http://127.0.0.1:5000（需自行以数据库副本启动）')
+    parser.add_argument('--speed', type=float, default=1.0, help='回放倍速，1 为原速，0 为不等待尽快发送')
+    parser.add_argument('--concurrency', type=int, default=8, help='最大并发请求数')
+    parser.add_argument('--limit', type=int, default=None, help='只回放前 N 个请求')
+    parser.add_argument('--json', help='把完整报告写到指定 JSON 文件')
+    args = parser.parse_args()
+
+    workdir = None
+    try:
+        records = load_records(args.files, limit=args.limit)
+        skipped = [r for r in records if r.get('body_skipped')]
+        records = [r for r in records if not r.get('body_skipped')]
+        if not records:
+            print("✗ 录制文件中没有可回放的请求")
+            sys.exit(1)
+        span = records[-1]['ts'] - records[0]['ts']
+        print(f"读取 {len(records)} 个请求，录制时长 {span:.1f}s" + (f"，跳过 {len(skipped)} 个未录制请求体的请求" if skipped else ''))
+
+        if args.url:
+            target = HttpTarget(args.url)
+            sys.path.insert(0, BASE_DIR)
+            from app import traffic_digest
+        else:
+            db_path = args.db
+            if not db_path:
+                url = os.environ.get('DATABASE_URL', f'sqlite:///{os.path.join(BASE_DIR, "wiki_enhanced.db")}')
+                if not url.startswith('sqlite:///'):
+                    print("✗ 进程内回放只支持 SQLite，请用 --url 回放到已启动的服务")
+                    sys.exit(1)
+                db_path = url[len('sqlite:///'):]
+            workdir = tempfile.mkdtemp(prefix='wiki_replay_')
+            workspace_dir = None
+            if any(r.get('workspace') for r in records):
+                workspace_dir = snapshot_workspaces(
+                    os.environ.get('WORKSPACE_DIR', os.path.join(BASE_DIR, 'workspaces')), workdir)
+            target = InProcessTarget(snapshot_database(db_path, workdir), workspace_dir)
+            traffic_digest = target.wiki.traffic_digest
+
+        def progress(done, total):
+            if done % 50 == 0 or done == total:
+                print(f"\r已回放 {done}/{total}", end='', flush=True)
+
+        results, elapsed = replay(records, target, traffic_digest, speed=args.speed,
+                                  concurrency=args.concurrency, progress=progress)
+        print()
+        report = summarize(results, elapsed)
+        print_report(report)
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            print(f"✓ 报告已保存到 {args.json}")
+    except Exception as e:
+        print(f"✗ 回放失败: {e}")
+        sys.exit(1)
+    finally:
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+知识库批量导入导出工具
+导出: python wiki_transfer.py export backup.ndjson [--history] [--format zip]
+导入: python wiki_transfer.py import backup.ndjson [--parent 12] [--keep-indexes]
+"""
+
+import sys
+import argparse
+
+from app import app, import_records, iter_export_ndjson, iter_export_zip, iter_import_records, migrate_database
+
+def run_export(args):
+    """流式写出导出文件"""
+    fmt = args.format or ('zip' if args.output.endswith('.zip') else 'ndjson')
+    with app.app_context():
+        migrate_database()  # 旧库先补齐列，和应用启动时一致
+        if fmt == 'zip':
+            with open(args.output, 'wb') as f:
+                for chunk in iter_export_zip(args.history):
+                    f.write(chunk)
+        else:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                for line in iter_export_ndjson(args.history):
+                    f.write(line)
+    print(f"✓ 导出完成: {args.output}")
+
+def run_import(args):
+    """批量导入，导入期间暂停索引维护"""
+    def progress(stats):
+        print(f"\r已导入 节点 {stats['nodes']} / 历史 {stats['history']}", end='', flush=True)
+    
+    with app.app_context():
+        migrate_database()
+        with open(args.input, 'rb') as f:
+            stats = import_records(
+                iter_import_records(f),
+                target_parent_id=args.parent,
+                defer_indexes=not args.keep_indexes,
+                progress=progress
+            )
+    print()
+    print(f"✓ 导入完成: 节点 {stats['nodes']} 个, 历史 {stats['history']} 条, 跳过 {stats['skipped']} 条")
+
+def main():
+    parser = argparse.ArgumentParser(description='知识库批量导入导出')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    
+    export_parser = subparsers.add_parser('export', help='导出全部节点')
+    export_parser.add_argument('output', help='输出文件路径 (.ndjson 或 .zip)')
+    export_parser.add_argument('--history', action='store_true', help='同时导出历史记录')
+    export_parser.add_argument('--format', choices=['ndjson', 'zip'], help='导出格式，默认按扩展名判断')
+    
+    import_parser = subparsers.add_parser('import', help='导入导出文件')
+    import_parser.add_argument('input', help='导出文件路径 (.ndjson 或 .zip)')
+    import_parser.add_argument('--parent', type=int, default=None, help='导入到指定文件夹ID下')
+    import_parser.add_argument('--keep-indexes', action='store_true', help='导入期间保留索引（默认先删除，结束后重建）')
+    
+    args = parser.parse_args()
+    try:
+        if args.command == 'export':
+            run_export(args)
+        else:
+            run_import(args)
+    except Exception as e:
+        print(f"✗ 操作失败: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
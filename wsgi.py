@@ -0,0 +1,15 @@
+"""生产环境 WSGI 入口
+
+gunicorn 使用 gunicorn.conf.py 中的 preload_app，在 master 进程里导入本模块：
+建表/索引检查和常驻状态预热只执行一次，fork 出的 worker 直接继承预热好的内存。
+
+    gunicorn -c gunicorn.conf.py wsgi:application
+"""
+from app import app, init_data, warm_caches
+
+# 建表、补列、索引检查与联想索引构建（幂等）
+init_data()
+# 预热节点片段、联想索引和树副本，fork 出的 worker 直接继承，首批请求不再冷启动
+warm_caches()
+
+application = app